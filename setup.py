@@ -13,7 +13,7 @@ else:
     raise RuntimeError("Unable to find version string in {}.".format(v_file))
 
 
-test_requirements = ['nose', 'xlrd']
+test_requirements = ['nose', 'xlrd', 'scipy']
 setup(
     name="vase",
     packages=["vase"],
@@ -34,11 +34,13 @@ setup(
         'BGZIP': ['biopython'],
         'REPORTER': ['xlsxwriter', 'requests'],
         'MYGENEINFO': ['mygene'],
+        'BURDEN': ['scipy'],
         'tests': test_requirements,
     },
     scripts=["bin/vase", "bin/burden_test_vase", "bin/vase_reporter",
              "bin/coordinates_from_genes", "bin/filter_gts",
              "bin/phase_by_transmission", "bin/remove_info_fields",
+             "bin/vase_cohort_db", "bin/vase_merge_burden",
             ],
     include_package_data=True,
     classifiers=[
@@ -1,4 +1,6 @@
 from .utils import *
+import shutil
+from vase.burden_counter import merge_burden_counts, write_burden_counts
 
 
 def test_burden_counts():
@@ -24,6 +26,93 @@ def test_burden_counts():
     os.remove(output)
 
 
+def test_burden_matrix():
+    lines, m = run_burden_counts(["Sample1", "Sample2"], ["Sample3"])
+    assert_equal(list(m['samples']), ["Sample1", "Sample2", "Sample3"])
+    assert_equal(int(m['n_cases']), 2)
+    assert_true(all(m['counts'] > 0) and all(m['counts'] <= 2))
+    for line in lines[1:]:
+        if not line:
+            continue
+        cols = line.split("\t")
+        i = list(m['features']).index(cols[0])
+        assert_equal(m['genes'][i], cols[1])
+        feat = m['feature_index'] == i
+        cases = feat & (m['sample_index'] < 2)
+        controls = feat & (m['sample_index'] >= 2)
+        assert_equal(int(m['counts'][cases].sum()), int(cols[2]))
+        assert_equal(int(m['counts'][controls].sum()), int(cols[4]))
+
+
+def _per_sample_counts(m):
+    return dict(((m['samples'][s], m['features'][f]), c) for s, f, c in
+                zip(m['sample_index'].tolist(), m['feature_index'].tolist(),
+                    m['counts'].tolist()))
+
+
+def test_burden_matrix_roles():
+    results = []
+    for cases, controls in ((["Sample1", "Sample2"], ["Sample3"]),
+                            (["Sample3"], ["Sample1", "Sample2"])):
+        lines, m = run_burden_counts(cases, controls)
+        results.append(_per_sample_counts(m))
+    assert_true(any(c == 2 for (s, f), c in results[0].items() if
+                    s == "Sample3"))
+    assert_equal(results[0], results[1])
+
+
+def _check_merge(shard_args):
+    '''
+        Check that merging runs with each of shard_args gives the same
+        counts as a single run with Sample1 and Sample2 as cases and
+        Sample3 as control. Returns the per-sample counts of each shard.
+    '''
+    expected, whole = run_burden_counts(["Sample1", "Sample2"], ["Sample3"])
+    shards = []
+    shard_counts = []
+    for args in shard_args:
+        matrix = get_tmp_out(suffix='.npz')
+        lines, m = run_burden_counts(matrix=matrix, **args)
+        shards.append(matrix)
+        shard_counts.append(_per_sample_counts(m))
+    merged = get_tmp_out(suffix='.txt')
+    merged_data = merge_burden_counts(shards)
+    write_burden_counts(merged_data, merged)
+    with open(merged, 'rt') as infile:
+        results = infile.read().split("\n")
+    assert_equal(results, expected)
+    assert_equal(_per_sample_counts(merged_data), _per_sample_counts(whole))
+    for f in shards + [merged]:
+        os.remove(f)
+    return shard_counts
+
+
+def test_merge_burden():
+    _check_merge([dict(cases=["Sample1"], controls=["Sample3"]),
+                  dict(cases=["Sample2"])])
+
+
+def test_merge_burden_regions():
+    # split through FEATURE_135, which has qualifying alleles for all
+    # samples on either side of the split
+    vcf = get_tmp_out(suffix='.vcf.gz')
+    shutil.copyfile(input_prefix + '.vcf.gz', vcf)
+    pysam.tabix_index(vcf, preset='vcf', force=True)
+    samples = dict(cases=["Sample1", "Sample2"], controls=["Sample3"],
+                   input=vcf)
+    shard_counts = _check_merge(
+        [dict(region=['1:1-1205000'], **samples),
+         dict(region=['1:1205001-300000000'], **samples)])
+    for s in ("Sample1", "Sample2", "Sample3"):
+        k = (s, 'FEATURE_135')
+        assert_true(k in shard_counts[0] and k in shard_counts[1])
+    # counts for Sample3 exceed the maximum of 2 if not capped on merging
+    k = ("Sample3", 'FEATURE_135')
+    assert_true(shard_counts[0][k] + shard_counts[1][k] > 2)
+    os.remove(vcf)
+    os.remove(vcf + '.tbi')
+
+
 if __name__ == '__main__':
     import nose
     nose.run(defaultTest=__name__)
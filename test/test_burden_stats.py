@@ -0,0 +1,123 @@
+from .utils import *
+import numpy as np
+import scipy.stats as stats
+from vase.burden_stats import fisher_greater, binomial_greater, \
+    table_pvalues, fdr_correct, permutation_test
+
+tables = np.array([[0, 100, 0, 1000],
+                   [1, 99, 0, 1000],
+                   [5, 95, 10, 990],
+                   [20, 80, 50, 950],
+                   [0, 100, 10, 990],
+                   [0, 0, 5, 995],
+                   [3, 97, 0, 0],
+                   [10, 0, 10, 0],
+                   [100, 0, 5, 995]])
+
+
+def test_fisher():
+    odds, pvals = fisher_greater(*tables.T)
+    for i, t in enumerate(tables):
+        o, p = stats.fisher_exact(t.reshape(2, 2), alternative='greater')
+        assert_almost_equal(pvals[i], p)
+        if np.isnan(o):
+            assert_true(np.isnan(odds[i]))
+        else:
+            assert_equal(odds[i], o)
+
+
+def test_binomial():
+    odds, pvals = binomial_greater(*tables.T)
+    for i, (a, b, c, d) in enumerate(tables):
+        if a + b == 0 or c + d == 0:
+            assert_equal(pvals[i], 1.0)
+            continue
+        # pseudo-count used for expected proportion if no control alleles
+        expected = c / (c + d) if c > 0 else 1 / (d + 1)
+        p = stats.binomtest(a, a + b, expected, alternative='greater').pvalue
+        assert_almost_equal(pvals[i], p)
+    # a single case allele and no control alleles is not significant
+    odds, pvals = binomial_greater([1], [99], [0], [1000])
+    assert_true(pvals[0] > 0.05)
+    assert_true(np.isinf(odds[0]))
+
+
+def test_table_pvalues_processes():
+    many = np.tile(tables, (5, 1))
+    for test in ('fisher', 'binomial'):
+        o1, p1 = table_pvalues(*many.T, test=test)
+        o2, p2 = table_pvalues(*many.T, test=test, processes=3)
+        assert_true(np.array_equal(p1, p2))
+        assert_true(np.array_equal(o1, o2, equal_nan=True))
+    assert_raises(ValueError, table_pvalues, *many.T, test='foo')
+
+
+def test_fdr():
+    pvals = np.array([0.01, 0.04, 0.03, 0.005, 0.5])
+    assert_true(np.allclose(fdr_correct(pvals),
+                            [0.025, 0.05, 0.05, 0.025, 0.5]))
+    assert_equal(len(fdr_correct([])), 0)
+
+
+def get_matrix():
+    # 10 cases, 10 controls, feature 0 only in cases, feature 1 only in
+    # controls and feature 2 in all samples
+    samples = ['S{}'.format(i) for i in range(20)]
+    sample_index = list(range(10)) + list(range(10, 20)) + list(range(20))
+    feature_index = [0] * 10 + [1] * 10 + [2] * 20
+    counts = [1] * 10 + [2] * 10 + [1] * 20
+    return dict(samples=np.array(samples),
+                n_cases=np.array(10),
+                features=np.array(['F1', 'F2', 'F3']),
+                genes=np.array(['G1', 'G2', 'G3']),
+                sample_index=np.array(sample_index, dtype=np.int32),
+                feature_index=np.array(feature_index, dtype=np.int32),
+                counts=np.array(counts, dtype=np.uint8))
+
+
+def test_permutation_test():
+    matrix = get_matrix()
+    feats, genes, cases, controls, odds, pvals = permutation_test(
+        matrix, n_permutations=1000, chunk_size=64)
+    assert_equal(feats, ['F1', 'F2', 'F3'])
+    assert_equal(cases.tolist(), [[10, 10], [0, 20], [10, 10]])
+    assert_equal(controls.tolist(), [[0, 20], [20, 0], [10, 10]])
+    assert_true(pvals[0] < 0.01)
+    assert_equal(pvals[1], 1.0)
+    assert_equal(pvals[2], 1.0)
+    results = permutation_test(matrix, n_permutations=1000, chunk_size=64,
+                               processes=3)
+    assert_true(np.array_equal(pvals, results[5]))
+
+
+def test_permutation_test_samples():
+    matrix = get_matrix()
+    samples = ['S{}'.format(i) for i in range(20)]
+    results = permutation_test(matrix, n_permutations=100,
+                               cases=samples[10:15], controls=samples[:10])
+    assert_equal(results[2].tolist(), [[0, 10], [10, 0], [5, 5]])
+    assert_equal(results[3].tolist(), [[10, 10], [0, 20], [10, 10]])
+    assert_true(results[5][1] < 0.05)
+    results = permutation_test(matrix, n_permutations=100,
+                               cases=samples[15:])
+    assert_equal(results[3].tolist(), [[10, 20], [10, 20], [15, 15]])
+    assert_raises(ValueError, permutation_test, matrix, cases=['foo'])
+    assert_raises(ValueError, permutation_test, matrix, cases=samples[:2],
+                  controls=samples[1:3])
+
+
+def test_permutation_test_relabel():
+    # relabelling cases and controls gives the same counts as counting
+    # with the swapped labels
+    lines, m1 = run_burden_counts(["Sample1", "Sample2"], ["Sample3"])
+    lines, m2 = run_burden_counts(["Sample3"], ["Sample1", "Sample2"])
+    r1 = permutation_test(m1, n_permutations=100, cases=["Sample3"],
+                          controls=["Sample1", "Sample2"])
+    r2 = permutation_test(m2, n_permutations=100)
+    for i in range(4):
+        assert_equal(np.asarray(r1[i]).tolist(), np.asarray(r2[i]).tolist())
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
@@ -0,0 +1,58 @@
+from .utils import *
+from vase.cohort_db import CohortDbBuilder
+
+
+def _build_db(**kwargs):
+    output = get_tmp_out() + '.vcf.gz'
+    builder = CohortDbBuilder(input_prefix + '.bcf', output, **kwargs)
+    n = builder.build()
+    return output, n
+
+
+def test_build_cohort_db():
+    output, n = _build_db(samples=['Sample2', 'Sample3'], gq=0)
+    assert_true(n > 0)
+    assert_true(os.path.exists(output + '.tbi'))
+    with pysam.VariantFile(input_prefix + '.bcf') as vin:
+        expected = dict()
+        for record in vin:
+            gts = [record.samples[s]['GT'] for s in ('Sample2', 'Sample3')]
+            expected[(record.chrom, record.pos, record.alleles)] = (
+                [sum(i in gt for gt in gts) for i in
+                 range(1, len(record.alleles))],
+                [sum(gt == (i, i) for gt in gts) for i in
+                 range(1, len(record.alleles))])
+    with pysam.VariantFile(output) as vcf:
+        assert_equal(len(vcf.header.samples), 0)
+        for record in vcf:
+            carriers, homs = expected[(record.chrom, record.pos,
+                                       record.alleles)]
+            assert_equal(list(record.info['N_CARRIERS']), carriers)
+            assert_equal(list(record.info['N_HOM']), homs)
+    os.remove(output)
+    os.remove(output + '.tbi')
+
+
+def test_cohort_db_filter():
+    for gq, max_ref_ab in ((0, None), (20, None), (20, 0.05)):
+        db, n = _build_db(samples=['Sample2', 'Sample3'], gq=gq,
+                          max_ref_ab=max_ref_ab)
+        results = []
+        for test_args in (dict(controls=['Sample2', 'Sample3'],
+                               control_gq=gq,
+                               control_max_ref_ab=max_ref_ab),
+                          dict(cohort_db=db)):
+            output = get_tmp_out()
+            test_args.update(cases=['Sample1'], output=output)
+            run_args(test_args)
+            results.append(convert_results(output))
+            os.remove(output)
+        assert_true(len(results[0]) > 0)
+        assert_equal(results[0], results[1])
+        os.remove(db)
+        os.remove(db + '.tbi')
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
@@ -0,0 +1,36 @@
+from .utils import *
+
+indexed_vcf = os.path.join(dir_path, 'test_data', 'ex9.vcf.gz')
+
+
+def _filter(input, processes):
+    output = get_tmp_out()
+    proc = run_script('filter_gts',
+                      ['-i', input, '-o', output, '--gq', '20', '--dp', '10',
+                       '--het_ab', '0.25', '--processes', str(processes),
+                       '--no_progress'])
+    results = records_from_vcf(output)
+    os.remove(output)
+    return results, proc.stderr
+
+
+def test_filter_gts_processes():
+    results, _ = _filter(indexed_vcf, 1)
+    original = records_from_vcf(indexed_vcf)
+    assert_equal(len(results), len(original))
+    assert_not_equal(results, original)
+    parallel, _ = _filter(indexed_vcf, 3)
+    assert_equal(results, parallel)
+
+
+def test_filter_gts_processes_no_index():
+    vcf = input_prefix + '.bcf'
+    results, _ = _filter(vcf, 1)
+    parallel, stderr = _filter(vcf, 3)
+    assert_true("Using a single process" in stderr)
+    assert_equal(results, parallel)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
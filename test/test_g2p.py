@@ -1,4 +1,6 @@
 from .utils import *
+import shutil
+from vase.g2p import G2P
 
 
 def test_g2p():
@@ -22,6 +24,99 @@ def test_g2p():
     os.remove(output)
 
 
+def test_g2p_gene_annotation():
+    output = get_tmp_out()
+    input = os.path.join(dir_path, 'test_data', 'ex2.bcf')
+    test_args = dict(
+        no_warnings=True,
+        input=input,
+        output=output,
+        ped=os.path.join(dir_path, "test_data", "test.ped"),
+        de_novo=True,
+        biallelic=True,
+        csq=['default'],
+        check_g2p_consequence=True,
+        check_g2p_inheritance=True,
+        g2p=os.path.join(dir_path, "test_data", "test_g2p.csv"),
+        gene_annotation=os.path.join(dir_path, "test_data", "test_genes.gtf"),
+        gene_padding=0,
+        stream=True,
+    )
+    results, expected = run_args(test_args, output, 'test_g2p')
+    assert_equal(results, expected)
+    os.remove(output)
+
+
+def _g2p_annotation_args(input, output, **kwargs):
+    test_args = dict(
+        no_warnings=True,
+        input=input,
+        output=output,
+        ped=os.path.join(dir_path, "test_data", "test.ped"),
+        de_novo=True,
+        biallelic=True,
+        csq=['default'],
+        check_g2p_consequence=True,
+        check_g2p_inheritance=True,
+        g2p=os.path.join(dir_path, "test_data", "test_g2p.csv"),
+        gene_annotation=os.path.join(dir_path, "test_data", "test_genes.gtf"),
+        gene_padding=0,
+    )
+    test_args.update(kwargs)
+    return get_args(test_args)
+
+
+def test_g2p_gene_annotation_indexed():
+    output = get_tmp_out()
+    input = get_tmp_out(suffix='.bcf')
+    shutil.copyfile(os.path.join(dir_path, 'test_data', 'ex2.bcf'), input)
+    pysam.tabix_index(input, preset='bcf')
+    runner = VaseRunner(_g2p_annotation_args(input, output))
+    # regions are retrieved using the index rather than streamed
+    assert_is_not_none(runner.var_stream.region_iter)
+    assert_is_none(runner.var_stream.region_finder)
+    runner.run()
+    results = convert_results(output)
+    expected = get_expected_out('test_g2p')
+    assert_equal(results, expected)
+    for f in (output, input, input + '.csi'):
+        os.remove(f)
+
+
+def test_g2p_gene_annotation_exclude():
+    output = get_tmp_out()
+    input = os.path.join(dir_path, 'test_data', 'ex2.bcf')
+    runner = VaseRunner(_g2p_annotation_args(input, output,
+                                             exclude_regions=True))
+    assert_true(runner.var_stream.exclude)
+    runner.run()
+    results = convert_results(output)
+    expected = get_expected_out('test_g2p')
+    assert_true(len(expected) > 0)
+    assert_equal(set(results) & set(expected), set())
+    os.remove(output)
+
+
+def test_g2p_requirements():
+    g2p = G2P(os.path.join(dir_path, "test_data", "test_g2p.csv"))
+    assert_true(g2p.inheritance_matches('SYMBOL_1', 'recessive'))
+    assert_false(g2p.inheritance_matches('SYMBOL_1', 'dominant'))
+    assert_true(g2p.inheritance_matches('SNF2L2', 'de novo'))
+    assert_false(g2p.inheritance_matches('NOT_A_G2P_GENE', 'de novo'))
+    assert_false('NOT_A_G2P_GENE' in g2p.g2p)
+    assert_equal(g2p.consequences_from_gene('SNF2L2'),
+                 {'missense_variant', 'inframe_deletion', 'inframe_insertion'})
+    assert_is_none(g2p.consequences_from_gene('SYMBOL_4'))
+    assert_equal(g2p.consequences_from_gene('SYMBOL_4', False), set())
+    csq = {'SYMBOL': 'SYMBOL_1', 'Consequence': 'stop_gained&NMD_transcript'}
+    assert_true(g2p.csq_matches_requirement(csq))
+    csq['Consequence'] = 'missense_variant'
+    assert_false(g2p.csq_matches_requirement(csq))
+    csq['SYMBOL'] = 'SYMBOL_4'
+    assert_true(g2p.csq_matches_requirement(csq))
+    assert_false(g2p.csq_matches_requirement(csq, keep_uncertain=False))
+
+
 if __name__ == '__main__':
     import nose
     nose.run(defaultTest=__name__)
@@ -0,0 +1,108 @@
+from .utils import *
+from vase.vcf_reader import VcfReader
+from vase.sample_filter import GtFilter
+from vase.sv_gt_filter import SvGtFilter
+
+
+def test_genotype_matrix():
+    vcf = VcfReader(input_prefix + '.bcf')
+    samples = list(vcf.header.samples)
+    vcf.require_genotypes(samples, ['GQ', 'DP', 'AD'])
+    n = 0
+    for record in vcf:
+        gm = record.genotypes
+        assert_equal(gm.samples, samples)
+        n_alleles = len(record.alleles)
+        for s in samples:
+            i = gm.index[s]
+            call = record.samples[s]
+            gt = call['GT']
+            assert_equal(gm.no_calls()[i], gt == (None,) * len(gt))
+            assert_equal(gm.n_distinct()[i], len(set(gt)))
+            assert_equal(gm.is_genotype((0, 0))[i], gt == (0, 0))
+            for allele in range(n_alleles):
+                assert_equal(gm.allele_counts(allele)[i], gt.count(allele))
+                assert_equal(gm.has_allele(allele)[i], allele in gt)
+                assert_equal(gm.is_genotype((allele, allele))[i],
+                             gt == (allele, allele))
+            for f in ('GQ', 'DP'):
+                val = call.get(f, None)
+                if val is None:
+                    assert_true(np.isnan(gm.values[f][i]))
+                else:
+                    assert_equal(gm.values[f][i], val)
+            ad = call.get('AD', (None,))
+            assert_equal(gm.missing['AD'][i], ad == (None,))
+            if ad != (None,):
+                for j in range(len(ad)):
+                    if ad[j] is None:
+                        assert_true(np.isnan(gm.values['AD'][i, j]))
+                    else:
+                        assert_equal(gm.values['AD'][i, j], ad[j])
+        n += 1
+    assert_true(n > 0)
+
+
+def test_gt_ok_mask():
+    vcf = VcfReader(input_prefix + '.bcf')
+    samples = list(vcf.header.samples)
+    gt_filters = [GtFilter(vcf),
+                  GtFilter(vcf, gq=30, dp=10, max_dp=40, het_ab=0.25,
+                           hom_ab=0.9, ref_ab_filter=0.05),
+                  GtFilter(vcf, hom_ab=0.95, ref_ab_filter=0.01)]
+    fields = set()
+    for f in gt_filters:
+        fields.update(f.fields)
+    vcf.require_genotypes(samples, fields)
+    rows = np.array([2, 0])
+    n = 0
+    for record in vcf:
+        gm = record.genotypes
+        for allele in range(1, len(record.alleles)):
+            for f in gt_filters:
+                expected = [f.gt_is_ok(record.samples, s, allele) for s in
+                            samples]
+                assert_equal(list(f.gt_ok_mask(gm, allele)), expected)
+                assert_equal(list(f.gt_ok_mask(gm, allele, rows)),
+                             [expected[i] for i in rows])
+                if f.ad_over_threshold is not None:
+                    expected = [f.ad_over_threshold(record.samples, s, allele)
+                                for s in samples]
+                    assert_equal(list(f.ad_over_threshold_mask(gm, allele)),
+                                 expected)
+                n += 1
+    assert_true(n > 0)
+
+
+def test_sv_gt_ok_mask():
+    vcf = VcfReader(os.path.join(dir_path, 'test_data', 'ex4.bcf'))
+    samples = list(vcf.header.samples)
+    gt_filters = [SvGtFilter(vcf),
+                  SvGtFilter(vcf, gq=20, dp=5, max_dp=30, het_ab=0.3,
+                             hom_ab=0.8, del_dhffc=0.7, dup_dhbfc=1.3),
+                  SvGtFilter(vcf, dp=2, ref_ab_filter=0.05)]
+    fields = set()
+    for f in gt_filters:
+        fields.update(f.fields)
+    vcf.require_genotypes(samples, fields)
+    n = 0
+    for record in vcf:
+        if not record.IS_SV:
+            continue
+        gm = record.genotypes
+        svtype = record.info['SVTYPE']
+        for f in gt_filters:
+            expected = [f.gt_is_ok(record.samples, s, 1, svtype) for s in
+                        samples]
+            assert_equal(list(f.gt_ok_mask(gm, 1, svtype=svtype)), expected)
+            if f.ad_over_threshold is not None:
+                expected = [f.ad_over_threshold(record.samples, s, 1) for s
+                            in samples]
+                assert_equal(list(f.ad_over_threshold_mask(gm, 1)), expected)
+            n += 1
+    assert_true(n > 0)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
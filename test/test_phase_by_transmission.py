@@ -0,0 +1,34 @@
+from .utils import *
+
+indexed_vcf = os.path.join(dir_path, 'test_data', 'ex9.vcf.gz')
+ped = os.path.join(dir_path, 'test_data', 'test.ped')
+
+
+def _phase(input, processes):
+    output = get_tmp_out()
+    proc = run_script('phase_by_transmission',
+                      ['-i', input, '-p', ped, '-o', output, '--gq', '20',
+                       '--processes', str(processes), '--no_progress'])
+    results = records_from_vcf(output)
+    os.remove(output)
+    return results, proc.stderr
+
+
+def test_phase_processes():
+    results, _ = _phase(indexed_vcf, 1)
+    assert_true(any('|' in x.split("\t")[9] for x in results))
+    parallel, _ = _phase(indexed_vcf, 3)
+    assert_equal(results, parallel)
+
+
+def test_phase_processes_no_index():
+    vcf = input_prefix + '.bcf'
+    results, _ = _phase(vcf, 1)
+    parallel, stderr = _phase(vcf, 3)
+    assert_true("Using a single process" in stderr)
+    assert_equal(results, parallel)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
@@ -1,12 +1,15 @@
 from .utils import *
 from vase.vase_reporter import VaseReporter
+from vase.rest_cache import RestCache
 import xlrd
 import json
+import re
 from collections import defaultdict
 
 rep_input = os.path.join(dir_path, 'test_data', 'ex7.bcf')
 ped = os.path.join(dir_path, "test_data", "test4.ped")
 g2p = os.path.join(dir_path, "test_data", "test_g2p.csv")
+enst_re = re.compile(r'''FEATURE_(\d+)''')
 
 
 def _get_xlsx_output(xlsx, fam):
@@ -191,6 +194,81 @@ def test_reporter_singleton():
     assert_equal(results, expected)
 
 
+def _enst_input():
+    '''
+        Write a copy of rep_input with feature IDs converted to Ensembl
+        transcript IDs (e.g. FEATURE_149 to ENST00000000149) so that REST
+        lookups are attempted.
+    '''
+    vcf = get_tmp_out()
+    with pysam.VariantFile(rep_input) as vin:
+        with open(vcf, 'wt') as vout:
+            vout.write(str(vin.header))
+            for record in vin:
+                vout.write(enst_re.sub(_to_enst, str(record)))
+    return vcf
+
+
+def _to_enst(match):
+    return 'ENST{:011d}'.format(int(match.group(1)))
+
+
+def test_reporter_offline():
+    output = get_tmp_out(suffix='.json')
+    db = get_tmp_out(suffix='.sqlite')
+    vcf = _enst_input()
+    kwargs = dict(
+        ped=ped,
+        force=True,
+        quiet=True,
+        output_type='json',
+        rest_lookups=True,
+        offline=True,
+    )
+    assert_raises(RuntimeError, VaseReporter, vcf, output, **kwargs)
+    # only lookups for ENST00000000149 (GENE_58) are cached, excepting
+    # orthology lookups
+    cache = RestCache(db)
+    server = "https://rest.ensembl.org"
+    cache.set(server, '/xrefs/id/ENST00000000149',
+              'all_levels=0;external_db=GO',
+              [{'description': 'test process'}])
+    cache.set(server, '/xrefs/id/GENE_58', 'all_levels=0;external_db=',
+              [{'primary_id': '1234', 'dbname': 'EntrezGene',
+                'description': 'test gene'},
+               {'primary_id': 'R-1', 'dbname': 'Reactome_gene',
+                'description': 'test pathway'}])
+    cache.close()
+    vr = VaseReporter(vcf, output, cache=db, **kwargs)
+    vr.write_report()
+    with open(output, 'rt') as rfile:
+        results = json.load(rfile)
+    expect_json = os.path.join(
+        dir_path, "test_data", "expected_outputs", "test_reporter.json")
+    with open(expect_json, 'rt') as efile:
+        expected = json.load(efile)
+    rest_cols = ["ENTREZ", "Full_Name", "GO", "REACTOME", "MOUSE_TRAITS",
+                 "MIM_MORBID"]
+    features = set()
+    for fam in results:
+        for row in results[fam]:
+            features.add(row['Feature'])
+            # cache misses are left blank rather than 'LOOKUP FAILED'
+            cached = dict((c, '') for c in rest_cols)
+            if row['Gene'] == 'GENE_58':
+                cached.update(ENTREZ='1234', Full_Name='test gene',
+                              REACTOME='test pathway')
+                if row['Feature'] == 'ENST00000000149':
+                    cached['GO'] = 'test process'
+            assert_equal(dict((c, row.pop(c)) for c in rest_cols), cached)
+            row['Feature'] = re.sub(r'''ENST0*(\d+)''', r'''FEATURE_\1''',
+                                    row['Feature'])
+    assert_true('ENST00000000149' in features)
+    assert_equal(results, expected)
+    for f in (output, db, vcf):
+        os.remove(f)
+
+
 if __name__ == '__main__':
     import nose
     nose.run(defaultTest=__name__)
@@ -0,0 +1,58 @@
+from .utils import *
+import time
+from vase.rest_cache import RestCache
+from vase.ensembl_rest_queries import EnsemblRestQueries, OfflineLookupError
+
+# nothing should be listening here - any attempt to connect will fail
+no_server = "http://localhost:1"
+
+
+def test_rest_cache():
+    db = get_tmp_out(suffix='.sqlite')
+    cache = RestCache(db)
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=0'),
+                 (False, None))
+    data = [{'id': 'X', 'description': None}]
+    cache.set('server', '/lookup/id/X', 'expand=0', data)
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=0'), (True, data))
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=1'),
+                 (False, None))
+    assert_equal(cache.get('other', '/lookup/id/X', 'expand=0'),
+                 (False, None))
+    assert_equal((cache.hits, cache.misses), (1, 3))
+    cache.close()
+    # entries persist between instances
+    cache = RestCache(db, ttl=1)
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=0'), (True, data))
+    cache.conn.execute("UPDATE cache SET retrieved=?", (time.time() - 86401,))
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=0'),
+                 (False, None))
+    assert_equal(cache.get('server', '/lookup/id/X', 'expand=0',
+                           ignore_ttl=True), (True, data))
+    cache.close()
+    assert_raises(ValueError, RestCache, db, ttl=-1)
+    os.remove(db)
+
+
+def test_cached_rest_queries():
+    db = get_tmp_out(suffix='.sqlite')
+    cache = RestCache(db)
+    data = {'id': 'ENSG00000000001', 'Parent': 'ENSG00000000002'}
+    cache.set(no_server, '/lookup/id/ENST00000000001', 'expand=0;phenotypes=0',
+              data)
+    ensr = EnsemblRestQueries(custom_server=no_server, cache=cache,
+                              max_retries=0)
+    assert_equal(ensr.lookup_id('ENST00000000001'), data)
+    assert_raises(Exception, ensr.lookup_id, 'ENST00000000002')
+    ensr = EnsemblRestQueries(custom_server=no_server, cache=cache,
+                              offline=True)
+    assert_equal(ensr.lookup_id('ENST00000000001'), data)
+    assert_raises(OfflineLookupError, ensr.lookup_id, 'ENST00000000002')
+    assert_raises(ValueError, EnsemblRestQueries, offline=True)
+    cache.close()
+    os.remove(db)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
@@ -1,4 +1,10 @@
 from .utils import *
+from vase.vcf_reader import VcfReader
+from vase.feature_index import FeatureIndex
+from vase.ped_file import PedFile
+from vase.family_filter import FamilyFilter, DominantFilter, \
+    DeNovoFilter
+from vase.sample_filter import SampleFilter
 
 def test_case_control():
     output = get_tmp_out()
@@ -15,6 +21,68 @@ def test_case_control():
     os.remove(output)
 
 
+
+def test_subset_samples():
+    results = []
+    for subset in (False, True):
+        output = get_tmp_out()
+        test_args = dict(
+            cases=['Sample3'],
+            controls=['Sample2'],
+            het_ab=0.005,
+            gq=20,
+            control_max_ref_ab=0.05,
+            subset_samples=subset,
+            output=output,
+        )
+        run_args(test_args)
+        results.append(convert_results(output))
+        with pysam.VariantFile(output) as vcf:
+            samples = list(vcf.header.samples)
+        os.remove(output)
+    assert_equal(results[0], results[1])
+    assert_true(len(results[1]) > 0)
+    assert_equal(samples, ['Sample2', 'Sample3'])
+
+
+def _vcf_with_recalculated_ac(vcf):
+    ''' Write a copy of vcf with INFO AC/AN calculated from genotypes '''
+    output = get_tmp_out()
+    with pysam.VariantFile(vcf) as vin:
+        with pysam.VariantFile(output, 'w', header=vin.header) as vout:
+            for record in vin:
+                gts = [a for s in record.samples.values() for a in s['GT']
+                       if a is not None]
+                record.info['AC'] = [gts.count(i) for i in
+                                     range(1, len(record.alleles))]
+                record.info['AN'] = len(gts)
+                vout.write(record)
+    return output
+
+
+def test_controls_from_ac():
+    input = _vcf_with_recalculated_ac(
+        os.path.join(dir_path, 'test_data', 'ex1.bcf'))
+    for n_controls in (None, 1, 2):
+        results = []
+        for from_ac in (False, True):
+            output = get_tmp_out()
+            test_args = dict(
+                input=input,
+                cases=['Sample1'],
+                controls=['all'],
+                n_controls=n_controls,
+                control_gq=0,
+                controls_from_ac=from_ac,
+                output=output,
+            )
+            run_args(test_args)
+            results.append(convert_results(output))
+            os.remove(output)
+        assert_true(len(results[0]) > 0)
+        assert_equal(results[0], results[1])
+    os.remove(input)
+
 def test_de_novo():
     output = get_tmp_out()
     test_args = dict(
@@ -113,6 +181,167 @@ def test_biallelic3():
     os.remove(output)
 
 
+def _feature_bed():
+    ''' Write BED of VEP Feature coordinates spanned by input records '''
+    spans = dict()
+    for record in VcfReader(input_prefix + '.bcf'):
+        for feat in set(x['Feature'] for x in record.CSQ):
+            if not feat:
+                continue
+            if feat in spans:
+                spans[feat][2] = max(spans[feat][2], record.stop)
+            else:
+                spans[feat] = [record.chrom, record.start, record.stop]
+    bed = get_tmp_out() + '.bed'
+    with open(bed, 'wt') as fh:
+        for feat, span in spans.items():
+            fh.write("\t".join(str(x) for x in span + [feat]) + "\n")
+    return bed
+
+
+def test_feature_coordinates():
+    bed = _feature_bed()
+    arg_sets = [dict(biallelic=True, csq=[]),
+                dict(biallelic=True, impact=['HIGH', 'MODERATE']),
+                dict(singleton_recessive=['Sample1', 'Sample3'], csq=[],
+                     min_families=2),
+                dict(singleton_dominant=['Sample1', 'Sample2'], csq=[],
+                     min_families=2)]
+    for test_args in arg_sets:
+        results = []
+        for feature_coordinates in (None, bed):
+            output = get_tmp_out()
+            if 'biallelic' in test_args:
+                test_args['ped'] = os.path.join(dir_path, "test_data",
+                                                "test.ped")
+            test_args.update(feature_coordinates=feature_coordinates,
+                             gene_padding=0,
+                             output=output)
+            run_args(test_args)
+            results.append(convert_results(output))
+            os.remove(output)
+        assert_true(len(results[0]) > 0)
+        assert_equal(results[0], results[1])
+    os.remove(bed)
+
+def _partial_feature_inputs():
+    '''
+        Write a VCF, PED, G2P CSV and a BED covering only some of the
+        VCF's features. Features D and E are in the BED, feature A is
+        not and feature G is not a G2P gene.
+    '''
+    samples = ['Child1', 'Dad1', 'Mum1', 'Child2', 'Dad2', 'Mum2']
+    ref = '0/0:20,0:20:99'
+    het = '0/1:10,10:20:99'
+    header = ['##fileformat=VCFv4.2',
+              '##contig=<ID=1,length=1000000>',
+              '##INFO=<ID=CSQ,Number=.,Type=String,Description="' +
+              'Consequence annotations from Ensembl VEP. Format: ' +
+              'Allele|Consequence|IMPACT|SYMBOL|Gene|Feature_type|Feature|' +
+              'BIOTYPE">',
+              '##FORMAT=<ID=GT,Number=1,Type=String,Description="GT">',
+              '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="AD">',
+              '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="DP">',
+              '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="GQ">',
+              "\t".join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL',
+                         'FILTER', 'INFO', 'FORMAT'] + samples)]
+    vcf = get_tmp_out()
+    with open(vcf, 'wt') as fh:
+        fh.write("\n".join(header) + "\n")
+        for pos, feat, child in ((100, 'D', 0), (120, 'D', 3), (200, 'A', 0),
+                                 (300, 'A', 3), (400, 'E', 0), (410, 'E', 3),
+                                 (500, 'G', 0)):
+            gts = [ref] * len(samples)
+            gts[child] = het
+            csq = 'T|missense_variant|MODERATE|SYM_{0}|GENE_{0}|'.format(
+                feat) + 'Transcript|{}|protein_coding'.format(feat)
+            fh.write("\t".join(['1', str(pos), '.', 'C', 'T', '100', 'PASS',
+                                'CSQ=' + csq, 'GT:AD:DP:GQ'] + gts) + "\n")
+    ped = get_tmp_out(suffix='.ped')
+    with open(ped, 'wt') as fh:
+        for i in (1, 2):
+            fh.write("Fam{0}\tChild{0}\tDad{0}\tMum{0}\t0\t2\n".format(i))
+            fh.write("Fam{0}\tDad{0}\t0\t0\t1\t1\n".format(i))
+            fh.write("Fam{0}\tMum{0}\t0\t0\t2\t1\n".format(i))
+    g2p = get_tmp_out(suffix='.csv')
+    with open(g2p, 'wt') as fh:
+        fh.write('"gene symbol","disease name","DDD category",' +
+                 '"allelic requirement","mutation consequence",' +
+                 '"organ specificity list","prev symbols"\n')
+        for feat in 'DAE':
+            fh.write('SYM_{},DISEASE,confirmed,monoallelic,'.format(feat) +
+                     '"all missense/in frame",,\n')
+    bed = get_tmp_out(suffix='.bed')
+    with open(bed, 'wt') as fh:
+        fh.write("1\t99\t250\tD\n1\t399\t450\tE\n")
+    return vcf, ped, g2p, bed
+
+
+def test_feature_coordinates_partial():
+    vcf, ped, g2p, bed = _partial_feature_inputs()
+    arg_sets = [dict(singleton_dominant=['Child1', 'Child2']),
+                dict(singleton_dominant=['Child1', 'Child2'], g2p=g2p,
+                     check_g2p_inheritance=True),
+                dict(de_novo=True, ped=ped),
+                dict(de_novo=True, ped=ped, g2p=g2p,
+                     check_g2p_inheritance=True)]
+    for test_args in arg_sets:
+        results = []
+        for feature_coordinates in (None, bed):
+            output = get_tmp_out()
+            test_args.update(input=vcf,
+                             min_families=2,
+                             feature_coordinates=feature_coordinates,
+                             gene_padding=0,
+                             output=output)
+            run_args(test_args)
+            with open(output, 'rt') as fh:
+                results.append([int(x.split()[1]) for x in fh if x[0] !=
+                                '#'])
+            os.remove(output)
+        assert_equal(results[0], [100, 120, 200, 300, 400, 410])
+        assert_equal(results[0], results[1])
+    for f in (vcf, ped, g2p, bed):
+        os.remove(f)
+
+
+def test_max_cache_mb():
+    bed = _feature_bed()
+    arg_sets = [dict(biallelic=True, csq=[]),
+                dict(biallelic=True, csq=[], feature_coordinates=bed),
+                dict(singleton_recessive=['Sample1', 'Sample3'], csq=[],
+                     min_families=2),
+                dict(singleton_dominant=['Sample1', 'Sample2'], csq=[],
+                     min_families=2, feature_coordinates=bed)]
+    for test_args in arg_sets:
+        results = []
+        for max_cache_mb in (None, 0):
+            output = get_tmp_out()
+            if 'biallelic' in test_args:
+                test_args['ped'] = os.path.join(dir_path, "test_data",
+                                                "test.ped")
+            test_args.update(max_cache_mb=max_cache_mb,
+                             gene_padding=0,
+                             output=output)
+            run_args(test_args)
+            with open(output, 'rt') as fh:
+                results.append([x for x in fh if x[0] != '#'])
+            os.remove(output)
+        assert_true(len(results[0]) > 0)
+        assert_equal(results[0], results[1])
+    os.remove(bed)
+
+def test_feature_index_gtf():
+    gtf = os.path.join(dir_path, "test_data", "test_genes.gtf")
+    index = FeatureIndex(gtf, padding=10, contigs=['chr1'])
+    assert_equal(index.ends['TRANSCRIPT_1'], ('chr1', 30))
+    assert_equal(index.ends['GENE_1'], ('chr1', 30))
+    assert_equal(index.ends['GENE_1.1'], ('chr1', 30))
+    assert_true(index.is_open('TRANSCRIPT_1', 'chr1', 30))
+    assert_false(index.is_open('TRANSCRIPT_1', 'chr1', 31))
+    assert_false(index.is_open('TRANSCRIPT_1', 'chr2', 1))
+    assert_false(index.is_open('NOT_A_FEATURE', 'chr1', 1))
+
 def test_biallelic_no_ped():
     output = get_tmp_out()
     test_args = dict(
@@ -161,6 +390,63 @@ def test_dominant():
     assert_equal(results, expected)
     os.remove(output)
 
+def test_dominant_families():
+    vcf = VcfReader(input_prefix + '.bcf')
+    ped = get_tmp_out(suffix='.ped')
+    with open(ped, 'wt') as fh:
+        fh.write("Fam1\tSample1\t0\t0\t2\t2\n" +
+                 "Fam2\tSample2\t0\t0\t2\t2\n" +
+                 "Fam3\tSample3\t0\t0\t1\t2\n" +
+                 "Fam3\tSample4\t0\t0\t1\t1\n")
+    gt_args = dict(gq=20, het_ab=0.1)
+    family_filter = FamilyFilter(PedFile(ped), vcf)
+    dom_filter = DominantFilter(family_filter, dict(gt_args))
+    assert_equal(dom_filter.families, ('Fam1', 'Fam2', 'Fam3'))
+    fam_filters = [SampleFilter(vcf, cases=dom_filter.fam_cases[f],
+                                controls=dom_filter.fam_controls[f],
+                                confirm_missing=True, **gt_args)
+                   for f in dom_filter.families]
+    n = 0
+    for record in vcf:
+        for allele in range(1, len(record.alleles)):
+            expected = [not f.filter(record, allele) and
+                        dom_filter.confirm_heterozygous(record, f.cases)
+                        for f in fam_filters]
+            fams = dom_filter.segregating_families(record, allele)
+            assert_equal(fams.tolist(), expected)
+            n += sum(expected)
+    assert_true(n > 0)
+    os.remove(ped)
+def test_de_novo_trios():
+    ped = get_tmp_out(suffix='.ped')
+    with open(ped, 'wt') as fh:
+        fh.write("Fam1\tSample1\tSample2\tSample3\t2\t2\n" +
+                 "Fam1\tSample2\t0\t0\t1\t1\n" +
+                 "Fam1\tSample3\t0\t0\t2\t1\n")
+    for confirm_het in (False, True):
+        vcf = VcfReader(input_prefix + '.bcf')
+        gt_args = dict(gq=20, het_ab=0.1)
+        family_filter = FamilyFilter(PedFile(ped), vcf)
+        dn_filter = DeNovoFilter(family_filter, dict(gt_args),
+                                 confirm_het=confirm_het)
+        assert_equal(dn_filter.trio_children, [('Sample1',)])
+        assert_equal(dn_filter.trio_parents, [('Sample2', 'Sample3')])
+        trio_filter = SampleFilter(vcf, cases=['Sample1'],
+                                   controls=['Sample2', 'Sample3'],
+                                   confirm_missing=True, **gt_args)
+        n = 0
+        for record in vcf:
+            for allele in range(1, len(record.alleles)):
+                expected = not trio_filter.filter(record, allele)
+                if confirm_het:
+                    expected = expected and dn_filter.confirm_heterozygous(
+                        record, ['Sample1'])
+                trios = dn_filter.segregating_groups(record, allele,
+                                                     confirm_het)
+                assert_equal(trios.tolist(), [expected])
+                n += expected
+        assert_true(n > 0)
+    os.remove(ped)
 
 if __name__ == '__main__':
     import nose
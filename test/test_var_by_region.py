@@ -1,4 +1,9 @@
 from .utils import *
+import shutil
+from vase.bed_parser import BedParser
+from vase.var_by_region import RegionFinder, VarByRegion
+from vase.region_iter import RegionIter
+from vase.vcf_reader import VcfReader
 
 bed = os.path.join(dir_path, 'test_data', 'test_regions.bed')
 
@@ -51,6 +56,7 @@ def test_var_from_gene_bed():
     test_args = dict(
         input=input_prefix + '.vcf.gz',
         gene_bed=bed,
+        gene_padding=0,
         output=output,
     )
     results, expected = run_args(test_args, output,
@@ -61,6 +67,105 @@ def test_var_from_gene_bed():
     os.remove(output)
 
 
+def test_var_from_gene_bed_padding():
+    unpadded = get_expected_out('test_var_from_gene_bed')
+    padded = BedParser(bed, padding=5000)
+    assert_equal([(x.start, x.end) for x in padded.intervals],
+                 [(1055741, 1066726), (1078579, 1089363)])
+    rf = RegionFinder(padded.intervals)
+    for stream in (False, True):
+        output = get_tmp_out()
+        test_args = dict(
+            input=input_prefix + '.vcf.gz',
+            gene_bed=bed,
+            gene_padding=5000,
+            stream=stream,
+            output=output,
+        )
+        run_args(test_args)
+        results = convert_results(output)
+        assert_true(set(unpadded).issubset(results))
+        assert_true(len(results) > len(unpadded))
+        # extra variants must lie within the padded intervals
+        for var in set(results) - set(unpadded):
+            pos = int(var.split(':')[1].split('-')[0])
+            assert_true(rf.fetch('1', pos, pos))
+        if stream:
+            assert_equal(results, indexed)
+        else:
+            indexed = results
+        os.remove(output)
+
+
+def test_region_finder():
+    rf = RegionFinder(BedParser(bed).intervals)
+    assert_equal(rf.fetch('1', 1060742, 1060742)[0].start, 1060741)
+    assert_equal(rf.fetch('1', 1060700, 1060741), [])
+    assert_equal(rf.fetch('1', 1061727, 1061800), [])
+    assert_equal(rf.fetch('2', 1060742, 1060742), [])
+    assert_equal(len(rf.fetch('1', 1061700, 1083580)), 2)
+    hits = rf.overlaps('1', [1060700, 1060742, 1061726, 1061727, 1084363],
+                       [1060741, 1060742, 1061726, 1083579, 1084400])
+    assert_equal(list(hits), [False, True, True, False, True])
+    assert_equal(list(rf.overlaps('2', [1060742], [1060742])), [False])
+
+
+def test_gene_targets():
+    regions = RegionIter(['1:1060742-1061726'])
+    regions.intervals[0].regions[0].append(
+        'ENSG00000187583/ENST00000379410.8/ENSP00000368719/PLEKHN1')
+    vbr = VarByRegion(VcfReader(input_prefix + '.vcf.gz'),
+                      region_iter=regions, gene_targets=True)
+    targets = regions.intervals[0].targets
+    assert_equal(targets, {'Gene': frozenset(['ENSG00000187583']),
+                           'Feature': frozenset(['ENST00000379410.8']),
+                           'ENSP': frozenset(['ENSP00000368719']),
+                           'SYMBOL': frozenset(['PLEKHN1'])})
+    for record in vbr:
+        assert_true(vbr.current_targets is targets)
+        assert_true(vbr.target_in_csq(dict(Feature='ENST00000379410.8',
+                                           Gene='', ENSP='', SYMBOL='')))
+        assert_false(vbr.target_in_csq(dict(Feature='ENST00000379410',
+                                            Gene='', ENSP='', SYMBOL='')))
+
+
+def test_index_summary():
+    for suffix in ('.vcf.gz', '.bcf'):
+        vcf = VcfReader(input_prefix + suffix)
+        summary = vcf.index_summary('1')
+        assert_equal(list(summary.has_records([1060741, 100000000, 0],
+                                              [1061726, 100000100, 10])),
+                     [True, False, False])
+        begins, ends = summary.byte_ranges([1060741, 1083579],
+                                           [1061726, 1084363])
+        assert_true(all(begins < ends))
+        assert_true(all(ends <= summary.end))
+        assert_true(begins[0] <= begins[1])
+        assert_equal(vcf.index_summary('foo'), None)
+
+
+def test_var_by_region_vcf_csi():
+    # copy VCF so that it only has a CSI index
+    vcf = get_tmp_out(suffix='.vcf.gz')
+    shutil.copy(input_prefix + '.vcf.gz', vcf)
+    pysam.tabix_index(vcf, preset='vcf', csi=True, force=True)
+    assert_equal(VcfReader(vcf).index, vcf + '.csi')
+    summary = VcfReader(vcf).index_summary('1')
+    assert_equal(list(summary.has_records([1060741, 100000000],
+                                          [1061726, 100000100])),
+                 [True, False])
+    output = get_tmp_out()
+    test_args = dict(
+        input=vcf,
+        region=['1:1060742-1061726', '1:1083580-1084363'],
+        output=output,
+    )
+    results, expected = run_args(test_args, output, 'test_var_by_region')
+    assert_equal(results, expected)
+    for f in (output, vcf, vcf + '.csi'):
+        os.remove(f)
+
+
 def var_by_region(suffix, stream=False):
     output = get_tmp_out()
     test_args = dict(
@@ -1,4 +1,5 @@
 from .utils import *
+from vase.vcf_reader import VcfReader
 
 
 def test_read_bcf():
@@ -154,6 +155,37 @@ def test_sv_vartype():
     os.remove(output)
 
 
+def test_in_cis_with():
+    vcf = get_tmp_out() + '.vcf'
+    with open(vcf, 'wt') as fh:
+        fh.write('\n'.join([
+            '##fileformat=VCFv4.2',
+            '##contig=<ID=1,length=1000>',
+            '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+            '##FORMAT=<ID=PID,Number=1,Type=String,Description="Phase ID">',
+            '##FORMAT=<ID=PGT,Number=1,Type=String,Description="Phase GT">',
+            '\t'.join(['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL',
+                       'FILTER', 'INFO', 'FORMAT', 'S1', 'S2', 'S3']),
+            '\t'.join(['1', '100', '.', 'A', 'G', '.', '.', '.',
+                       'GT:PID:PGT', '0|1:.:.', '0/1:100_A_G:0|1',
+                       '0/1:100_A_G:0|1']),
+            '\t'.join(['1', '110', '.', 'C', 'T', '.', '.', '.',
+                       'GT:PID:PGT', '0|1:.:.', '0/1:100_A_G:0|1',
+                       '0/1:100_A_G:1|0']),
+            '\t'.join(['1', '120', '.', 'G', 'A', '.', '.', '.',
+                       'GT:PID:PGT', '1|0:.:.', '0/1:.:.', '0/1:120_G_A:0|1']),
+        ]) + '\n')
+    records = list(VcfReader(vcf))
+    expected = {'S1': [True, False, False],
+                'S2': [True, False, False],
+                'S3': [False, False, False]}
+    for s, exp in expected.items():
+        assert_equal([records[0].in_cis_with(s, 1, records[1], 1),
+                      records[0].in_cis_with(s, 1, records[2], 1),
+                      records[1].in_cis_with(s, 1, records[2], 1)], exp)
+    os.remove(vcf)
+
+
 if __name__ == '__main__':
     import nose
     nose.run(defaultTest=__name__)
@@ -0,0 +1,75 @@
+from .utils import *
+from vase.vcf_reader import VcfReader
+from vase.vcf_chunks import get_chunks, chunk_records
+
+indexed_vcf = os.path.join(dir_path, 'test_data', 'ex9.vcf.gz')
+
+
+def test_get_chunks():
+    chunks = get_chunks(indexed_vcf, 8)
+    assert_true(len(chunks) >= 8)
+    assert_equal(chunks[0][:2], ('1', 0))
+    assert_true(chunks[-2][2] < 249250621)
+    assert_equal(chunks[-1][2], None)
+    for i in range(1, len(chunks)):
+        assert_equal(chunks[i][1], chunks[i - 1][2])
+
+
+def test_chunk_records():
+    expected = [(r.chrom, r.pos, r.ref, r.alt) for r in
+                VcfReader(indexed_vcf)]
+    results = []
+    for n_chunks in (1, 4, 1000):
+        results = []
+        vcf = VcfReader(indexed_vcf)
+        for chunk in get_chunks(indexed_vcf, n_chunks):
+            results.extend((r.chrom, r.pos, r.ref, r.alt) for r in
+                           chunk_records(vcf, chunk))
+        assert_equal(results, expected)
+
+
+def _records_past_contig_ends():
+    '''
+        Write an indexed VCF with records beyond the contig lengths
+        given in its header.
+    '''
+    vcf = get_tmp_out(suffix='.vcf')
+    with open(vcf, 'wt') as fh:
+        fh.write("##fileformat=VCFv4.2\n")
+        for contig in ('1', 'Y'):
+            fh.write("##contig=<ID={},length=1000>\n".format(contig))
+        fh.write("#" + "\t".join(["CHROM", "POS", "ID", "REF", "ALT", "QUAL",
+                                  "FILTER", "INFO"]) + "\n")
+        for contig in ('1', 'Y'):
+            for pos in range(100, 5000, 100):
+                fh.write("\t".join([contig, str(pos), ".", "A", "G", ".",
+                                    ".", "."]) + "\n")
+    return pysam.tabix_index(vcf, preset='vcf', force=True)
+
+
+def test_chunk_records_past_contig_end():
+    vcf_gz = _records_past_contig_ends()
+    expected = [(r.chrom, r.pos) for r in VcfReader(vcf_gz)]
+    assert_equal(len(expected), 98)
+    for n_chunks in (1, 3, 10):
+        chunks = get_chunks(vcf_gz, n_chunks)
+        for contig in ('1', 'Y'):
+            ends = [c[2] for c in chunks if c[0] == contig]
+            assert_equal(ends[-1], None)
+            assert_true(None not in ends[:-1])
+        results = []
+        vcf = VcfReader(vcf_gz)
+        for chunk in chunks:
+            results.extend((r.chrom, r.pos) for r in chunk_records(vcf, chunk))
+        assert_equal(results, expected)
+    for f in (vcf_gz, vcf_gz + '.tbi'):
+        os.remove(f)
+
+
+def test_chunks_no_index():
+    assert_raises(ValueError, get_chunks, input_prefix + '.vcf', 4)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.run(defaultTest=__name__)
@@ -1,5 +1,6 @@
 from .utils import *
 from vase.vep_filter import VepFilter
+from vase.insilico_filter import InSilicoFilter
 from vase.vcf_reader import VcfReader
 
 is_input = os.path.join(dir_path, 'test_data', 'ex5.bcf')
@@ -234,6 +235,40 @@ def test_canonical_lof():
     assert_equal(expected_alts, results_alts)
 
 
+def test_memoized_decisions():
+    results = []
+    memo = []
+    for memo_size in (0, 65536):
+        vcf = VcfReader(is_input)
+        csq_filter = VepFilter(
+            vcf=vcf,
+            csq=['default'],
+            in_silico=['sift', 'polyphen=probably_damaging'],
+            splice_in_silico=['ada_score=0.6'],
+            loftee=True,
+            memo_size=memo_size)
+        results.append([csq_filter.filter(record) for record in vcf])
+        memo.append(csq_filter.memo_info())
+    assert_equal(results[0], results[1])
+    assert_equal(memo[0][0], 0)
+    assert_equal(memo[0][2], 0)
+    assert_true(memo[1][0] > 0)
+    assert_equal(memo[1][0] + memo[1][1], memo[0][1])
+
+
+def test_memoized_insilico():
+    csqs = [c for record in VcfReader(is_input) for c in record.CSQ]
+    results = []
+    for memo_size in (0, 8192):
+        is_filter = InSilicoFilter(['sift', 'polyphen=probably_damaging'],
+                                   memo_size=memo_size)
+        results.append([is_filter.filter(c) for c in csqs])
+    assert_equal(results[0], results[1])
+    assert_equal(is_filter.memo_info().hits + is_filter.memo_info().misses,
+                 len(csqs))
+    assert_true(is_filter.memo_info().hits > 0)
+
+
 if __name__ == '__main__':
     import nose
     nose.run(defaultTest=__name__)
@@ -2,10 +2,12 @@ import sys
 import os
 import tempfile
 import gzip
+import subprocess
 import pysam
 import numpy as np
 from nose.tools import *
 from vase.vase_runner import VaseRunner
+from vase.burden_counter import read_burden_matrix
 from argparse import Namespace
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -21,7 +23,9 @@ all_args = {
     'output': None,
     'report_prefix': None,
     'burden_counts': None,
+    'burden_matrix': None,
     'gnomad_burden': False,
+    'subset_samples': False,
     'variant_quality': None,
     'pass_filters': False,
     'keep_filters': None,
@@ -57,6 +61,8 @@ all_args = {
     'g2p': None,
     'check_g2p_consequence': False,
     'check_g2p_inheritance': False,
+    'gene_annotation': None,
+    'gene_padding': 5000,
     'region': None,
     'bed': None,
     'gene_bed': None,
@@ -71,6 +77,9 @@ all_args = {
     'gnomad': [],
     'gnomad_pops': ['AFR', 'AMR', 'EAS', 'FIN', 'NFE', 'SAS'],
     'vcf_filter': [],
+    'cohort_db': None,
+    'cohort_max_carriers': 0,
+    'cohort_max_homozygotes': None,
     'dng_vcf': None,
     'freq': None,
     'min_freq': None,
@@ -117,10 +126,13 @@ all_args = {
     'n_cases': None,
     'n_controls': None,
     'confirm_control_gts': False,
+    'controls_from_ac': False,
     'biallelic': False,
     'de_novo': False,
     'dominant': False,
     'min_families': 1,
+    'feature_coordinates': None,
+    'max_cache_mb': None,
     'singleton_recessive': [],
     'singleton_dominant': [],
     'seg_controls': [],
@@ -182,3 +194,55 @@ def run_args(args, output=None, func_name=None):
         results = convert_results(output)
         expected = get_expected_out(func_name)
         return (results, expected)
+
+
+def run_burden_counts(cases, controls=[], matrix=None, **kwargs):
+    '''
+        Run VASE counting alleles with 'default' consequences for the
+        given cases and controls. Returns the lines of the
+        --burden_counts output and the arrays written using the
+        --burden_matrix option. If matrix is given, the burden matrix is
+        written to this file and not removed.
+    '''
+    output = get_tmp_out(suffix='.txt')
+    keep_matrix = matrix is not None
+    if matrix is None:
+        matrix = get_tmp_out(suffix='.npz')
+    test_args = dict(
+        cases=cases,
+        controls=controls,
+        burden_counts=output,
+        burden_matrix=matrix,
+        csq=["default"],
+        output='/dev/null',
+    )
+    test_args.update(kwargs)
+    run_args(test_args)
+    with open(output, 'rt') as infile:
+        lines = infile.read().split("\n")
+    m = read_burden_matrix(matrix)
+    os.remove(output)
+    if not keep_matrix:
+        os.remove(matrix)
+    return lines, m
+
+
+def run_script(script, args):
+    '''
+        Run one of the programs in the bin directory with the given list
+        of arguments and return the CompletedProcess. Raises
+        CalledProcessError if the program fails.
+    '''
+    root = os.path.dirname(dir_path)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        x for x in (root, env.get('PYTHONPATH')) if x)
+    return subprocess.run([sys.executable, os.path.join(root, 'bin', script)]
+                          + args, env=env, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def records_from_vcf(f):
+    ''' Return a list of all records in VCF/BCF f as strings. '''
+    with pysam.VariantFile(f) as vcf:
+        return [str(x) for x in vcf]
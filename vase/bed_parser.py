@@ -9,16 +9,28 @@ class BedParser(IntervalIter):
         property of the GenomicInterval object.
     '''
 
-    __slots__ = ['bed', 'min_col', 'intervals']
+    __slots__ = ['bed', 'min_col', 'padding', 'intervals']
 
-    def __init__(self, bed, min_col=3):
+    def __init__(self, bed, min_col=3, padding=0):
         '''
             Opens given bed file, reads into memory. Regions are sorted
             and merged to provide non-overlapping intervals for
             traversal.
+
+            Args:
+                bed:    BED file (optionally gzip/bgzip compressed).
+
+                min_col:
+                        Minimum number of columns required for each
+                        line. Default=3.
+
+                padding:
+                        Number of bp to add to either side of each
+                        interval. Default=0.
         '''
         self.bed = bed
         self.min_col = min_col if min_col > 3 else 3
+        self.padding = padding
         intervals = self._read_bed()
         super().__init__(intervals)
 
@@ -34,8 +46,8 @@ class BedParser(IntervalIter):
             if len(s) < self.min_col:
                 raise BedFormatError("Not enough fields in BED line: " + line)
             try:
-                s[1] = int(s[1])
-                s[2] = int(s[2])
+                s[1] = max(int(s[1]) - self.padding, 0)
+                s[2] = int(s[2]) + self.padding
             except ValueError:
                 raise BedFormatError("Columns 2 and 3 must be integers (for " +
                                      "line: "+ line + ")")
@@ -1,7 +1,204 @@
 import re
+import numpy as np
 from .sample_filter import GtFilter
 from collections import defaultdict
 
+MATRIX_CHUNK = 65536
+
+
+def read_burden_matrix(filename):
+    '''
+        Read burden counts written by BurdenCounter.write_matrix or
+        merge_burden_counts and return a dict of its arrays.
+
+        The 'features' and 'genes' arrays give feature IDs and the gene
+        for each feature. 'groups' gives the names of the count groups
+        (i.e. 'Cases' and/or 'Controls' or gnomAD populations),
+        'group_counts' the allele counts per feature and group and
+        'total_alleles' the total number of alleles for each group.
+
+        'feature_order' gives, for each feature, the contig index (in
+        the VCF header), position, 0-based ALT allele index and rank
+        within the record's counted features of the first allele counted
+        for the feature. Features are sorted on these values so that
+        merged counts are in the same order as those of a single run.
+
+        If counts were made from sample genotypes, the 'samples' array
+        gives sample IDs and 'n_cases' gives the number of samples (at
+        the start of the samples array) that are cases, the remainder
+        being controls. Non-zero per-sample allele counts are given by
+        the 'sample_index', 'feature_index' and 'counts' arrays (i.e. a
+        sparse matrix in coordinate format). Otherwise these arrays are
+        empty.
+    '''
+    with np.load(filename, allow_pickle=False) as npz:
+        return dict((k, npz[k]) for k in npz.files)
+
+
+def save_burden_matrix(data, filename):
+    '''
+        Write a dict of arrays (as returned by read_burden_matrix) to
+        filename in numpy's compressed .npz format.
+    '''
+    np.savez_compressed(filename, **data)
+
+
+def burden_header(groups):
+    ''' Return the header line for a burden counts file. '''
+    cols = ["Feature", "Gene"]
+    for g in groups:
+        cols.extend([g, "N_" + g])
+    return str.join("\t", cols) + "\n"
+
+
+def write_burden_rows(fh, features, genes, groups, group_counts,
+                      total_alleles):
+    '''
+        Write a line per feature giving the allele count and number of
+        remaining alleles for each group.
+    '''
+    for feat, gene, counts in zip(features, genes, group_counts):
+        row = [feat, gene]
+        for c, total in zip(counts, total_alleles):
+            row.append(str(c))
+            row.append(str(total - c))
+        fh.write(str.join("\t", row) + "\n")
+
+
+def write_burden_counts(data, output):
+    '''
+        Write burden counts from a dict of arrays (as returned by
+        read_burden_matrix or merge_burden_counts) to output in the
+        format of VASE's --burden_counts option.
+    '''
+    with open(output, 'wt') as fh:
+        fh.write(burden_header(data['groups']))
+        write_burden_rows(fh, data['features'], data['genes'],
+                          data['groups'], data['group_counts'].tolist(),
+                          data['total_alleles'].tolist())
+
+
+def merge_burden_counts(filenames, max_alleles=2):
+    '''
+        Combine burden counts written using BurdenCounter.write_matrix
+        from separate runs over different regions and/or different
+        samples and return a dict of arrays in the same format as
+        read_burden_matrix.
+
+        Per-sample counts for the same sample and feature are summed and
+        capped at max_alleles and case and control counts recalculated
+        from these, so inputs may contain different samples. Otherwise
+        (e.g. for counts from gnomAD or AC/AN annotations), inputs must
+        have the same groups, group counts are summed and the largest
+        total number of alleles of each group is used.
+
+        Args:
+            filenames:
+                    List of .npz files written by
+                    BurdenCounter.write_matrix.
+
+            max_alleles:
+                    Maximum number of allele counts that can be assigned
+                    to one sample. Default=2.
+    '''
+    shards = [read_burden_matrix(f) for f in filenames]
+    groups = shards[0]['groups'].tolist()
+    per_sample = len(shards[0]['samples']) > 0
+    for f, shard in zip(filenames[1:], shards[1:]):
+        if (len(shard['samples']) > 0) != per_sample:
+            raise ValueError("Can not merge counts from sample genotypes " +
+                             "with other counts ({} and {})".format(
+                                 filenames[0], f))
+        if not per_sample and shard['groups'].tolist() != groups:
+            raise ValueError("Count groups in {} ({}) ".format(
+                f, ", ".join(shard['groups'])) + "do not match those in " +
+                "{} ({})".format(filenames[0], ", ".join(groups)))
+    feat_order = dict()
+    feat_genes = dict()
+    for shard in shards:
+        for feat, gene, key in zip(shard['features'].tolist(),
+                                   shard['genes'].tolist(),
+                                   shard['feature_order'].tolist()):
+            key = tuple(key)
+            if feat not in feat_order:
+                feat_order[feat] = key
+                feat_genes[feat] = gene
+            elif key < feat_order[feat]:
+                feat_order[feat] = key
+    ordered = sorted(feat_order, key=feat_order.get)
+    features = dict((f, i) for i, f in enumerate(ordered))
+    feat_maps = [np.array([features[x] for x in shard['features'].tolist()],
+                          dtype=np.int64) for shard in shards]
+    n_feats = len(features)
+    merged = dict(features=np.array(ordered, dtype=str),
+                  genes=np.array([feat_genes[x] for x in ordered],
+                                 dtype=str),
+                  feature_order=np.array([feat_order[x] for x in ordered],
+                                         dtype=np.int64).reshape(n_feats, 4),
+                  groups=np.array(groups, dtype=str))
+    if not per_sample:
+        group_counts = np.zeros((n_feats, len(groups)), dtype=np.int64)
+        for shard, fmap in zip(shards, feat_maps):
+            np.add.at(group_counts, fmap, shard['group_counts'])
+        merged.update(
+            group_counts=group_counts,
+            total_alleles=np.max([x['total_alleles'] for x in shards],
+                                 axis=0),
+            samples=np.zeros(0, dtype=str),
+            n_cases=np.array(0),
+            sample_index=np.zeros(0, dtype=np.int32),
+            feature_index=np.zeros(0, dtype=np.int32),
+            counts=np.zeros(0, dtype=np.uint8))
+        return merged
+    cases = dict()
+    controls = dict()
+    for f, shard in zip(filenames, shards):
+        n_cases = int(shard['n_cases'])
+        for i, s in enumerate(shard['samples'].tolist()):
+            this, other = (cases, controls) if i < n_cases else (controls,
+                                                                 cases)
+            if s in other:
+                raise ValueError("Sample {} is a case in one ".format(s) +
+                                 "input and a control in another " +
+                                 "(found in {})".format(f))
+            this.setdefault(s, len(this))
+    samples = list(cases) + list(controls)
+    groups = [g for g, x in (('Cases', cases), ('Controls', controls)) if x]
+    merged['groups'] = np.array(groups, dtype=str)
+    index = dict((s, i) for i, s in enumerate(samples))
+    rows = []
+    cols = []
+    counts = []
+    for shard, fmap in zip(shards, feat_maps):
+        smap = np.array([index[x] for x in shard['samples'].tolist()],
+                        dtype=np.int64)
+        rows.append(smap[shard['sample_index']])
+        cols.append(fmap[shard['feature_index']])
+        counts.append(shard['counts'])
+    keys, inverse = np.unique(np.concatenate(cols) * len(samples) +
+                              np.concatenate(rows), return_inverse=True)
+    summed = np.bincount(inverse.ravel(), weights=np.concatenate(counts))
+    counts = np.minimum(summed, max_alleles).astype(np.uint8)
+    rows = (keys % len(samples)).astype(np.int32)
+    cols = (keys // len(samples)).astype(np.int32)
+    is_case = rows < len(cases)
+    totals = dict(
+        Cases=(np.bincount(cols[is_case], weights=counts[is_case],
+                           minlength=n_feats), 2 * len(cases)),
+        Controls=(np.bincount(cols[~is_case], weights=counts[~is_case],
+                              minlength=n_feats), 2 * len(controls)))
+    merged.update(
+        group_counts=np.column_stack([totals[g][0] for g in groups]).astype(
+            np.int64).reshape(n_feats, len(groups)),
+        total_alleles=np.array([totals[g][1] for g in groups],
+                               dtype=np.int64),
+        samples=np.array(samples, dtype=str),
+        n_cases=np.array(len(cases)),
+        sample_index=rows,
+        feature_index=cols,
+        counts=counts)
+    return merged
+
 
 class BurdenCounter(object):
     ''' For a set of variants count the number of qualifying alleles
@@ -9,8 +206,11 @@ class BurdenCounter(object):
     '''
 
     def __init__(self, vcf, output, gq=0, dp=0, max_dp=0, het_ab=0., hom_ab=0.,
-                 is_gnomad=False, cases=[], controls=[]):
+                 is_gnomad=False, cases=[], controls=[], feature_index=None,
+                 matrix_output=None):
         self.vcf = vcf
+        self.matrix_output = matrix_output
+        self.feature_index = feature_index
         if 'SYMBOL' in vcf.header.csq_fields:
             self.gene_field = 'SYMBOL'
         elif 'Gene' in vcf.header.csq_fields:
@@ -21,6 +221,7 @@ class BurdenCounter(object):
         self.min_dp = dp
         self.max_dp = max_dp
         self.samples = None
+        self._rows = None
         self.use_ac = False
         self.total_alleles = {'Cases': 0, 'Controls': 0}
         self.controls = controls
@@ -54,28 +255,42 @@ class BurdenCounter(object):
             self.gt_filter = GtFilter(vcf, gq=gq, dp=dp, max_dp=max_dp,
                                       het_ab=het_ab, hom_ab=hom_ab)
             self.gt_fields = self.gt_filter.fields
-        self.feat_to_cases = defaultdict(dict)
-        self.feat_to_controls = defaultdict(dict)
+            vcf.require_genotypes(self.samples, self.gt_fields)
+        # per-sample allele counts for features currently being counted
+        self.pending_counts = dict()
+        # sparse sample x feature matrix of counts for completed features
+        self.matrix_features = dict()  # feature ID to column index
+        self.matrix_rows = np.empty(MATRIX_CHUNK, dtype=np.int32)
+        self.matrix_cols = np.empty(MATRIX_CHUNK, dtype=np.int32)
+        self.matrix_counts = np.empty(MATRIX_CHUNK, dtype=np.uint8)
+        self.matrix_size = 0
         self.transcript_to_gene = dict()
         self.counts = defaultdict(dict)
+        # contig index, pos, allele and rank of first allele per feature
+        self.feature_order = dict()
+        self.contig_index = dict((c, i) for i, c in enumerate(
+            vcf.variant_file.header.contigs))
         self.current_features = set()
+        self.groups = self._output_groups()
         self.out_fh = open(output, 'wt')
         self.write_header()
 
-    def write_header(self):
-        cols = ["Feature", "Gene"]
+    def _output_groups(self):
+        ''' Return names of the groups counts are output for. '''
         if self.gnomad_pops:
-            for pop in self.gnomad_pops:
-                cols.extend([pop, "N_" + pop])
+            return list(self.gnomad_pops)
         elif self.cases or self.controls:
+            groups = []
             if self.cases:
-                cols.extend(["Cases", "N_Cases"])
+                groups.append('Cases')
             if self.controls:
-                cols.extend(["Controls", "N_Controls"])
-        else:
-            # all samples labelled as 'Cases' if cases and controls are empty
-            cols.extend(["Cases", "N_Cases"])
-        self.out_fh.write(str.join("\t", cols) + "\n")
+                groups.append('Controls')
+            return groups
+        # all samples labelled as 'Cases' if cases and controls are empty
+        return ['Cases']
+
+    def write_header(self):
+        self.out_fh.write(burden_header(self.groups))
 
     def _check_gnomad_pops(self, vcf):
         pop_ac_re = re.compile(r'''^AC_([A-Za-z]{3})$''')
@@ -99,9 +314,8 @@ class BurdenCounter(object):
 
     def count(self, record, ignore_alleles=[], ignore_csq=[]):
         '''
-            If using cases and controls add IDs to
-            self.feat_to_cases/controls set, otherwise add number of
-            alleles.
+            If using samples add per-sample allele counts to
+            self.pending_counts, otherwise add number of alleles.
 
             Args:
                 record: VcfRecord from VcfReader
@@ -119,29 +333,17 @@ class BurdenCounter(object):
         '''
         if not self.use_ac and not self.gnomad_pops:
             these_feats = set([x['Feature'] for x in record.CSQ])
-            if (self.current_features and these_feats.isdisjoint(
+            if self.feature_index is not None:
+                # add sample counts for features we have passed the end of
+                self._sum_sample_counts(
+                    f for f in self._sample_count_features() if f not in
+                    these_feats and not self.feature_index.is_open(
+                        f, record.chrom, record.pos))
+            elif (self.current_features and these_feats.isdisjoint(
                     self.current_features)):
-                # if we've moved on to next set of features clear feat_to_cases
-                # etc. and add sample counts
-                feats_to_delete = set()
-                # can't delete keys while iterating over dict
-                for feat in self.feat_to_cases:
-                    feats_to_delete.add(feat)
-                    self.counts[feat]['Cases'] = sum(
-                            self.feat_to_cases[feat][x] for x in
-                            self.feat_to_cases[feat])
-                    self.counts[feat]['Controls'] = sum(
-                            self.feat_to_controls[feat][x] for x in
-                            self.feat_to_controls[feat])
-                for feat in (x for x in self.feat_to_controls if x not in
-                             self.feat_to_cases):
-                    self.counts[feat]['Controls'] = sum(
-                            self.feat_to_controls[feat][x] for x in
-                            self.feat_to_controls[feat])
-                    feats_to_delete.add(feat)
-                for feat in feats_to_delete:
-                    self.feat_to_cases.pop(feat, None)
-                    self.feat_to_controls.pop(feat, None)
+                # if we've moved on to next set of features add sample
+                # counts to matrix
+                self._sum_sample_counts(self._sample_count_features())
                 self.current_features.clear()
             self.current_features.update(these_feats)
         for i in range(len(record.alts)):
@@ -159,9 +361,8 @@ class BurdenCounter(object):
 
     def count_samples(self, record, features, allele, max_alleles=2):
         '''
-            If using cases and controls add IDs to
-            self.feat_to_cases/controls set, otherwise add number of
-            alleles.
+            If using samples add per-sample allele counts to
+            self.pending_counts, otherwise add number of alleles.
 
             Args:
                 record: VcfRecord from VcfReader
@@ -194,82 +395,169 @@ class BurdenCounter(object):
                 if record.info['AN'] > self.total_alleles['Cases']:
                     self.total_alleles['Cases'] = record.info['AN']
         else:
-            a_counts = dict((s, record.samples[s]['GT'].count(allele+1)) for s
-                            in self.samples if self.gt_filter.gt_is_ok(
-                                record.samples, s, allele) and (allele+1) in
-                            record.samples[s]['GT'])
-        for feat in features:
+            gm = record.genotypes
+            if self._rows is None or self._rows[0] is not gm.index:
+                self._rows = (gm.index, gm.rows(self.samples))
+            rows = self._rows[1]
+            counts = gm.allele_counts(allele + 1)[rows]
+            keep = self.gt_filter.gt_ok_mask(gm, allele, rows) & (counts > 0)
+            counts = np.where(keep, counts, 0)
+        contig = self.contig_index.get(record.chrom, len(self.contig_index))
+        for rank, feat in enumerate(features):
             if not feat:  # skip any intergenic variants
                 continue
             self._check_gene_name(feat, record)
+            if feat not in self.feature_order and (
+                    self.gnomad_pops or self.use_ac or keep.any()):
+                self.feature_order[feat] = (contig, record.pos, allele, rank)
             if self.gnomad_pops or self.use_ac:
                 for group in a_counts:
                     if group in self.counts[feat]:
                         self.counts[feat][group] += a_counts[group]
                     else:
                         self.counts[feat][group] = a_counts[group]
-            else:  # if we have samples we can ensure we don't count twice
-                if self.cases or self.controls:
-                    for s in self.cases:
-                        if s in a_counts:
-                            if s in self.feat_to_cases[feat]:
-                                self.feat_to_cases[feat][s] += a_counts[s]
-                                # do not count more than 2 alleles per sample
-                                if self.feat_to_cases[feat][s] > max_alleles:
-                                    self.feat_to_cases[feat][s] = max_alleles
-                            else:
-                                self.feat_to_cases[feat][s] = a_counts[s]
-                    for s in self.controls:
-                        if s in a_counts:
-                            if s in self.feat_to_cases[feat]:
-                                self.feat_to_controls[feat][s] += a_counts[s]
-                                if self.feat_to_controls[feat][s] > max_alleles:
-                                    # do not count more than 2 alleles per samp
-                                    self.feat_to_controls[feat][s] = max_alleles
-                            else:
-                                self.feat_to_controls[feat][s] = a_counts[s]
-                else:
-                    self.feat_to_controls[feat] = a_counts
+            elif keep.any():
+                # if we have samples we can ensure we don't count twice
+                feat_counts = self.pending_counts.get(feat)
+                if feat_counts is None:
+                    feat_counts = np.zeros(len(self.samples), dtype=np.int32)
+                    self.pending_counts[feat] = feat_counts
+                feat_counts += counts
+                # do not count more than max_alleles alleles per sample
+                np.minimum(feat_counts, max_alleles, out=feat_counts)
+
+    def _sample_count_features(self):
+        '''
+            Return a list of features with per-sample counts in
+            pending_counts.
+        '''
+        return list(self.pending_counts)
+
+    def _sum_sample_counts(self, features):
+        '''
+            Add per-sample counts for the given features to the sample
+            by feature matrix and remove them from pending_counts.
+        '''
+        for feat in list(features):
+            feat_counts = self.pending_counts.pop(feat)
+            idx = np.flatnonzero(feat_counts)
+            col = self.matrix_features.setdefault(feat,
+                                                  len(self.matrix_features))
+            end = self.matrix_size + len(idx)
+            if end > len(self.matrix_rows):
+                new_size = (end // MATRIX_CHUNK + 1) * MATRIX_CHUNK
+                self.matrix_rows = np.resize(self.matrix_rows, new_size)
+                self.matrix_cols = np.resize(self.matrix_cols, new_size)
+                self.matrix_counts = np.resize(self.matrix_counts, new_size)
+            self.matrix_rows[self.matrix_size:end] = idx
+            self.matrix_cols[self.matrix_size:end] = col
+            self.matrix_counts[self.matrix_size:end] = feat_counts[idx]
+            self.matrix_size = end
+
+    def sample_matrix(self, max_alleles=2):
+        '''
+            Return sample indices, feature indices and allele counts for
+            all non-zero entries of the sample by feature matrix. Counts
+            for a sample added for the same feature more than once (i.e.
+            if a feature's variants were not contiguous) are summed and
+            capped at max_alleles. Sample indices refer to self.samples
+            and feature indices to the order of features in
+            self.matrix_features.
+        '''
+        rows = self.matrix_rows[:self.matrix_size]
+        cols = self.matrix_cols[:self.matrix_size]
+        counts = self.matrix_counts[:self.matrix_size]
+        if len(self.matrix_features) < self.matrix_size:
+            n_samples = len(self.samples)
+            keys, inverse = np.unique(cols.astype(np.int64) * n_samples + rows,
+                                      return_inverse=True)
+            summed = np.bincount(inverse.ravel(), weights=counts)
+            counts = np.minimum(summed, max_alleles).astype(np.uint8)
+            rows = (keys % n_samples).astype(np.int32)
+            cols = (keys // n_samples).astype(np.int32)
+        return rows, cols, counts
+
+    def _counts_from_matrix(self):
+        ''' Add per-feature Cases/Controls totals to self.counts. '''
+        rows, cols, counts = self.sample_matrix()
+        n_feats = len(self.matrix_features)
+        is_case = rows < len(self.cases)
+        case_totals = np.bincount(cols[is_case], weights=counts[is_case],
+                                  minlength=n_feats).astype(int).tolist()
+        con_totals = np.bincount(cols[~is_case], weights=counts[~is_case],
+                                 minlength=n_feats).astype(int).tolist()
+        for feat, i in self.matrix_features.items():
+            self.counts[feat]['Cases'] = case_totals[i]
+            self.counts[feat]['Controls'] = con_totals[i]
+
+    def burden_data(self):
+        '''
+            Return a dict of arrays giving the counts for all features in
+            the format written by write_matrix and merge_burden_counts
+            (see read_burden_matrix). Per-sample counts are only included
+            if counting alleles from sample genotypes.
+        '''
+        features = self._sorted_features()
+        data = dict(
+            features=np.array(features, dtype=str),
+            genes=np.array([self.transcript_to_gene[x] for x in features],
+                           dtype=str),
+            feature_order=np.array([self.feature_order[x] for x in
+                                    features], dtype=np.int64).reshape(
+                                        len(features), 4),
+            groups=np.array(self.groups, dtype=str),
+            group_counts=np.array([[self.counts[f].get(g, 0) for g in
+                                    self.groups] for f in features],
+                                  dtype=np.int64).reshape(len(features),
+                                                          len(self.groups)),
+            total_alleles=np.array([self.total_alleles[g] for g in
+                                    self.groups], dtype=np.int64))
+        if self.use_ac or self.gnomad_pops:
+            rows = cols = np.zeros(0, dtype=np.int32)
+            counts = np.zeros(0, dtype=np.uint8)
+            data.update(samples=np.zeros(0, dtype=str),
+                        n_cases=np.array(0))
+        else:
+            rows, cols, counts = self.sample_matrix()
+            # convert from order of self.matrix_features to sorted order
+            position = dict((f, i) for i, f in enumerate(features))
+            col_map = np.array([position[f] for f in self.matrix_features],
+                               dtype=np.int32)
+            cols = col_map[cols]
+            data.update(samples=np.array(self.samples, dtype=str),
+                        n_cases=np.array(len(self.cases)))
+        data.update(sample_index=rows, feature_index=cols, counts=counts)
+        return data
+
+    def write_matrix(self, filename):
+        '''
+            Write counts for all features to filename in numpy's .npz
+            format. Use read_burden_matrix to read the resulting file.
+        '''
+        save_burden_matrix(self.burden_data(), filename)
 
     def output_counts(self):
         if not self.use_ac and not self.gnomad_pops:
-            for feat in self.feat_to_cases:
-                self.counts[feat]['Cases'] = sum(
-                        self.feat_to_cases[feat][x] for x in
-                        self.feat_to_cases[feat])
-                self.counts[feat]['Controls'] = sum(
-                        self.feat_to_controls[feat][x] for x in
-                        self.feat_to_controls[feat])
-            for feat in (x for x in self.feat_to_controls if x not in
-                         self.feat_to_cases):
-                self.counts[feat]['Controls'] = sum(
-                        self.feat_to_controls[feat][x] for x in
-                        self.feat_to_controls[feat])
-        groups = []
-        if self.gnomad_pops:
-            groups = self.gnomad_pops
-        elif self.use_ac:
-            groups = ['Cases']
-        elif self.cases or self.controls:
-            if self.cases:
-                groups.append('Cases')
-            if self.controls:
-                groups.append('Controls')
-        else:
-            groups = ['Cases']
-        for feat in self.counts:
-            row = [feat, self.transcript_to_gene[feat]]
-            for g in groups:
-                if g in self.counts[feat]:
-                    row.append(str(self.counts[feat][g]))
-                    row.append(str(self.total_alleles[g] -
-                                   self.counts[feat][g]))
-                else:
-                    row.append("0")
-                    row.append(str(self.total_alleles[g]))
-            self.out_fh.write(str.join("\t", row) + "\n")
+            self._sum_sample_counts(self._sample_count_features())
+            self._counts_from_matrix()
+        if self.matrix_output is not None:
+            self.write_matrix(self.matrix_output)
+        features = self._sorted_features()
+        write_burden_rows(self.out_fh, features,
+                          [self.transcript_to_gene[x] for x in features],
+                          self.groups,
+                          [[self.counts[f].get(g, 0) for g in self.groups]
+                           for f in features],
+                          [self.total_alleles[g] for g in self.groups])
         self.out_fh.close()
 
+    def _sorted_features(self):
+        '''
+            Return counted features sorted by the position of the first
+            allele counted for each (see read_burden_matrix).
+        '''
+        return sorted(self.counts, key=self.feature_order.get)
+
     def _check_gene_name(self, feat, record):
         if feat not in self.transcript_to_gene:
             csq = next(x for x in record.CSQ if x['Feature'] == feat)
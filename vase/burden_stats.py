@@ -0,0 +1,389 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.stats as stats
+from multiprocessing import Pool
+
+
+class CountTable(object):
+    '''
+        Allele counts read from a file generated using VASE's
+        --burden_counts option. Counts are held in an array of shape
+        (n_features, n_groups, 2) where the last axis gives the allele
+        count and the number of remaining alleles (i.e. the 'N_' columns)
+        for each group (e.g. Cases, Controls or gnomAD populations).
+    '''
+
+    __slots__ = ['features', 'genes', 'groups', 'counts', 'index']
+
+    def __init__(self, tsv, targets=None):
+        '''
+            Args:
+                tsv:    Burden counts file.
+
+                targets:
+                        Names of groups (count columns) to read. Default
+                        is to read all groups.
+        '''
+        self.features = []
+        self.genes = []
+        rows = []
+        with open(tsv, 'rt') as infile:
+            header = infile.readline().rstrip().split()
+            al_indices = parse_count_header(header, targets)
+            self.groups = list(al_indices)
+            cols_i = [j for k in self.groups for j in (al_indices[k],
+                                                       al_indices[k] + 1)]
+            for line in infile:
+                cols = line.rstrip().split()
+                try:
+                    rows.append([int(cols[j]) for j in cols_i])
+                except IndexError as e:
+                    raise RuntimeError("Error processing line: {}\n"
+                                       .format(line) + str(e))
+                self.features.append(cols[0])
+                self.genes.append(cols[1])
+        self.counts = np.array(rows, dtype=np.int64).reshape(
+            len(rows), len(self.groups), 2)
+        self.index = dict((k, i) for i, k in
+                          enumerate(zip(self.features, self.genes)))
+
+    def __len__(self):
+        return len(self.features)
+
+    def group_counts(self, groups=None, sum_groups=False):
+        '''
+            Return counts for the given groups (default=all groups) as
+            an array of shape (n_features, n_groups, 2), or of shape
+            (n_features, 1, 2) if sum_groups is True.
+        '''
+        if groups is None:
+            counts = self.counts
+        else:
+            counts = self.counts[:, [self.groups.index(g) for g in groups]]
+        if sum_groups:
+            counts = counts.sum(axis=1, keepdims=True)
+        return counts
+
+    def align(self, other):
+        '''
+            Return an array giving the row of each feature of other
+            CountTable in this table (or -1 if not present).
+        '''
+        return np.array([self.index.get(k, -1) for k in other.index],
+                        dtype=np.intp)
+
+
+def parse_count_header(header, targets):
+    al_indices = dict()
+    if len(header) < 4:
+        raise RuntimeError("Not enough columns in header!")
+    if header[0] != 'Feature':
+        raise RuntimeError("Expected 'Feature' as first column!")
+    if header[1] != 'Gene':
+        raise RuntimeError("Expected 'Gene' as first column!")
+    if targets is None:
+        #every other column after the first 2 should be an allele count column
+        targets = [header[x] for x in range(2, len(header), 2)]
+    for t in targets:
+        if t in header:
+            al_indices[t] = header.index(t)
+            total_i = al_indices[t]+1
+            if len(header) <= total_i or header[total_i] != "N_" + t:
+                raise RuntimeError("Expected 'N_{}' column after ".format(t)
+                                   + "'{}' column.".format(t))
+        else:
+            if len(targets) == 1 and (t == 'Controls' or t == 'Cases'):
+                # if only case or controls requested, and only one
+                # group in file can assume want counts for this group
+                if len(header) == 4 and header[3] == "N_" + header[2]:
+                    al_indices[t] = 2
+                    break
+            raise RuntimeError("Could not find {} and N_{}".format(t, t) +
+                               " columns in input file")
+    return al_indices
+
+
+def fisher_greater(a, b, c, d):
+    '''
+        One-sided (alternative='greater') Fisher's exact test for arrays
+        of 2x2 tables [[a, b], [c, d]], giving the same results as
+        scipy.stats.fisher_exact applied to each table. Returns arrays of
+        odds ratios and p-values.
+    '''
+    a, b, c, d = (np.asarray(x, dtype=np.int64) for x in (a, b, c, d))
+    n1 = a + b
+    n2 = c + d
+    with np.errstate(divide='ignore', invalid='ignore'):
+        odds = np.where((c > 0) & (b > 0), (a * d) / (c * b), np.inf)
+        pvals = stats.hypergeom.cdf(b, n1 + n2, n1, b + d)
+    degenerate = (n1 == 0) | (n2 == 0) | (a + c == 0) | (b + d == 0)
+    odds[degenerate] = np.nan
+    pvals = np.where(degenerate, 1.0, np.minimum(pvals, 1.0))
+    return odds, pvals
+
+
+def binomial_greater(a, b, c, d):
+    '''
+        One-sided binomial test of whether the proportion of alleles
+        counted in the first row of each 2x2 table [[a, b], [c, d]] is
+        greater than the proportion in the second row. Returns arrays of
+        odds ratios (as for fisher_greater) and p-values.
+
+        Where the second row has no alleles counted (c == 0) a
+        pseudo-count of one allele is used for the expected proportion,
+        otherwise any first row allele would give a p-value of 0.
+    '''
+    a, b, c, d = (np.asarray(x, dtype=np.int64) for x in (a, b, c, d))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        odds = np.where((c > 0) & (b > 0), (a * d) / (c * b), np.inf)
+        expected = np.where(c > 0, c / (c + d), 1. / (c + d + 1))
+    pvals = stats.binom.sf(a - 1, a + b, expected)
+    degenerate = (a + b == 0) | (c + d == 0)
+    odds[degenerate] = np.nan
+    pvals = np.where(degenerate, 1.0, np.minimum(pvals, 1.0))
+    return odds, pvals
+
+
+TESTS = {'fisher': fisher_greater, 'binomial': binomial_greater}
+
+
+def _pvalues_chunk(args):
+    test, a, b, c, d = args
+    return TESTS[test](a, b, c, d)
+
+
+def table_pvalues(a, b, c, d, test='fisher', processes=1):
+    '''
+        Test arrays of 2x2 tables [[a, b], [c, d]] using the named test
+        ('fisher' or 'binomial'), splitting the tables between the given
+        number of processes. Returns arrays of odds ratios and p-values.
+    '''
+    if test not in TESTS:
+        raise ValueError("Unrecognised test '{}'".format(test))
+    if processes < 2 or len(a) < processes:
+        return TESTS[test](a, b, c, d)
+    chunks = [np.array_split(x, processes) for x in (a, b, c, d)]
+    with Pool(processes) as pool:
+        results = pool.map(_pvalues_chunk,
+                           [(test,) + x for x in zip(*chunks)])
+    return (np.concatenate([x[0] for x in results]),
+            np.concatenate([x[1] for x in results]))
+
+
+def fdr_correct(pvals):
+    ''' Return Benjamini-Hochberg adjusted p-values. '''
+    pvals = np.asarray(pvals, dtype=float)
+    n = len(pvals)
+    if n == 0:
+        return pvals
+    order = np.argsort(pvals, kind='stable')
+    ranked = pvals[order] * n / np.arange(1, n + 1)
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(ranked, 1.0)
+    return adjusted
+
+
+def burden_test(cases, controls, groups=None, sum_groups=False,
+                test='fisher', processes=1):
+    '''
+        Test case counts against control counts for all features present
+        in both CountTables. If controls contain more than one group
+        (e.g. gnomAD populations) each group is tested and the highest
+        (i.e. least significant) p-value is reported for each feature,
+        unless sum_groups is True in which case counts for all groups are
+        summed before testing.
+
+        Returns a tuple of features, genes, case counts (array of shape
+        (n, 2)), control counts (array of shape (n, 2)), odds ratios and
+        p-values for the features tested.
+
+        Args:
+                cases:  CountTable with a single group of case counts.
+
+                controls:
+                        CountTable with one or more groups of control
+                        counts.
+
+                groups: Names of control groups to use. Default=all.
+
+                sum_groups:
+                        Sum counts for control groups rather than
+                        testing each separately.
+
+                test:   'fisher' or 'binomial'. Default='fisher'.
+
+                processes:
+                        Number of processes to use. Default=1.
+    '''
+    rows = controls.align(cases)
+    found = rows >= 0
+    features = [x for x, f in zip(cases.features, found) if f]
+    genes = [x for x, f in zip(cases.genes, found) if f]
+    case_counts = cases.group_counts()[found, 0]
+    control_counts = controls.group_counts(groups, sum_groups)[rows[found]]
+    n_groups = control_counts.shape[1]
+    a = np.repeat(case_counts[:, 0], n_groups)
+    b = np.repeat(case_counts[:, 1], n_groups)
+    c = control_counts[:, :, 0].ravel()
+    d = control_counts[:, :, 1].ravel()
+    odds, pvals = table_pvalues(a, b, c, d, test=test, processes=processes)
+    odds = odds.reshape(-1, n_groups)
+    pvals = pvals.reshape(-1, n_groups)
+    best = np.argmax(pvals, axis=1) if len(pvals) else np.zeros(0, int)
+    idx = np.arange(len(best))
+    return (features, genes, case_counts, control_counts[idx, best],
+            odds[idx, best], pvals[idx, best])
+
+
+# arrays shared by permutation workers, set by _init_permutations
+_perm_data = dict()
+
+
+def _init_permutations(counts_t, labels, observed):
+    '''
+        Store the arrays used for every chunk of permutations so that
+        they are only sent to each worker process once.
+    '''
+    _perm_data['counts_t'] = counts_t
+    _perm_data['labels'] = labels
+    _perm_data['observed'] = observed
+
+
+def _permutation_chunk(args):
+    '''
+        Return the number of times the permuted case allele count of each
+        feature is at least as large as the observed count for a chunk
+        of permutations.
+    '''
+    n, seed_seq = args
+    labels = _perm_data['labels']
+    observed = _perm_data['observed']
+    rng = np.random.default_rng(seed_seq)
+    perm_labels = rng.permuted(np.tile(labels, (n, 1)), axis=1)
+    # features x permutations
+    perm_counts = _perm_data['counts_t'] @ perm_labels.T
+    return (perm_counts >= observed[:, None]).sum(axis=1)
+
+
+def permutation_test(matrix, n_permutations=10000, seed=42, chunk_size=100,
+                     cases=None, controls=None, processes=1):
+    '''
+        Calculate empirical p-values for enrichment of qualifying alleles
+        in cases versus controls for each feature of a per-sample burden
+        matrix by shuffling case/control labels. For each permutation the
+        case allele count of every feature is calculated at once by
+        multiplying the sparse sample by feature matrix with the permuted
+        labels.
+
+        Returns a tuple of features, genes, case counts (array of shape
+        (n, 2)), control counts (array of shape (n, 2)), odds ratios and
+        empirical p-values, as for burden_test.
+
+        Args:
+                matrix: dict of arrays as returned by
+                        vase.burden_counter.read_burden_matrix.
+
+                n_permutations:
+                        Number of permutations to perform.
+                        Default=10000.
+
+                seed:   Seed for the random number generator. Results
+                        for a given seed and chunk_size are identical
+                        regardless of the number of processes.
+                        Default=42.
+
+                chunk_size:
+                        Number of permutations to calculate at once.
+                        Memory use is proportional to chunk_size
+                        multiplied by the number of features plus the
+                        number of samples. Default=100.
+
+                cases:  Optional list of case sample IDs. If neither
+                        this or controls are given, the cases and
+                        controls from the original burden counts are
+                        used.
+
+                controls:
+                        Optional list of control sample IDs. If cases is
+                        given and this is not, all other samples are
+                        used as controls.
+
+                processes:
+                        Number of processes to use. Default=1.
+    '''
+    samples = list(matrix['samples'])
+    if not samples:
+        raise ValueError("No per-sample counts in burden matrix.")
+    if cases is None and controls is None:
+        is_case = np.arange(len(samples)) < int(matrix['n_cases'])
+        use = np.ones(len(samples), dtype=bool)
+    else:
+        for s in (cases or []) + (controls or []):
+            if s not in samples:
+                raise ValueError("Sample '{}' not found in ".format(s) +
+                                 "burden matrix.")
+        case_set = set(cases or [])
+        if controls is None:
+            control_set = set(samples) - case_set
+        else:
+            control_set = set(controls)
+        if case_set & control_set:
+            raise ValueError("Samples can not be both cases and controls.")
+        is_case = np.array([s in case_set for s in samples])
+        use = is_case | np.array([s in control_set for s in samples])
+    # renumber samples to exclude those not in use
+    new_index = np.cumsum(use) - 1
+    keep = use[matrix['sample_index']]
+    n_feats = len(matrix['features'])
+    counts_t = sparse.csr_matrix(
+        (matrix['counts'][keep].astype(np.float64),
+         (matrix['feature_index'][keep],
+          new_index[matrix['sample_index'][keep]])),
+        shape=(n_feats, int(use.sum())))
+    labels = is_case[use].astype(np.float64)
+    observed = counts_t @ labels
+    totals = np.asarray(counts_t.sum(axis=1)).ravel()
+    n_cases = int(labels.sum())
+    n_controls = len(labels) - n_cases
+    case_counts = np.column_stack((observed, 2 * n_cases - observed))
+    control_counts = np.column_stack((totals - observed,
+                                      2 * n_controls - totals + observed))
+    case_counts = case_counts.astype(np.int64)
+    control_counts = control_counts.astype(np.int64)
+    odds = fisher_greater(*case_counts.T, *control_counts.T)[0]
+    chunks = [min(chunk_size, n_permutations - i) for i in
+              range(0, n_permutations, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = list(zip(chunks, seeds))
+    init_args = (counts_t, labels, observed)
+    if processes > 1:
+        with Pool(processes, initializer=_init_permutations,
+                  initargs=init_args) as pool:
+            results = pool.map(_permutation_chunk, args)
+    else:
+        _init_permutations(*init_args)
+        results = [_permutation_chunk(x) for x in args]
+    _perm_data.clear()
+    n_ge = np.sum(results, axis=0) if results else np.zeros(n_feats)
+    pvals = (n_ge + 1) / (n_permutations + 1)
+    return (list(matrix['features']), list(matrix['genes']), case_counts,
+            control_counts, odds, pvals)
+
+
+def write_results(fh, features, genes, case_counts, control_counts, odds,
+                  pvals):
+    '''
+        Write test results sorted by p-value with Benjamini-Hochberg
+        adjusted p-values to filehandle.
+    '''
+    fdr = fdr_correct(pvals)
+    fh.write(str.join("\t", ("Feature", "Gene", "P", "Odds_Ratio", "Cases",
+                             "N_Cases", "Controls", "N_Controls", "FDR"))
+             + "\n")
+    for i in np.argsort(pvals, kind='stable'):
+        fh.write(str.join("\t", [features[i], genes[i], str(pvals[i]),
+                                 str(odds[i])] +
+                          [str(x) for x in case_counts[i]] +
+                          [str(x) for x in control_counts[i]] +
+                          [str(fdr[i])]) + "\n")
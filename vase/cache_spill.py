@@ -0,0 +1,125 @@
+import os
+import tempfile
+import pysam
+from .vcf_record import VaseRecord
+
+
+class SpillFile(object):
+    '''
+        Temporary BCF holding records removed from memory by a
+        VariantCache. Records are read back in the order they were
+        written and the file is deleted once all records have been
+        read.
+    '''
+
+    __slots__ = ['filename', 'n_written', 'n_read', '_fh', '_reader',
+                 '_iter']
+
+    def __init__(self, header, records, tmpdir=None):
+        '''
+            Args:
+                header: pysam.VariantHeader for writing records.
+
+                records:
+                        List of pysam.VariantRecord objects to write.
+
+                tmpdir: Directory for temporary file. Defaults to the
+                        system's default temporary directory.
+        '''
+        fd, self.filename = tempfile.mkstemp(suffix='.bcf', dir=tmpdir)
+        os.close(fd)
+        with pysam.VariantFile(self.filename, mode='wb', header=header) as out:
+            for record in records:
+                out.write(record)
+        self.n_written = len(records)
+        self.n_read = 0
+        self._fh = None
+        self._reader = None
+        self._iter = None
+
+    def next_record(self):
+        ''' Read the next pysam.VariantRecord from the file. '''
+        if self._reader is None:
+            # use filehandle so that htslib does not look for an index
+            self._fh = open(self.filename, 'rb')
+            self._reader = pysam.VariantFile(self._fh)
+            self._iter = iter(self._reader)
+        record = next(self._iter)
+        self.n_read += 1
+        if self.n_read >= self.n_written:
+            self.close()
+        return record
+
+    def close(self):
+        ''' Close and delete the temporary file. '''
+        if self._reader is not None:
+            self._reader.close()
+            self._fh.close()
+            self._reader = None
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class SpilledRecord(object):
+    '''
+        Lightweight stand-in for a VaseRecord that has been written to
+        a SpillFile. Retains the site details, VASE INFO annotations and
+        physical phasing data required for segregation checks and
+        annotation of cached variants. INFO fields set on a
+        SpilledRecord are applied to the full record when it is read
+        back using the restore method.
+    '''
+
+    __slots__ = ['chrom', 'pos', 'id', 'ref', 'alt', 'alleles', 'alts',
+                 'qual', 'filter_string', 'info', 'spill_file', 'caller',
+                 '_phases']
+
+    def __init__(self, record, spill_file):
+        '''
+            Args:
+                record: VaseRecord to create stand-in for.
+
+                spill_file:
+                        SpillFile that record has been written to.
+        '''
+        self.chrom = record.chrom
+        self.pos = record.pos
+        self.id = record.id
+        self.ref = record.ref
+        self.alt = record.alt
+        self.alleles = record.alleles
+        self.alts = record.alts
+        self.qual = record.qual
+        self.filter_string = ';'.join(record.filter.keys()) or '.'
+        self.info = dict((k, v) for k, v in record.info.items() if
+                         k.startswith('VASE_'))
+        self.spill_file = spill_file
+        self.caller = record.caller
+        self._phases = dict()
+        phased_format = ('PID' in record.format and 'PGT' in record.format)
+        for sample, call in record.samples.items():
+            if not phased_format and not call.phased:
+                continue
+            for allele in range(1, len(record.alleles)):
+                phase = record.phase_info(sample, allele)
+                if phase != (None, None, None):
+                    self._phases[(sample, allele)] = phase
+
+    def phase_info(self, sample, allele):
+        ''' As for VaseRecord.phase_info. '''
+        return self._phases.get((sample, allele), (None, None, None))
+
+    def restore(self):
+        '''
+            Read the full record back from the SpillFile and return as
+            a VaseRecord with any INFO annotations added since the
+            record was spilled.
+        '''
+        record = self.spill_file.next_record()
+        if record.chrom != self.chrom or record.pos != self.pos:
+            raise RuntimeError("Spilled record mismatch - expected {}:{} "
+                               .format(self.chrom, self.pos) + "but read " +
+                               "{}:{}".format(record.chrom, record.pos))
+        for k, v in self.info.items():
+            record.info[k] = v
+        return VaseRecord(record, self.caller)
@@ -0,0 +1,171 @@
+import logging
+import pysam
+import numpy as np
+from .vcf_reader import VcfReader
+from .sample_filter import GtFilter
+
+db_fields = {
+    'N_CARRIERS': {'Number': 'A', 'Type': 'Integer',
+                   'Description': 'Number of samples carrying ALT allele ' +
+                                  'with a genotype passing genotype ' +
+                                  'filters (or with ALT reads over the ' +
+                                  'reference allele balance threshold)'},
+    'N_HOM': {'Number': 'A', 'Type': 'Integer',
+              'Description': 'Number of samples homozygous for ALT ' +
+                             'allele with a genotype passing genotype ' +
+                             'filters'},
+    'N_CALLED': {'Number': 'A', 'Type': 'Integer',
+                 'Description': 'Number of samples with a called genotype ' +
+                                'passing genotype filters for ALT allele'},
+}
+
+
+class CohortDbBuilder(object):
+    '''
+        Summarise genotypes from a cohort VCF as per-allele counts of
+        carriers, homozygotes and confidently called samples, after
+        applying genotype filters, and write these counts to a
+        sites-only, indexed VCF. The output can be used to filter
+        variants using a CohortDbFilter instead of evaluating each
+        control sample genotype on every run.
+    '''
+
+    def __init__(self, vcf, output, samples=None, exclude_samples=None,
+                 gq=0, dp=0, max_dp=0, het_ab=0., hom_ab=0., max_ref_ab=None,
+                 logger=None):
+        '''
+            Args:
+                vcf:    Input cohort VCF filename.
+
+                output: Output filename. Must end with '.vcf.gz' or
+                        '.bcf' so that it can be indexed.
+
+                samples:
+                        Samples to count. Default is to use all samples
+                        in the VCF.
+
+                exclude_samples:
+                        Samples to exclude from counts.
+
+                gq:     Minimum genotype quality (GQ) for a genotype to
+                        be counted. Default=0.
+
+                dp:     Minimum depth (DP) for a genotype to be counted.
+                        Default=0.
+
+                max_dp: Maximum depth (DP) for a genotype to be counted.
+                        Default=0 (not used).
+
+                het_ab: Minimum allele balance for a heterozygous
+                        genotype to be counted. Default=0.
+
+                hom_ab: Minimum allele balance for a homozygous
+                        genotype to be counted. Default=0.
+
+                max_ref_ab:
+                        Count genotypes not carrying an ALT allele as
+                        carriers if the allele balance of the ALT allele
+                        is greater than this value. Default=None (not
+                        used).
+
+                logger: Optional logging.Logger object.
+        '''
+        if not output.endswith(('.vcf.gz', '.vcf.bgz', '.bcf')):
+            raise ValueError("Cohort database output must end with " +
+                             "'.vcf.gz' or '.bcf'")
+        self.output = output
+        self.logger = logger or logging.getLogger(__name__)
+        self.vcf = VcfReader(vcf, logger=self.logger)
+        vcf_samples = list(self.vcf.header.samples)
+        if samples:
+            not_found = [x for x in samples if x not in vcf_samples]
+            if not_found:
+                raise ValueError("The following samples were not found in " +
+                                 "the input VCF: " + ", ".join(not_found))
+        else:
+            samples = vcf_samples
+        if exclude_samples:
+            samples = [x for x in samples if x not in exclude_samples]
+        if not samples:
+            raise ValueError("No samples to count in input VCF")
+        self.samples = [x for x in vcf_samples if x in set(samples)]
+        self.gt_filter = GtFilter(self.vcf, gq=gq, dp=dp, max_dp=max_dp,
+                                  het_ab=het_ab, hom_ab=hom_ab,
+                                  ref_ab_filter=max_ref_ab)
+        fields = set(self.gt_filter.fields)
+        if max_ref_ab and 'AD' in self.vcf.header.formats:
+            fields.add('AD')
+        self.vcf.require_genotypes(self.samples, fields)
+        self.vcf.subset_samples(self.samples)
+        self.thresholds = dict(gq=gq, dp=dp, max_dp=max_dp, het_ab=het_ab,
+                               hom_ab=hom_ab, max_ref_ab=max_ref_ab)
+
+    def _make_header(self):
+        header = pysam.VariantHeader()
+        for contig in self.vcf.variant_file.header.contigs.values():
+            if contig.length is not None:
+                header.contigs.add(contig.name, length=contig.length)
+            else:
+                header.contigs.add(contig.name)
+        for f, d in db_fields.items():
+            header.info.add(f, d['Number'], d['Type'], d['Description'])
+        header.add_meta('vase_cohort_db', items=[
+            ('N_SAMPLES', str(len(self.samples)))] + [
+            (k.upper(), str(v)) for k, v in self.thresholds.items()])
+        return header
+
+    def counts(self, record):
+        '''
+            Return lists of carrier, homozygote and called sample counts
+            for each ALT allele of a VaseRecord.
+        '''
+        gm = record.genotypes
+        called = ~gm.no_calls()
+        carriers = []
+        homs = []
+        n_called = []
+        for allele in range(1, len(record.alleles)):
+            ok = self.gt_filter.gt_ok_mask(gm, allele)
+            has_allele = gm.has_allele(allele)
+            n_carriers = np.count_nonzero(ok & has_allele)
+            if self.gt_filter.ad_over_threshold_mask is not None:
+                over = ok & ~has_allele & \
+                    self.gt_filter.ad_over_threshold_mask(gm, allele)
+                if 'AD' in record.format:
+                    over &= ~gm.missing['AD']
+                n_carriers += np.count_nonzero(over)
+            carriers.append(int(n_carriers))
+            homs.append(int(np.count_nonzero(ok & gm.is_hom(allele))))
+            n_called.append(int(np.count_nonzero(ok & called)))
+        return carriers, homs, n_called
+
+    def build(self, prog_interval=None):
+        '''
+            Write counts for all non-structural variants in the input
+            and index the output. Returns the number of records written.
+        '''
+        mode = 'wb' if self.output.endswith('.bcf') else 'wz'
+        n = 0
+        with pysam.VariantFile(self.output, mode=mode,
+                               header=self._make_header()) as out:
+            for record in self.vcf:
+                if record.IS_SV or record.alts is None:
+                    continue
+                carriers, homs, called = self.counts(record)
+                out.write(out.new_record(contig=record.chrom,
+                                         start=record.start,
+                                         alleles=record.alleles,
+                                         id=record.id,
+                                         info=dict(N_CARRIERS=carriers,
+                                                   N_HOM=homs,
+                                                   N_CALLED=called)))
+                n += 1
+                if prog_interval and n % prog_interval == 0:
+                    self.logger.info("Processed {:,} variants - at {}:{}"
+                                     .format(n, record.chrom, record.pos))
+        preset = 'bcf' if mode == 'wb' else 'vcf'
+        pysam.tabix_index(self.output, preset=preset, force=True,
+                          csi=preset == 'bcf')
+        self.logger.info("Finished writing {:,} variants to {}".format(
+            n, self.output))
+        return n
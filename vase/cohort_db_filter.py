@@ -0,0 +1,63 @@
+from .vcf_filter import VcfFilter
+from .cohort_db import db_fields
+
+
+class CohortDbFilter(VcfFilter):
+    '''
+        An object that filters VCF records based on carrier and
+        homozygote counts in a cohort database created by
+        CohortDbBuilder (i.e. the vase_cohort_db script).
+    '''
+
+    def __init__(self, vcf, prefix, logger=None, max_carriers=0,
+                 max_homozygotes=None, no_walk=False, force_walk=False):
+        '''
+            Initialize object with a cohort database VCF and filtering
+            thresholds.
+
+            Args:
+                vcf:      Cohort database VCF created by CohortDbBuilder.
+
+                prefix:   Prefix to prepend to added INFO field
+                          annotations. Required.
+
+                max_carriers:
+                          Filter alleles if the number of carriers in
+                          the cohort is greater than this value.
+                          Default=0.
+
+                max_homozygotes:
+                          Filter alleles if the number of homozygotes in
+                          the cohort is greater than this value.
+                          Optional.
+
+                no_walk:  See VcfFilter documentation.
+
+                force_walk:
+                          See VcfFilter documentation.
+
+        '''
+        super().__init__(vcf=vcf, prefix=prefix, logger=logger,
+                         freq_fields=[], ac_fields=[], an_fields=[],
+                         annotations=list(db_fields), no_walk=no_walk,
+                         force_walk=force_walk, skip_svs=True)
+        self.max_carriers = max_carriers
+        self.max_homozygotes = max_homozygotes
+        self.carrier_annot = self.prefix + "_N_CARRIERS"
+        self.hom_annot = self.prefix + "_N_HOM"
+
+    def annotate_and_filter_record(self, record):
+        filt, keep, matched = super().annotate_and_filter_record(record)
+        for i in range(len(record.DECOMPOSED_ALLELES)):
+            if not matched[i]:
+                continue
+            n = record.info[self.carrier_annot][i]
+            if (self.max_carriers is not None and n is not None and
+                    n > self.max_carriers):
+                filt[i] = True
+                continue
+            n = record.info[self.hom_annot][i]
+            if (self.max_homozygotes is not None and n is not None and
+                    n > self.max_homozygotes):
+                filt[i] = True
+        return filt, keep, matched
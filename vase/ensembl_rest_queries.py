@@ -10,8 +10,21 @@ class EnsemblRestQueries(object):
 
     def __init__(self, use_grch37_server=False, custom_server=None,
                  timeout=1.0, max_retries=2, reqs_per_sec=5,
-                 log_level=logging.INFO):
+                 log_level=logging.INFO, cache=None, offline=False):
+        '''
+            Args:
+                cache:  Optional RestCache object. If provided, responses
+                        will be read from and written to this cache.
+
+                offline:
+                        If True, only return responses from cache and
+                        never contact the server. Requires a cache.
+        '''
+        if offline and cache is None:
+            raise ValueError("A cache is required for offline lookups.")
         self._set_logger(logging_level=log_level)
+        self.cache = cache
+        self.offline = offline
         self.reqs_per_sec = reqs_per_sec
         self.req_count = 0
         self.last_req = 0
@@ -25,6 +38,23 @@ class EnsemblRestQueries(object):
         self.max_retries = max_retries
 
     def get_endpoint(self, endpoint, attempt=0):
+        if self.cache is None:
+            return self._request(endpoint, attempt=attempt)
+        path, _, query = endpoint.partition('?')
+        found, data = self.cache.get(self.server, path, query,
+                                     ignore_ttl=self.offline)
+        if found:
+            self.logger.debug("Retrieved {} from cache".format(
+                self.server + endpoint))
+            return data
+        if self.offline:
+            raise OfflineLookupError("No cached response for {}".format(
+                self.server + endpoint) + " (offline mode)")
+        data = self._request(endpoint, attempt=attempt)
+        self.cache.set(self.server, path, query, data)
+        return data
+
+    def _request(self, endpoint, attempt=0):
         # check if we need to rate limit ourselves
         if self.req_count >= self.reqs_per_sec:
             delta = time.time() - self.last_req
@@ -42,7 +72,7 @@ class EnsemblRestQueries(object):
                 attempt += 1
                 self.logger.info("Retry {}/{}".format(attempt,self.max_retries)
                                  + " for {}".format(self.server+endpoint))
-                return self.get_endpoint(endpoint, attempt=attempt)
+                return self._request(endpoint, attempt=attempt)
             r.raise_for_status()
         return r.json()
 
@@ -104,3 +134,7 @@ class EnsemblRestQueries(object):
         ch.setFormatter(formatter)
         self.logger.addHandler(ch)
 
+
+class OfflineLookupError(RuntimeError):
+    ''' Raised when a response is not in the cache in offline mode. '''
+    pass
@@ -1,6 +1,8 @@
 from .sample_filter import SampleFilter, GtFilter
 from .sv_gt_filter import SvGtFilter
+from .vcf_record import phases_in_cis
 import logging
+import numpy as np
 from collections import OrderedDict, defaultdict
 
 
@@ -251,7 +253,7 @@ class InheritanceFilter(object):
     '''
 
     def __init__(self, family_filter, gt_args, min_families=1,
-                 report_file=None):
+                 report_file=None, feature_index=None):
         '''
             Create genotype filter objects and initialise family filtering
             arguments.
@@ -274,10 +276,17 @@ class InheritanceFilter(object):
                 report_file:
                         Deprecated. Use vase_reporter to after
                         inheritance filtering to process VCFs instead.
+
+                feature_index:
+                        Optional FeatureIndex object. If provided,
+                        cached alleles for a feature are not processed
+                        until the input has passed the end of the
+                        feature.
         '''
 
         self.family_filter = family_filter
         self.min_families = min_families
+        self.feature_index = feature_index
         self.ped = family_filter.ped
         self.samples = family_filter.vcf_samples
         self.unaffected = family_filter.vcf_unaffected
@@ -340,8 +349,11 @@ class InheritanceFilter(object):
                                     del_dhffc=gt_args.get('control_del_dhffc'),
                                     dup_dhbfc=gt_args.get('control_dup_dhbfc'))
         self._sv_gt_fields.update(self.sv_con_gt_filter.fields)
+        family_filter.vcf.require_genotypes(
+            self.samples, self._gt_fields | self._sv_gt_fields)
         self._prev_coordinate = (None, None)  # to ensure records are processed
         self._processed_contigs = set()       # in coordinate order
+        self._rows = None
         if self.report_file:
             self._write_report_header()
 
@@ -364,11 +376,120 @@ class InheritanceFilter(object):
         return hf
 
     def confirm_heterozygous(self, record, samples):
+        gm = record.genotypes
+        n_distinct = gm.n_distinct()
         for s in samples:
-            if len(set(record.samples[s]['GT'])) != 2:
+            if n_distinct[gm.index[s]] != 2:
                 return False
         return True
 
+    def _sample_rows(self, gm):
+        '''
+            Return arrays of unaffected and affected rows in a
+            GenotypeMatrix. Rows are cached for as long as the
+            GenotypeMatrix layout is unchanged.
+        '''
+        if self._rows is None or self._rows[0] is not gm.index:
+            self._rows = (gm.index, gm.rows(self.unaffected),
+                          gm.rows(self.affected))
+        return self._rows[1:]
+
+    def _set_sample_groups(self, cases, controls, gt_args):
+        '''
+            Set up evaluation of groups of samples (e.g. families or
+            parent-child combinations) for segregation of alleles.
+            Rather than creating a SampleFilter for each group, a
+            single SampleFilter over all group members checks sample
+            IDs and provides genotype filters, and the index of the
+            group is stored for every case and control sample so that
+            all groups can be evaluated at once by segregating_groups.
+
+            Args:
+                cases:  Iterable of tuples of case IDs for each group.
+
+                controls:
+                        Iterable of tuples of control IDs for each
+                        group, in the same order as cases.
+
+                gt_args:
+                        A dict of arguments for SampleFilter genotype
+                        filtering.
+        '''
+        self._group_cases = tuple(x for g in cases for x in g)
+        self._group_controls = tuple(x for g in controls for x in g)
+        self._case_group_idx = np.array(
+            [i for i, g in enumerate(cases) for x in g], dtype=np.intp)
+        self._control_group_idx = np.array(
+            [i for i, g in enumerate(controls) for x in g], dtype=np.intp)
+        self._n_groups = len(cases)
+        self._group_rows = None
+        self.sample_filter = SampleFilter(self.family_filter.vcf,
+                                          cases=self._group_cases,
+                                          controls=self._group_controls,
+                                          confirm_missing=True, **gt_args)
+
+    def segregating_groups(self, record, allele, confirm_het=False):
+        '''
+            Return a boolean array indicating for each group set by
+            _set_sample_groups whether allele is carried by all cases
+            with genotypes passing genotype filters and is confidently
+            absent from all controls. Results are equivalent to those of
+            a SampleFilter (with confirm_missing=True) for each group,
+            but evaluated in a single pass over the record's
+            GenotypeMatrix with genotype quality only checked for groups
+            that are still segregating after checking GT calls.
+
+            Args:
+                record: VaseRecord
+
+                allele: ALT allele index.
+
+                confirm_het:
+                        If True, also require all cases to be called as
+                        heterozygous.
+        '''
+        gm = record.genotypes
+        if self._group_rows is None or self._group_rows[0] is not gm.index:
+            self._group_rows = (gm.index, gm.rows(self._group_cases),
+                                gm.rows(self._group_controls))
+        case_rows, control_rows = self._group_rows[1:]
+        gt_filter_args = dict()
+        if record.IS_SV:
+            gt_filter = self.sample_filter.sv_gt_filter
+            control_filter = self.sample_filter.sv_con_gt_filter
+            gt_filter_args['svtype'] = record.info['SVTYPE']
+        else:
+            gt_filter = self.sample_filter.gt_filter
+            control_filter = self.sample_filter.con_gt_filter
+        carriers = gm.has_allele(allele)
+        group_ok = np.ones(self._n_groups, dtype=bool)
+        # cases must carry allele, controls must be called and not carry it
+        case_fail = ~carriers[case_rows]
+        if confirm_het:
+            case_fail |= gm.n_distinct()[case_rows] != 2
+        group_ok[self._case_group_idx[case_fail]] = False
+        con_fail = carriers[control_rows] | gm.no_calls()[control_rows]
+        group_ok[self._control_group_idx[con_fail]] = False
+        if not group_ok.any():
+            return group_ok
+        # genotype quality only needs checking for remaining groups
+        check = group_ok[self._case_group_idx]
+        ok = gt_filter.gt_ok_mask(gm, allele, case_rows[check],
+                                  **gt_filter_args)
+        group_ok[self._case_group_idx[check][~ok]] = False
+        check = group_ok[self._control_group_idx]
+        rows = control_rows[check]
+        con_fail = ~control_filter.gt_ok_mask(gm, allele, rows,
+                                              **gt_filter_args)
+        if control_filter.ad_over_threshold_mask is not None:
+            ok_rows = rows[~con_fail]
+            over = control_filter.ad_over_threshold_mask(gm, allele, ok_rows)
+            if 'AD' in record.format:
+                over &= ~gm.missing['AD'][ok_rows]
+            con_fail[~con_fail] = over
+        group_ok[self._control_group_idx[check][con_fail]] = False
+        return group_ok
+
     def _get_allele_counts(self, allele, record):
         a_counts = dict()
         gt_filter_args = dict()
@@ -379,25 +500,68 @@ class InheritanceFilter(object):
         else:
             gt_filter = self.gt_filter
             control_filter = self.con_gt_filter
-        for samp in self.unaffected:
-            if control_filter.gt_is_ok(record.samples, samp, allele,
-                                       **gt_filter_args):
-                a_counts[samp] = record.samples[samp]['GT'].count(allele)
-            else:
-                a_counts[samp] = None
-            if (record.samples[samp]['GT'] == (0, 0) and
-                    control_filter.ad_over_threshold is not None):
-                if control_filter.ad_over_threshold(record.samples, samp,
-                                                    allele):
-                    a_counts[samp] = 1
-        for samp in self.affected:
-            if gt_filter.gt_is_ok(record.samples, samp, allele,
-                                  **gt_filter_args):
-                a_counts[samp] = record.samples[samp]['GT'].count(allele)
+        gm = record.genotypes
+        unaffected_rows, affected_rows = self._sample_rows(gm)
+        counts = gm.allele_counts(allele).tolist()
+        un_ok = control_filter.gt_ok_mask(gm, allele, unaffected_rows,
+                                          **gt_filter_args)
+        over = np.zeros(len(unaffected_rows), dtype=bool)
+        if control_filter.ad_over_threshold_mask is not None:
+            # only hom ref genotypes need checking for ALT allele reads
+            hom_ref = gm.is_genotype((0, 0))[unaffected_rows]
+            over[hom_ref] = control_filter.ad_over_threshold_mask(
+                gm, allele, unaffected_rows[hom_ref])
+        for samp, i, ok, o in zip(self.unaffected, unaffected_rows.tolist(),
+                                  un_ok.tolist(), over.tolist()):
+            if o:
+                a_counts[samp] = 1
+            elif ok:
+                a_counts[samp] = counts[i]
             else:
                 a_counts[samp] = None
+        aff_ok = gt_filter.gt_ok_mask(gm, allele, affected_rows,
+                                      **gt_filter_args)
+        for samp, i, ok in zip(self.affected, affected_rows.tolist(),
+                               aff_ok.tolist()):
+            a_counts[samp] = counts[i] if ok else None
         return a_counts
 
+    def replace_records(self, records):
+        '''
+            Replace the record of cached PotentialSegregant objects.
+
+            Args:
+                records:
+                        Dict of the IDs (as given by id()) of records to
+                        replace to their replacements (e.g. as returned
+                        by VariantCache.spill).
+        '''
+        for cache in self._segregant_caches():
+            for prs in cache.values():
+                for pr in prs.values():
+                    replacement = records.get(id(pr.record))
+                    if replacement is not None:
+                        pr.record = replacement
+
+    def _segregant_caches(self):
+        '''
+            Return dicts of features to dicts of PotentialSegregant
+            objects cached by this filter. Override in child classes.
+        '''
+        return []
+
+    def _feature_open(self, feature):
+        '''
+            Returns True if feature is annotated for the current record
+            or, if a FeatureIndex is in use, ends at or after the current
+            record's position.
+        '''
+        if feature in self._current_features:
+            return True
+        if self.feature_index is None:
+            return False
+        return self.feature_index.is_open(feature, *self._prev_coordinate)
+
     def _check_sorted(self, record):
         if self._prev_coordinate[0] != record.chrom:
             if record.chrom in self._processed_contigs:
@@ -454,7 +618,7 @@ class RecessiveFilter(InheritanceFilter):
         pseudodominance or other more complicated inheritance patterns.
     '''
     def __init__(self, family_filter, gt_args, min_families=1, strict=False,
-                 exclude_denovo=False, report_file=None):
+                 exclude_denovo=False, report_file=None, feature_index=None):
         '''
             Args:
                 family_filter:
@@ -486,6 +650,12 @@ class RecessiveFilter(InheritanceFilter):
                         Output filehandle for writing summaries of
                         segregating variants to. Default=None.
 
+                feature_index:
+                        Optional FeatureIndex object. If provided,
+                        cached alleles for a feature are not processed
+                        until the input has passed the end of the
+                        feature.
+
         '''
         self.prefix = "VASE_biallelic"
         self.header_fields = [
@@ -508,7 +678,7 @@ class RecessiveFilter(InheritanceFilter):
                              'families', 'features')
         self.report_file = report_file
         super().__init__(family_filter, gt_args, min_families=min_families,
-                         report_file=report_file,)
+                         report_file=report_file, feature_index=feature_index)
         self.families = tuple(x for x in
                               self.family_filter.inheritance_patterns
                               if 'recessive' in
@@ -522,6 +692,12 @@ class RecessiveFilter(InheritanceFilter):
                                         if x in self.affected)
             self.family_filter.logger.info("Analysing family {} ".format(fid) +
                                            "under a recessive model")
+        # index of family for each affected so that all families can be
+        # checked for an allele at once
+        fam_idx = dict((fid, i) for i, fid in enumerate(self.families))
+        self._aff_fam_idx = np.fromiter(
+            (fam_idx[self.ped.individuals[x].fid] for x in self.affected),
+            dtype=np.intp, count=len(self.affected))
         self.strict = strict
         self.exclude_denovo = exclude_denovo
         self._potential_recessives = dict()
@@ -573,38 +749,27 @@ class RecessiveFilter(InheritanceFilter):
         else:
             gt_filter = self.gt_filter
             control_filter = self.con_gt_filter
-        skip_fam = set()
         added_prs = OrderedDict()
+        gm = record.genotypes
+        unaffected_rows, affected_rows = self._sample_rows(gm)
         for i in range(len(record.alts)):
             if ignore_alleles and ignore_alleles[i]:
                 continue
             alt = i + 1
-            skip_allele = False
-            fams_with_allele = []
-            for un in self.unaffected:
-                if record.samples[un]['GT'] == (alt, alt):
-                    if control_filter.gt_is_ok(record.samples, un, alt,
-                                               **gt_filter_args):
-                        # hom in a control - skip allele
-                        skip_allele = True
-                        break
-            if skip_allele:
+            # genotype quality only needs checking for carriers
+            hom_alt = gm.is_genotype((alt, alt))[unaffected_rows]
+            if control_filter.gt_ok_mask(gm, alt, unaffected_rows[hom_alt],
+                                         **gt_filter_args).any():
+                # hom in a control - skip allele
                 continue
-            for fid in self.families:
-                if fid in skip_fam:
-                    continue
-                have_allele = set()  # affecteds carrying this allele
-                for aff in self._fam_to_aff[fid]:
-                    # check all affecteds carry this allele
-                    if (alt in record.samples[aff]['GT'] and
-                            gt_filter.gt_is_ok(record.samples, aff, alt,
-                                               **gt_filter_args)):
-                        have_allele.add(aff)
-                    else:
-                        break
-                if have_allele == self._fam_to_aff[fid]:
-                    # all affecteds in family carry allele
-                    fams_with_allele.append(fid)
+            aff_carrier = gm.has_allele(alt)[affected_rows]
+            aff_carrier[aff_carrier] = gt_filter.gt_ok_mask(
+                gm, alt, affected_rows[aff_carrier], **gt_filter_args)
+            # families where all affecteds carry allele
+            fam_ok = np.ones(len(self.families), dtype=bool)
+            fam_ok[self._aff_fam_idx[~aff_carrier]] = False
+            fams_with_allele = [self.families[j] for j in
+                                np.flatnonzero(fam_ok).tolist()]
             if fams_with_allele:
                 # store record and consequences
                 try:
@@ -654,43 +819,10 @@ class RecessiveFilter(InheritanceFilter):
         '''
         segregating = OrderedDict()  # key=alt_id, val=SegregatingBiallelic
         for feat, prs in self._potential_recessives.items():
-            if not final and feat in self._current_features:
+            if not final and self._feature_open(feat):
                 continue
             feat_segregating = []  # list of tuples of values for creating SegregatingBiallelic
-            un_hets = defaultdict(list)  # store het alleles carried by each unaffected
-            aff_hets = defaultdict(list)  # store het alleles carried by each affected
-            biallelics = defaultdict(list)  # store biallelic combinations for affecteds
-            for pid, p in prs.items():
-                for un in self.unaffected:
-                    if p.allele_counts[un] == 1:  # already checked for homs when adding
-                        # store allele carried in this unaffected
-                        un_hets[un].append(pid)
-                for aff in (x for x in self.affected
-                            if self.ped.fid_from_iid(x) in p.families):
-                    if p.allele_counts[aff] == 1:
-                        aff_hets[aff].append(pid)
-                    elif p.allele_counts[aff] == 2:
-                        biallelics[aff].append(tuple([pid]))
-            incompatibles = []  # create a list of sets of incompatible hets
-            for hets in un_hets.values():
-                if len(hets):
-                    incompatibles.append(set(hets))
-            for aff, hets in aff_hets.items():
-                for i in range(len(hets)):
-                    for j in range(i+1, len(hets)):
-                        incomp = False
-                        for iset in incompatibles:
-                            if iset.issuperset([hets[i], hets[j]]):
-                                incomp = True
-                                break
-                        if not incomp:
-                            if not prs[hets[i]].record.in_cis_with(sample=aff,
-                                allele=prs[hets[i]].allele,
-                                other=prs[hets[j]].record,
-                                other_allele=prs[hets[j]].allele):
-                                # check phase groups in case alleles in cis
-                                biallelics[aff].append(
-                                                     tuple([hets[i], hets[j]]))
+            biallelics = self._get_biallelics(prs)
             if not biallelics:
                 continue
             # see if all affecteds in the same family share the same biallelics
@@ -737,10 +869,68 @@ class RecessiveFilter(InheritanceFilter):
         # clear the cache except for the last entry which will be a new gene
         # self._potential_recessives = self._last_added
         self._potential_recessives = OrderedDict(
-            (k, v) for k, v in self._potential_recessives.items() if k in
-            self._current_features)
+            (k, v) for k, v in self._potential_recessives.items() if
+            self._feature_open(k))
         return var_to_segregants
 
+    def _segregant_caches(self):
+        return [self._potential_recessives]
+
+    def _get_biallelics(self, prs):
+        '''
+            For an OrderedDict of alt IDs to PotentialSegregant objects
+            for a single feature, return a dict of affected samples to
+            lists of tuples of alt IDs that constitute homozygous or
+            compound heterozygous combinations in the affected and are
+            not carried in combination by any unaffected.
+
+            Alleles are assigned integer IDs according to their order in
+            prs so that heterozygous carriers of each allele can be
+            held in boolean arrays and combinations carried by
+            unaffecteds can be identified by matrix multiplication
+            rather than checking every pair of alleles against every
+            unaffected. Phasing data are only retrieved once per allele
+            and sample.
+        '''
+        pids = list(prs)
+        biallelics = defaultdict(list)
+        aff_hets = OrderedDict()
+        for aff in self.affected:
+            fid = self.ped.fid_from_iid(aff)
+            in_fam = [fid in p.families for p in prs.values()]
+            if not any(in_fam):
+                continue
+            counts = [p.allele_counts[aff] if f else None for p, f in
+                      zip(prs.values(), in_fam)]
+            for i in (i for i, c in enumerate(counts) if c == 2):
+                biallelics[aff].append(tuple([pids[i]]))
+            hets = np.array([c == 1 for c in counts], dtype=bool)
+            if np.count_nonzero(hets) > 1:
+                aff_hets[aff] = np.flatnonzero(hets)
+        if not aff_hets:
+            return biallelics
+        # matrix of unaffecteds x alleles - only hets as homs already removed
+        un_hets = np.array([[p.allele_counts[un] == 1 for p in prs.values()]
+                            for un in self.unaffected], dtype=np.int32)
+        un_hets = un_hets.reshape(len(self.unaffected), len(pids))
+        un_hets = un_hets[un_hets.any(axis=1)]
+        phases = dict()
+        for aff, hets in aff_hets.items():
+            # pairs of hets carried together by any unaffected
+            sub = un_hets[:, hets]
+            incompatible = (sub.T @ sub) > 0
+            compatible = np.triu(~incompatible, k=1)
+            for i, j in zip(*np.nonzero(compatible)):
+                pi, pj = pids[hets[i]], pids[hets[j]]
+                for x in (pi, pj):
+                    if (x, aff) not in phases:
+                        phases[(x, aff)] = prs[x].record.phase_info(
+                            aff, prs[x].allele)
+                if not phases_in_cis(phases[(pi, aff)], phases[(pj, aff)]):
+                    # check phase groups in case alleles in cis
+                    biallelics[aff].append(tuple([pi, pj]))
+        return biallelics
+
     def _check_parents(self, feat, alleles, samples):
         '''
             Check transmission of alleles (i.e. one from each parent)
@@ -802,7 +992,7 @@ class DominantFilter(InheritanceFilter):
     '''
 
     def __init__(self, family_filter, gt_args, min_families=1,
-                 report_file=None):
+                 report_file=None, feature_index=None):
         '''
             Initialize with parent IDs, children IDs and VcfReader
             object.
@@ -821,6 +1011,12 @@ class DominantFilter(InheritanceFilter):
                         qualifying variant in a feature before
                         outputting. Default=1.
 
+                feature_index:
+                        Optional FeatureIndex object. If provided,
+                        cached alleles for a feature are not processed
+                        until the input has passed the end of the
+                        feature.
+
         '''
         self.prefix = "VASE_dominant"
         self.header_fields = [
@@ -841,14 +1037,15 @@ class DominantFilter(InheritanceFilter):
                              'features')
         self.report_file = report_file
         super().__init__(family_filter, gt_args, min_families=min_families,
-                         report_file=report_file,)
+                         report_file=report_file, feature_index=feature_index)
         self.families = tuple(x for x in
                               self.family_filter.inheritance_patterns
                               if 'dominant' in
                               self.family_filter.inheritance_patterns[x])
         self.affected = tuple(x for x in family_filter.vcf_affected if
                               self.ped.individuals[x].fid in self.families)
-        self.filters = dict()
+        self.fam_cases = OrderedDict()
+        self.fam_controls = OrderedDict()
         self._potential_dominants = dict()
         self._last_added = OrderedDict()
         self._current_features = set()
@@ -865,12 +1062,25 @@ class DominantFilter(InheritanceFilter):
                     self.family_filter.obligate_carriers[fam])
             else:
                 self.obligate_carriers = ()
-            dom_filter = SampleFilter(family_filter.vcf, cases=f_aff,
-                                      controls=f_unaff, confirm_missing=True,
-                                      **gt_args)
-            self.filters[fam] = dom_filter
+            self.fam_cases[fam] = f_aff
+            self.fam_controls[fam] = f_unaff
             self.family_filter.logger.info("Analysing family {} ".format(fam) +
                                            "under a dominant model")
+        self._set_sample_groups(self.fam_cases.values(),
+                                self.fam_controls.values(), gt_args)
+
+    def segregating_families(self, record, allele):
+        '''
+            Return a boolean array indicating for each family in
+            self.families whether allele is carried by all of the
+            family's affected samples (and obligate carriers) with
+            heterozygous genotypes passing genotype filters and is
+            confidently absent from all unaffected family members.
+            This is equivalent to checking each family with its own
+            SampleFilter (with confirm_missing=True) followed by
+            confirm_heterozygous.
+        '''
+        return self.segregating_groups(record, allele, confirm_het=True)
 
     def process_record(self, record, ignore_alleles=[], ignore_csq=[]):
         '''
@@ -892,28 +1102,28 @@ class DominantFilter(InheritanceFilter):
         '''
         dom_alleles = ([[] for i in range(len(record.alts))])
         fam_alleles = ([[] for i in range(len(record.alts))])
+        if self.min_families > 1:
+            self._check_sorted(record)
+            self._current_features = set(c['Feature'] for c in record.CSQ
+                                         if c['Feature'] != '')
         ignore_csq = self.check_g2p(record, ignore_csq, 'dominant')
         if ignore_csq and all(ignore_csq):
             return False
-        if self.min_families > 1:
-            self._check_sorted(record)
         for i in range(len(record.alts)):
             if ignore_alleles[i]:
                 continue
             allele = i + 1
-            for fam, dfilter in self.filters.items():
-                # looking for (potentially shared) de novos in a single family
-                is_dom = not dfilter.filter(record, allele)
-                if is_dom:
-                    if self.confirm_heterozygous(record, dfilter.cases):
-                        dom_alleles[i].extend(dfilter.cases)
-                        fam_alleles[i].append(fam)
-                        self.family_filter.logger.debug(
-                            "Apparent dominant allele {}:{}-{}/{} ".format(
-                                record.chrom, record.pos, record.ref,
-                                record.alleles[allele]) +
-                            "present in {} ".format(dfilter.cases) +
-                            "and absent in {}".format(dfilter.controls))
+            fam_ok = self.segregating_families(record, allele)
+            for j in np.flatnonzero(fam_ok).tolist():
+                fam = self.families[j]
+                dom_alleles[i].extend(self.fam_cases[fam])
+                fam_alleles[i].append(fam)
+                self.family_filter.logger.debug(
+                    "Apparent dominant allele {}:{}-{}/{} ".format(
+                        record.chrom, record.pos, record.ref,
+                        record.alleles[allele]) +
+                    "present in {} ".format(list(self.fam_cases[fam])) +
+                    "and absent in {}".format(list(self.fam_controls[fam])))
         segs = []
         for i in range(len(dom_alleles)):
             if not dom_alleles[i]:
@@ -965,6 +1175,9 @@ class DominantFilter(InheritanceFilter):
                 sv.annotate_record(self.report_file, self.annot_fields)
         return len(segs) > 0
 
+    def _segregant_caches(self):
+        return [self._potential_dominants, self._last_added]
+
     def process_dominants(self, final=False):
         '''
             Check whether stored PotentialSegregant alleles make up
@@ -991,7 +1204,8 @@ class DominantFilter(InheritanceFilter):
                     self._potential_dominants[feat] = self._last_added[feat]
             self._last_added = OrderedDict()
         for feat, pds in self._potential_dominants.items():
-            if feat in self._current_features:  # still processing this feature
+            if not final and self._feature_open(feat):
+                # still processing this feature
                 continue
             feat_fams = set()
             feat_processed.append(feat)
@@ -1029,7 +1243,7 @@ class DeNovoFilter(InheritanceFilter):
     '''
 
     def __init__(self, family_filter, gt_args, min_families=1, confirm_het=False,
-                 report_file=None):
+                 report_file=None, feature_index=None):
         '''
             Initialize with parent IDs, children IDs and VcfReader
             object.
@@ -1052,6 +1266,12 @@ class DeNovoFilter(InheritanceFilter):
                         If True, apparent de novos are required to be
                         called as heterozygous. Default=False.
 
+                feature_index:
+                        Optional FeatureIndex object. If provided,
+                        cached alleles for a feature are not processed
+                        until the input has passed the end of the
+                        feature.
+
         '''
         self.prefix = "VASE_de_novo"
         self.header_fields = [("VASE_de_novo_samples",
@@ -1066,7 +1286,7 @@ class DeNovoFilter(InheritanceFilter):
         self.annot_fields = ('samples', 'families', 'features')
         self.report_file = report_file
         super().__init__(family_filter, gt_args, min_families=min_families,
-                         report_file=report_file,)
+                         report_file=report_file, feature_index=feature_index)
         self.families = tuple(x for x in self.family_filter.inheritance_patterns
                              if 'de_novo' in
                              self.family_filter.inheritance_patterns[x])
@@ -1076,8 +1296,11 @@ class DeNovoFilter(InheritanceFilter):
         self._last_added = OrderedDict()
         self._current_features = set()
         self.confirm_het = confirm_het
-        self.filters = defaultdict(list)
         self.prefix = "VASE_de_novo"
+        # parents and children of each parent-child combination
+        self.trio_parents = []
+        self.trio_children = []
+        trio_fams = []
         for fam in self.families:
             f_aff = tuple(x for x in self.ped.families[fam].get_affected()
                           if x in self.affected)
@@ -1089,15 +1312,22 @@ class DeNovoFilter(InheritanceFilter):
                 if len(pars) == 2:
                     par_child_combos[pars].append(aff)
             for parents, children in par_child_combos.items():
-                par_filter = SampleFilter(family_filter.vcf, cases=children,
-                                          controls=parents,
-                                          confirm_missing=True, **gt_args)
-                self.filters[fam].append(par_filter)
+                self.trio_parents.append(parents)
+                self.trio_children.append(tuple(children))
+                trio_fams.append(fam)
                 self.family_filter.logger.info(
                     "Analysing family {} parents ({}) and children ({})"
                     .format(fam, str.join(", ", parents),
                             str.join(", ", children)) +
                     " combinations under a de novo dominant model")
+        # families with at least one parent-child combination and index
+        # of family for each combination
+        self.trio_families = tuple(OrderedDict.fromkeys(trio_fams))
+        fam_idx = dict((fid, i) for i, fid in enumerate(self.trio_families))
+        self._trio_fam_idx = np.array([fam_idx[x] for x in trio_fams],
+                                      dtype=np.intp)
+        self._set_sample_groups(self.trio_children, self.trio_parents,
+                                gt_args)
 
     def process_record(self, record, ignore_alleles=[], ignore_csq=[]):
         '''
@@ -1118,6 +1348,8 @@ class DeNovoFilter(InheritanceFilter):
         '''
         if self.min_families > 1:
             self._check_sorted(record)
+            self._current_features = set(c['Feature'] for c in record.CSQ
+                                         if c['Feature'] != '')
         ignore_csq = self.check_g2p(record, ignore_csq, 'de novo')
         if ignore_csq and all(ignore_csq):
             return False
@@ -1127,24 +1359,24 @@ class DeNovoFilter(InheritanceFilter):
             if ignore_alleles[i]:
                 continue
             allele = i + 1
-            for fam, filters in self.filters.items():
-                # looking for (potentially shared) de novos in a single family
-                dns = []
-                for dfilter in filters:
-                    is_denovo = not dfilter.filter(record, allele)
-                    if is_denovo:
-                        if (not self.confirm_het or self.confirm_heterozygous(
-                                record, dfilter.cases)):
-                            dns.append(dfilter.cases)
-                            self.family_filter.logger.debug("Apparent de " +
-                                "novo allele {}:{}-{}/{} ".format(
-                                record.chrom, record.pos, record.ref,
-                                record.alleles[allele]) + "present in {} "
-                                .format(dfilter.cases) + "and absent in {}"
-                                .format(dfilter.controls))
-                if len(dns) == len(filters):  # all affecteds in fam have dnm
-                    ([denovo_alleles[i].extend(x) for x in dns])
-                    fam_alleles[i].append(fam)
+            # evaluate all parent-child combinations at once
+            trio_ok = self.segregating_groups(record, allele,
+                                              confirm_het=self.confirm_het)
+            for j in np.flatnonzero(trio_ok).tolist():
+                self.family_filter.logger.debug(
+                    "Apparent de novo allele {}:{}-{}/{} ".format(
+                        record.chrom, record.pos, record.ref,
+                        record.alleles[allele]) +
+                    "present in {} ".format(list(self.trio_children[j])) +
+                    "and absent in {}".format(list(self.trio_parents[j])))
+            # looking for (potentially shared) de novos in a single family
+            # - all affecteds in family must have de novo allele
+            fam_ok = np.ones(len(self.trio_families), dtype=bool)
+            fam_ok[self._trio_fam_idx[~trio_ok]] = False
+            for j in np.flatnonzero(fam_ok[self._trio_fam_idx]).tolist():
+                denovo_alleles[i].extend(self.trio_children[j])
+            fam_alleles[i].extend(self.trio_families[j] for j in
+                                  np.flatnonzero(fam_ok).tolist())
         segs = []
         for i in range(len(denovo_alleles)):
             if not denovo_alleles[i]:
@@ -1189,6 +1421,9 @@ class DeNovoFilter(InheritanceFilter):
                 sv.annotate_record(self.report_file, self.annot_fields)
         return len(segs) > 0
 
+    def _segregant_caches(self):
+        return [self._potential_denovos, self._last_added]
+
     def process_de_novos(self, final=False):
         '''
             Check whether stored PotentialSegregant alleles make up
@@ -1215,7 +1450,8 @@ class DeNovoFilter(InheritanceFilter):
                     self._potential_denovos[feat] = self._last_added[feat]
             self._last_added = OrderedDict()
         for feat, pds in self._potential_denovos.items():
-            if feat in self._current_features:  # still processing this feature
+            if not final and self._feature_open(feat):
+                # still processing this feature
                 continue
             feat_fams = set()
             feat_processed.append(feat)
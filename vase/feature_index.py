@@ -0,0 +1,112 @@
+import gzip
+from .bed_parser import BedParser
+from .gtf_parser import parse_attributes, match_contig, GtfFormatError
+
+gtf_id_attributes = ['transcript_id', 'gene_id', 'protein_id', 'ID']
+gtf_id_prefixes = ('transcript:', 'gene:', 'CDS:')
+
+
+class FeatureIndex(object):
+    '''
+        Store the contig and end coordinate of features (e.g. VEP
+        'Feature' IDs such as transcripts) so that caches of variants
+        per feature can be released as soon as the input position
+        passes the end of a feature rather than when a record without
+        any overlapping features is encountered.
+    '''
+
+    __slots__ = ['ends', 'padding']
+
+    def __init__(self, filename, padding=0, contigs=None):
+        '''
+            Args:
+                filename:
+                        BED file of intervals with feature IDs in the
+                        fourth column (multiple IDs separated with '/'
+                        characters, as for the --gene_bed option) or a
+                        GTF/GFF3 file containing gene and/or transcript
+                        features. Files ending with '.bed' (optionally
+                        followed by '.gz' or '.bgz') are read as BED,
+                        all other files as GTF/GFF3.
+
+                padding:
+                        Number of bp to add to the end of each feature.
+                        This should be at least as large as the
+                        downstream distance used by VEP if upstream/
+                        downstream consequences are included.
+                        Default=0.
+
+                contigs:
+                        Optional collection of contig names in the VCF
+                        to be searched. If provided, contig names not
+                        present in this collection will have their 'chr'
+                        prefix added or removed to match the VCF naming
+                        convention.
+        '''
+        self.ends = dict()
+        self.padding = padding
+        if filename.endswith(('.bed', '.bed.gz', '.bed.bgz')):
+            self._read_bed(filename, contigs)
+        else:
+            self._read_gtf(filename, contigs)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __contains__(self, feature):
+        return feature in self.ends
+
+    def _add(self, feature, contig, end):
+        end += self.padding
+        prev = self.ends.get(feature)
+        if prev is None or (prev[0] == contig and prev[1] < end):
+            self.ends[feature] = (contig, end)
+
+    def _read_bed(self, bed, contigs):
+        for interval in BedParser(bed, min_col=4).intervals:
+            for region in interval.regions:
+                contig = match_contig(region[0], contigs)
+                for feature in region[3].split('/'):
+                    self._add(feature, contig, int(region[2]))
+
+    def _read_gtf(self, gtf, contigs):
+        if gtf.endswith((".gz", ".bgz")):
+            gfile = gzip.open(gtf, errors='replace', mode='rt')
+        else:
+            gfile = open(gtf, 'rt')
+        for line in gfile:
+            if line[0] == '#':
+                continue
+            s = line.rstrip().split("\t")
+            if len(s) < 9:
+                raise GtfFormatError("Not enough fields in GTF/GFF line: " +
+                                     line)
+            try:
+                end = int(s[4])
+            except ValueError:
+                raise GtfFormatError("Column 5 must be an integer (for " +
+                                     "line: " + line + ")")
+            contig = match_contig(s[0], contigs)
+            attributes = parse_attributes(s[8])
+            for k in gtf_id_attributes:
+                fid = attributes.get(k)
+                if fid is None:
+                    continue
+                if fid.startswith(gtf_id_prefixes):
+                    fid = fid.split(':', 1)[1]
+                self._add(fid, contig, end)
+                version = attributes.get(k.replace('_id', '_version'))
+                if version is not None and k != 'ID':
+                    # VEP may report versioned IDs
+                    self._add(fid + '.' + version, contig, end)
+        gfile.close()
+
+    def is_open(self, feature, chrom, pos):
+        '''
+            Returns True if feature is in the index and ends at or after
+            the given position on the given contig.
+        '''
+        loc = self.ends.get(feature)
+        if loc is None:
+            return False
+        return loc[0] == chrom and pos <= loc[1]
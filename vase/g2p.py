@@ -1,5 +1,6 @@
 from collections import defaultdict
-from .utils import csv_to_dict
+from functools import lru_cache
+from .utils import csv_to_dict, csq_mask
 
 allelic_req_to_label = {'biallelic':                  ['recessive'],
                         'digenic':                    [],
@@ -49,11 +50,18 @@ mutation_to_csq = {
 }
 
 
+@lru_cache(maxsize=65536)
+def _consequence_mask(consequence):
+    ''' Bitmask for an '&' separated VEP Consequence annotation. '''
+    return csq_mask(consequence.split('&'))
+
+
 class G2P(object):
     ''' Filter variants based on requirements from a G2P CSV file.'''
 
     def __init__(self, g2p_file):
         self.g2p = self._read_g2p_csv(g2p_file)
+        self._compile_requirements(g2p_file)
 
     def _read_g2p_csv(self, g2p):
         required_fields = ['gene symbol', 'disease name', 'DDD category',
@@ -66,7 +74,58 @@ class G2P(object):
                 for prev in row['prev symbols'].split(';'):
                     prev_symbol_d[prev].append(row)
         g2p.update(prev_symbol_d)
-        return g2p
+        return dict(g2p)
+
+    def _compile_requirements(self, g2p_file):
+        '''
+            Compile the rows for each gene symbol (including previous
+            symbols) into lookup tables of inheritance labels and
+            consequence bitmasks so that per-consequence checks do not
+            need to parse the G2P rows.
+        '''
+        self.labels = dict()  # symbol -> frozenset of inheritance labels
+        self.consequences = dict()  # symbol -> frozenset of consequences
+        self.uncertain = set()  # symbols with an uncertain consequence
+        # symbol -> (mask, uncertain) for rows before first uncertain row
+        self._first_req = dict()
+        # (symbol, inheritance) -> (mask, uncertain) for rows of that label
+        self._inheritance_req = dict()
+        for symbol, rows in self.g2p.items():
+            labels = set()
+            csqs = set()
+            first_mask = 0
+            first_uncertain = False
+            inh_masks = defaultdict(int)
+            inh_uncertain = set()
+            for row in rows:
+                try:
+                    row_labels = set(
+                        lbl for r in row['allelic requirement'].split(',')
+                        for lbl in allelic_req_to_label[r])
+                    mutation_csq = mutation_to_csq[
+                        row['mutation consequence']]
+                except KeyError as e:
+                    raise RuntimeError("Error in G2P file {}: ".format(
+                        g2p_file) + "unrecognised value '{}' ".format(
+                            e.args[0]) + "for gene {}".format(symbol))
+                labels.update(row_labels)
+                if mutation_csq is None:
+                    first_uncertain = True
+                    self.uncertain.add(symbol)
+                    inh_uncertain.update(row_labels)
+                    continue
+                mask = csq_mask(mutation_csq)
+                csqs.update(mutation_csq)
+                if not first_uncertain:
+                    first_mask |= mask
+                for lbl in row_labels:
+                    inh_masks[lbl] |= mask
+            self.labels[symbol] = frozenset(labels)
+            self.consequences[symbol] = frozenset(csqs)
+            self._first_req[symbol] = (first_mask, first_uncertain)
+            for lbl in labels:
+                self._inheritance_req[(symbol, lbl)] = (inh_masks[lbl],
+                                                        lbl in inh_uncertain)
 
     def consequence_requirement_met(self, record):
         '''
@@ -97,18 +156,13 @@ class G2P(object):
                         'mutation consequence' column. If False return
                         False for these consequences.
         '''
-        if csq['SYMBOL'] in self.g2p:
-            for req in (x['mutation consequence'] for x in
-                        self.g2p[csq['SYMBOL']]):
-                if mutation_to_csq[req] is None:
-                    if keep_uncertain:
-                        return True
-                    else:
-                        return False
-                elif any(x in csq['Consequence'].split('&') for x in
-                         mutation_to_csq[req]):
-                    return True
-        return False
+        try:
+            mask, uncertain = self._first_req[csq['SYMBOL']]
+        except KeyError:
+            return False
+        if mask & _consequence_mask(csq['Consequence']):
+            return True
+        return uncertain and keep_uncertain
 
     def consequences_from_gene(self, gene, uncertain_to_none=True):
         '''
@@ -122,15 +176,25 @@ class G2P(object):
                         will be returned for annotations with an
                         'uncertain' 'mutation consequence'.
         '''
-        csqs = set()
-        for d in self.g2p[gene]:
-            if (d['mutation consequence'] == 'uncertain' or
-                    d['mutation consequence'] == ''):
-                if uncertain_to_none:
-                    return None
-            else:
-                csqs.update(mutation_to_csq[d['mutation consequence']])
-        return csqs
+        if uncertain_to_none and gene in self.uncertain:
+            return None
+        return set(self.consequences.get(gene, ()))
+
+    def consequence_mask_from_gene(self, gene, uncertain_to_none=True):
+        '''
+            As for consequences_from_gene but returns the consequences
+            as a bitmask (see vase.utils.csq_mask).
+        '''
+        if uncertain_to_none and gene in self.uncertain:
+            return None
+        return csq_mask(self.consequences.get(gene, ()))
+
+    def inheritance_matches(self, gene, inheritance):
+        '''
+            Return True if the gene has a G2P 'allelic requirement'
+            associated with the given inheritance pattern.
+        '''
+        return inheritance in self.labels.get(gene, ())
 
     def allelic_requirement_met(self, record, inheritance):
         '''
@@ -146,10 +210,8 @@ class G2P(object):
                         'recessive', 'dominant' or 'de novo'.
 
         '''
-        return (any(inheritance in allelic_req_to_label[y] for x in
-                    self.g2p[csq['SYMBOL']] for y in
-                    self.g2p[csq['SYMBOL']] for y in
-                    x['allelic requirement'].split(',')) for csq in record.CSQ)
+        return (self.inheritance_matches(csq['SYMBOL'], inheritance) for csq
+                in record.CSQ)
 
     def csq_and_allelic_requirement_met(self, record, inheritance,
                                         keep_uncertain=True):
@@ -174,18 +236,12 @@ class G2P(object):
         '''
         met = []
         for csq in record.CSQ:
-            verdict = False
-            for d in self.g2p[csq['SYMBOL']]:
-                req = d['allelic requirement']
-                if any(inheritance in allelic_req_to_label[r] for r in
-                       req.split(',')):
-                    if mutation_to_csq[d['mutation consequence']] is None:
-                        if keep_uncertain:
-                            verdict = True
-                            break
-                    elif any(x in csq['Consequence'].split('&') for x in
-                             mutation_to_csq[d['mutation consequence']]):
-                        verdict = True
-                        break
-            met.append(verdict)
+            try:
+                mask, uncertain = self._inheritance_req[(csq['SYMBOL'],
+                                                         inheritance)]
+            except KeyError:
+                met.append(False)
+                continue
+            met.append((uncertain and keep_uncertain) or
+                       bool(mask & _consequence_mask(csq['Consequence'])))
         return met
@@ -7,7 +7,7 @@ class GenomicInterval(object):
         merged from several overlapping BED regions.
     '''
 
-    __slots__ = ['contig', 'start', 'end', 'regions']
+    __slots__ = ['contig', 'start', 'end', 'regions', 'targets']
 
     def __init__(self, interval):
         '''
@@ -18,6 +18,7 @@ class GenomicInterval(object):
         self.start = int(interval[1])  # should be 0-based
         self.end = int(interval[2])
         self.regions = [interval]
+        self.targets = None  # cache for VarByRegion gene targets
         if self.start >= self.end:
             raise ValueError("Start of interval can not be greater than " +
                              "end (for interval {}:{}-{})"
@@ -79,6 +80,7 @@ class GenomicInterval(object):
             self.end = other.end
         self.regions.extend(other.regions)
         self.regions.sort(key=operator.itemgetter(0, 1, 2))
+        self.targets = None
 
 
 class NonOverlappingIntervalError(ValueError):
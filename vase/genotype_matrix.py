@@ -0,0 +1,188 @@
+import numpy as np
+
+MISSING = -1  # no-call allele (None in pysam)
+PAD = -2      # padding for samples with lower ploidy than others in record
+
+
+def subset(arr, rows=None):
+    ''' Return arr if rows is None, otherwise only the given rows. '''
+    if rows is None:
+        return arr
+    return arr[rows]
+
+
+def column(arr, i):
+    '''
+        Return column i (indexed as for a list/tuple) of a 2D array or an
+        array of NaNs if i is out of range.
+    '''
+    if -arr.shape[1] <= i < arr.shape[1]:
+        return arr[:, i]
+    return np.full(arr.shape[0], np.nan)
+
+
+class GenotypeMatrix(object):
+    '''
+        Genotype calls and per-sample FORMAT values of a single record
+        for a fixed set of samples, held as numpy arrays. Each row
+        corresponds to a sample (see the 'index' property for sample
+        ID to row number) so that GT, GQ, DP, AD etc. only need to be
+        retrieved from pysam once per record regardless of how many
+        filters check the same samples and alleles.
+
+        GT allele indices are held in the 'gt' array with no-call
+        alleles represented by -1 and positions beyond a sample's
+        ploidy by -2. Scalar fields (e.g. GQ and DP) are held as 1D
+        float arrays and multi-value fields (e.g. AD) as 2D float
+        arrays, with None values represented as NaN. For multi-value
+        fields the 'missing' property gives a boolean array indicating
+        which samples have no values at all (i.e. '.' in the VCF) and
+        the 'lengths' property gives the number of values for each
+        sample.
+    '''
+
+    __slots__ = ['samples', 'index', 'gt', 'ploidy', 'values', 'missing',
+                 'lengths', '_cache']
+
+    def __init__(self, record, samples, fields=('GT',), index=None,
+                 scalar_fields=('GQ', 'DP', 'RO', 'DHFFC', 'DHBFC')):
+        '''
+            Args:
+                record: pysam.VariantRecord
+
+                samples:
+                        List of sample IDs to retrieve genotypes for.
+
+                fields: FORMAT fields to retrieve in addition to GT.
+
+                index:  Optional dict of sample IDs to row numbers
+                        (i.e. position in samples). Created if not
+                        provided.
+
+                scalar_fields:
+                        FORMAT fields that have a single value per
+                        sample. All other fields are treated as
+                        having multiple values per sample.
+        '''
+        self.samples = samples
+        if index is None:
+            index = dict((s, i) for i, s in enumerate(samples))
+        self.index = index
+        self.values = dict()
+        self.missing = dict()
+        self.lengths = dict()
+        self._cache = dict()
+        calls = [record.samples[s] for s in samples]
+        gts = [c['GT'] for c in calls]
+        self.ploidy = np.fromiter((len(x) for x in gts), dtype=np.int32,
+                                  count=len(gts))
+        width = int(self.ploidy.max()) if len(gts) else 0
+        self.gt = np.full((len(gts), width), PAD, dtype=np.int32)
+        for i, gt in enumerate(gts):
+            self.gt[i, :len(gt)] = [MISSING if x is None else x for x in gt]
+        for f in fields:
+            if f == 'GT' or f in self.values:
+                continue
+            if f in scalar_fields:
+                self.values[f] = np.array([c.get(f, None) for c in calls],
+                                          dtype=float)
+            else:
+                vals = [c.get(f, (None,)) for c in calls]
+                self.missing[f] = np.fromiter((x is None or x == (None,) for
+                                               x in vals), dtype=bool,
+                                              count=len(vals))
+                self.lengths[f] = np.fromiter((0 if x is None else len(x)
+                                               for x in vals), dtype=np.intp,
+                                              count=len(vals))
+                width = max((len(x) for x in vals if x is not None),
+                            default=0)
+                arr = np.full((len(vals), width), np.nan)
+                for i, x in enumerate(vals):
+                    if x is not None:
+                        arr[i, :len(x)] = x
+                self.values[f] = arr
+
+    def __len__(self):
+        return len(self.samples)
+
+    def field(self, field, rows=None):
+        '''
+            Return values for a FORMAT field, optionally only for the
+            given row numbers.
+        '''
+        return subset(self.values[field], rows)
+
+    def rows(self, samples):
+        ''' Return an array of row numbers for the given sample IDs. '''
+        return np.fromiter((self.index[s] for s in samples), dtype=np.intp,
+                           count=len(samples))
+
+    def allele_counts(self, allele):
+        '''
+            Number of copies of allele in each sample's genotype (i.e.
+            the equivalent of GT.count(allele)).
+        '''
+        k = ('count', allele)
+        if k not in self._cache:
+            self._cache[k] = (self.gt == allele).sum(axis=1)
+        return self._cache[k]
+
+    def has_allele(self, allele):
+        ''' Boolean array indicating whether each sample's GT contains
+            allele (i.e. the equivalent of 'allele in GT').'''
+        k = ('has', allele)
+        if k not in self._cache:
+            self._cache[k] = self.allele_counts(allele) > 0
+        return self._cache[k]
+
+    def no_calls(self):
+        ''' Boolean array of samples where all alleles are no-calls. '''
+        if 'no_call' not in self._cache:
+            self._cache['no_call'] = (self.gt < 0).all(axis=1)
+        return self._cache['no_call']
+
+    def is_genotype(self, alleles):
+        '''
+            Boolean array of samples for which GT is equal to the given
+            tuple of allele indices (e.g. (1, 1)).
+        '''
+        k = ('is', alleles)
+        if k not in self._cache:
+            if len(alleles) > self.gt.shape[1]:
+                match = np.zeros(len(self.samples), dtype=bool)
+            else:
+                match = self.ploidy == len(alleles)
+                for i, a in enumerate(alleles):
+                    match &= self.gt[:, i] == (MISSING if a is None else a)
+            self._cache[k] = match
+        return self._cache[k]
+
+    def n_distinct(self):
+        '''
+            Number of distinct values (including no-calls) in each
+            sample's GT (i.e. the equivalent of len(set(GT))).
+        '''
+        if 'distinct' not in self._cache:
+            gt = self.gt.copy()
+            pad = gt == PAD
+            if gt.shape[1]:
+                # fill padding with first allele so it adds nothing new
+                gt[pad] = np.broadcast_to(gt[:, :1], gt.shape)[pad]
+                gt.sort(axis=1)
+                distinct = 1 + (np.diff(gt, axis=1) != 0).sum(axis=1)
+                distinct[self.ploidy == 0] = 0
+            else:
+                distinct = np.zeros(len(self.samples), dtype=np.intp)
+            self._cache['distinct'] = distinct
+        return self._cache['distinct']
+
+    def is_hom(self, allele):
+        ''' Boolean array of samples with GT consisting only of allele. '''
+        return self.has_allele(allele) & (self.n_distinct() == 1)
+
+    def is_het(self, allele):
+        '''
+            Boolean array of samples with allele plus at least one
+            different allele (or no-call) in their GT.
+        '''
+        return self.has_allele(allele) & (self.n_distinct() > 1)
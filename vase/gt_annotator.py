@@ -80,8 +80,10 @@ class GtAnnotator(object):
         match = self.find_matching_record(record)
         if match is None:
             return
+        samples = [x for x in match.header.samples if x in self.samples and
+                   x in record.header.samples]
         for f in self.format_fields:
-            for s in (x for x in match.header.samples if x in self.samples):
+            for s in samples:
                 record.samples[s][f] = match.samples[s][f]
 
     def find_matching_record(self, record):
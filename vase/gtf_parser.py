@@ -0,0 +1,128 @@
+import gzip
+from .interval_iter import IntervalIter
+
+gene_features = {'gene', 'ncRNA_gene', 'pseudogene'}
+id_attributes = ['gene_name', 'Name', 'gene_id', 'ID']
+
+
+class GtfParser(IntervalIter):
+    '''
+        For a GTF or GFF3 file, read the coordinates of gene features
+        matching a given set of gene symbols or Ensembl gene IDs and
+        merge overlapping intervals. Merged intervals are iterable as
+        GenomicInterval objects with unmerged intervals (in BED style
+        with the matched gene ID in the fourth column) retained in the
+        'regions' property of the GenomicInterval object.
+    '''
+
+    __slots__ = ['gtf', 'genes', 'padding', 'contigs', 'found']
+
+    def __init__(self, gtf, genes, padding=0, contigs=None):
+        '''
+            Args:
+                gtf:    GTF or GFF3 file (optionally gzip/bgzip
+                        compressed).
+
+                genes:  Gene symbols and/or Ensembl gene IDs to
+                        retrieve coordinates for.
+
+                padding:
+                        Number of bp to add to either side of each gene.
+                        Default=0.
+
+                contigs:
+                        Optional collection of contig names in the VCF
+                        to be searched. If provided, a contig name in
+                        the GTF that is not present in this collection
+                        will have its 'chr' prefix added or removed to
+                        match the VCF naming convention.
+        '''
+        self.gtf = gtf
+        self.genes = set(genes)
+        self.padding = padding
+        self.contigs = set(contigs) if contigs is not None else None
+        self.found = set()
+        intervals = self._read_gtf()
+        super().__init__(intervals)
+
+    @property
+    def missing(self):
+        ''' Genes for which no coordinates were found.'''
+        return self.genes - self.found
+
+    def _read_gtf(self):
+        regions = []
+        if self.gtf.endswith((".gz", ".bgz")):
+            gfile = gzip.open(self.gtf, errors='replace', mode='rt')
+        else:
+            gfile = open(self.gtf, 'rt')
+        for line in gfile:
+            if line[0] == '#':
+                continue
+            s = line.rstrip().split("\t")
+            if len(s) < 9:
+                raise GtfFormatError("Not enough fields in GTF/GFF line: " +
+                                     line)
+            if s[2] not in gene_features:
+                continue
+            attributes = self._parse_attributes(s[8])
+            matched = None
+            for k in id_attributes:
+                gid = attributes.get(k)
+                if gid is not None and gid.startswith('gene:'):
+                    gid = gid[5:]
+                if gid in self.genes:
+                    matched = gid
+                    break
+            if matched is None:
+                continue
+            try:
+                start = max(int(s[3]) - 1 - self.padding, 0)
+                end = int(s[4]) + self.padding
+            except ValueError:
+                raise GtfFormatError("Columns 4 and 5 must be integers (for " +
+                                     "line: " + line + ")")
+            self.found.add(matched)
+            regions.append([self._match_contig(s[0]), start, end, matched])
+        gfile.close()
+        return regions
+
+    def _parse_attributes(self, field):
+        return parse_attributes(field)
+
+    def _match_contig(self, contig):
+        return match_contig(contig, self.contigs)
+
+
+def parse_attributes(field):
+    ''' Return a dict of attributes from column 9 of a GTF/GFF3 line.'''
+    attributes = dict()
+    for att in field.rstrip(';').split(';'):
+        att = att.strip()
+        if not att:
+            continue
+        if '=' in att:  # GFF3
+            k, v = att.split('=', 1)
+        else:  # GTF
+            k, v = (att.split(' ', 1) + [''])[:2]
+        attributes[k] = v.strip('"')
+    return attributes
+
+
+def match_contig(contig, contigs=None):
+    '''
+        Return contig name with 'chr' prefix added or removed if
+        necessary to match a name in contigs. Returns contig unchanged if
+        contigs is None or no match is found.
+    '''
+    if contigs is None or contig in contigs:
+        return contig
+    if contig.startswith('chr') and contig[3:] in contigs:
+        return contig[3:]
+    if 'chr' + contig in contigs:
+        return 'chr' + contig
+    return contig
+
+
+class GtfFormatError(ValueError):
+    pass
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class ContigIndexSummary(object):
+    '''
+        Summarise the tabix/CSI index information for a single contig in
+        order to estimate how much of a compressed VCF/BCF would need to
+        be read to retrieve records from given intervals.
+
+        Offsets are compressed file offsets (i.e. the upper 48 bits of
+        BGZF virtual offsets) in bytes.
+    '''
+
+    __slots__ = ['min_shift', 'depth', 'begin', 'end', 'offsets',
+                 'level_bins']
+
+    def __init__(self, bindx, min_shift=14, depth=5, ioff=None, loff=None):
+        '''
+            Args:
+                bindx:  dict of bin numbers to arrays of chunk begin and
+                        end virtual offsets for this contig, as read by
+                        VcfReader._read_index.
+
+                min_shift:
+                        min_shift value of the index. Default=14.
+
+                depth:  depth of the binning index. Default=5.
+
+                ioff:   linear index of virtual offsets (TBI indexes).
+
+                loff:   dict of bin numbers to the virtual offset of the
+                        first record overlapping each bin (CSI indexes).
+                        Either this or ioff is required.
+        '''
+        self.min_shift = min_shift
+        self.depth = depth
+        meta_bin = ((1 << 3 * (depth + 1)) - 1) // 7 + 1
+        bins = dict((k, v) for k, v in bindx.items() if k != meta_bin and
+                    len(v))
+        self.level_bins = []
+        for level in range(depth + 1):
+            first = ((1 << 3 * level) - 1) // 7
+            self.level_bins.append(np.array(sorted(
+                k - first for k in bins if first <= k < first +
+                (1 << 3 * level)), dtype=np.int64))
+        if bins:
+            chunks = np.concatenate(list(bins.values())) >> np.uint64(16)
+            self.begin = int(chunks[:, 0].min())
+            self.end = int(chunks[:, 1].max())
+        else:
+            self.begin = self.end = 0
+        if ioff is not None:
+            offsets = (np.asarray(ioff, dtype=np.uint64) >>
+                       np.uint64(16)).astype(np.int64)
+        else:
+            if loff is None:
+                raise ValueError("Either ioff or loff argument is required.")
+            leaf_first = ((1 << 3 * depth) - 1) // 7
+            leaves = self.level_bins[depth]
+            n = int(leaves[-1]) + 1 if len(leaves) else 0
+            offsets = np.full(n, -1, dtype=np.int64)
+            for i in leaves:
+                offsets[i] = loff[int(i) + leaf_first] >> 16
+        # windows without records take the offset of the preceding window
+        offsets = np.where(offsets < self.begin, self.begin, offsets)
+        self.offsets = np.maximum.accumulate(offsets)
+
+    def has_records(self, starts, ends):
+        '''
+            For arrays of 0-based start and end coordinates, return a
+            boolean array indicating whether the index contains any bins
+            overlapping each interval. Intervals for which this is False
+            cannot contain any records.
+        '''
+        starts = np.asarray(starts, dtype=np.int64)
+        last = np.maximum(np.asarray(ends, dtype=np.int64) - 1, starts)
+        found = np.zeros(len(starts), dtype=bool)
+        for level, bins in enumerate(self.level_bins):
+            if not len(bins):
+                continue
+            shift = self.min_shift + 3 * (self.depth - level)
+            found |= (np.searchsorted(bins, last >> shift, side='right') >
+                      np.searchsorted(bins, starts >> shift, side='left'))
+        return found
+
+    def byte_ranges(self, starts, ends):
+        '''
+            For arrays of 0-based start and end coordinates, return
+            arrays of the compressed offsets at which reading would begin
+            and end in order to retrieve records overlapping each
+            interval.
+        '''
+        starts = np.asarray(starts, dtype=np.int64)
+        last = np.maximum(np.asarray(ends, dtype=np.int64) - 1, starts)
+        padded = np.append(self.offsets, max(self.end, self.begin))
+        n = len(self.offsets)
+        begins = padded[np.minimum(starts >> self.min_shift, n)]
+        # reading ends where records from the next populated window begin
+        last_off = padded[np.minimum(last >> self.min_shift, n)]
+        nxt = np.searchsorted(padded, last_off, side='right')
+        return begins, padded[np.minimum(nxt, n)]
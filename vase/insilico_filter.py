@@ -1,5 +1,6 @@
 import re
 import os
+from functools import lru_cache
 
 vep_internal_pred_re = re.compile(r'\(\d(\.\d+)?\)')
 # for removing numbers in brackets at end of PolyPhen, SIFT and Condel VEP
@@ -18,7 +19,8 @@ class InSilicoFilter(object):
 
 
     def __init__(self, programs, filter_unpredicted=False,
-                 keep_if_any_damaging=False, pred_file=None):
+                 keep_if_any_damaging=False, pred_file=None,
+                 memo_size=8192):
         '''
             Initialize with a list of program names to use as filters.
 
@@ -85,6 +87,13 @@ class InSilicoFilter(object):
                             for any annotation should always be
                             provided.
                             Default="data/vep_insilico_pred.tsv".
+
+                memo_size:
+                            Maximum number of distinct combinations of
+                            prediction values for which the result of
+                            filter() is memoized. Least recently used
+                            combinations are discarded first.
+                            Default=8192.
         '''
 
         self.filter_unpredicted = filter_unpredicted
@@ -188,6 +197,50 @@ class InSilicoFilter(object):
                 else:
                     self.pred_filters[prog] = default_progs[prog]['default']
         self._n_prog = len(self.pred_filters) + len(self.score_filters)
+        self._programs = list(self.pred_filters) + list(self.score_filters)
+        self._evaluators = tuple(
+            [self._pred_evaluator(p) for p in self.pred_filters] +
+            [self._score_evaluator(p) for p in self.score_filters])
+        self._filter_values = lru_cache(maxsize=memo_size)(
+            self._filter_values)
+
+    def _pred_evaluator(self, prog):
+        '''
+            Return a function which returns True if a non-empty
+            annotation value for a categorical prediction program
+            matches the filtering criteria.
+        '''
+        preds = self.pred_filters[prog]
+
+        def _matches(value):
+            for p in value.split('&'):
+                if vep_internal_pred_re.sub('', p) in preds:
+                    return True
+            return False
+        return _matches
+
+    def _score_evaluator(self, prog):
+        '''
+            Return a function which returns True if a non-empty
+            annotation value for a score based prediction program
+            meets the score threshold.
+        '''
+        threshold = self.score_filters[prog]
+        lower_more_damaging = prog in self.lower_more_damaging
+
+        def _matches(value):
+            for p in value.split('&'):
+                try:
+                    score = float(p)
+                except ValueError:
+                    continue
+                if lower_more_damaging:
+                    if score <= threshold:
+                        return True
+                elif score >= threshold:
+                    return True
+            return False
+        return _matches
 
     def filter(self, csq):
         '''
@@ -199,55 +252,36 @@ class InSilicoFilter(object):
                      provided by the CSQ property of a VcfRecord object.
 
         '''
+        return self._filter_values(tuple(map(csq.get, self._programs)))
+
+    def memo_info(self):
+        '''
+            Return the cache statistics (hits, misses, maxsize,
+            currsize) for memoized filter() results.
+        '''
+        return self._filter_values.cache_info()
+
+    def _filter_values(self, values):
+        '''
+            Returns False if the given prediction values, in the same
+            order as self._programs, match filters, otherwise returns
+            True. A value of None indicates that the program is absent
+            from the CSQ annotations.
+        '''
         unpredicted = 0
-        for prog in self.pred_filters:
-            try:
-                if csq[prog] != '':
-                    do_filter = True
-                    for p in csq[prog].split('&'):
-                        p = vep_internal_pred_re.sub('', p)
-                        if p in self.pred_filters[prog]: #matches, don't filter
-                            do_filter = False
-                            break
-                    if self.keep_if_any_damaging:
-                        if not do_filter: #matched
-                            return False
-                    elif do_filter:                #haven't matched - filter
-                        return True
-                else:
-                    if self.filter_unpredicted:
-                        return True
-                    unpredicted += 1
-            except KeyError:
-                raise RuntimeError(self._get_prog_missing_string(prog))
-        for prog in self.score_filters:
-            try:
-                if csq[prog] == '':
-                    if self.filter_unpredicted:
-                        return True
-                    unpredicted += 1
-                else:
-                    do_filter = True
-                    for p in csq[prog].split('&'):
-                        try:
-                            score = float(p)
-                        except ValueError:
-                            continue
-                        if prog in self.lower_more_damaging:
-                            if score <= self.score_filters[prog]: #
-                                do_filter = False
-                                break
-                        else:
-                            if score >= self.score_filters[prog]: #
-                                do_filter = False
-                                break
-                    if self.keep_if_any_damaging:
-                        if not do_filter:
-                            return False
-                    elif do_filter:
-                        return True #score not over threshold - filter
-            except KeyError:
-                raise RuntimeError(self._get_prog_missing_string(prog))
+        for i, (value, matches) in enumerate(zip(values, self._evaluators)):
+            if value is None:
+                raise RuntimeError(
+                    self._get_prog_missing_string(self._programs[i]))
+            if value == '':
+                if self.filter_unpredicted:
+                    return True
+                unpredicted += 1
+            elif self.keep_if_any_damaging:
+                if matches(value):
+                    return False
+            elif not matches(value):  # haven't matched - filter
+                return True
         if self.keep_if_any_damaging:
             #would have already returned False if anything passed filters
             if not self.filter_unpredicted and unpredicted == self._n_prog:
@@ -257,7 +291,6 @@ class InSilicoFilter(object):
             return True
         return False
 
-
     def _get_prog_missing_string(self, prog):
         return ("'{}' in silico filter program is not present in".format(prog) +
                " CSQ field of input VCF - please ensure your input was " +
@@ -0,0 +1,91 @@
+import json
+import sqlite3
+import time
+
+
+class RestCache(object):
+    '''
+        Persistent cache of web service responses (e.g. from Ensembl's
+        REST API or MyGene.info) held in an SQLite database so that
+        lookups can be reused between runs.
+
+        Responses are stored as JSON keyed by server, endpoint and
+        query, along with the time they were retrieved. Entries older
+        than the cache's time-to-live are ignored unless explicitly
+        requested (e.g. when working offline).
+    '''
+
+    __slots__ = ['filename', 'ttl', 'conn', 'hits', 'misses']
+
+    def __init__(self, filename, ttl=None):
+        '''
+            Args:
+                filename:
+                        SQLite database file. Will be created if it does
+                        not already exist.
+
+                ttl:    Number of days after which cached entries are
+                        considered stale. Default=None (entries never
+                        expire).
+        '''
+        if ttl is not None and ttl < 0:
+            raise ValueError("Cache TTL must not be negative (got " +
+                             "{})".format(ttl))
+        self.filename = filename
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(filename, timeout=30)
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS cache (
+                                 server TEXT NOT NULL,
+                                 endpoint TEXT NOT NULL,
+                                 query TEXT NOT NULL,
+                                 response TEXT NOT NULL,
+                                 retrieved REAL NOT NULL,
+                                 PRIMARY KEY (server, endpoint, query))''')
+
+    def get(self, server, endpoint, query, ignore_ttl=False):
+        '''
+            Return a tuple of a boolean indicating whether a (non-stale)
+            entry was found and the cached response (or None).
+
+            Args:
+                server: Server (or service) name.
+
+                endpoint:
+                        Endpoint retrieved from server.
+
+                query:  Query string or parameters for endpoint.
+
+                ignore_ttl:
+                        If True, return entries regardless of their age.
+        '''
+        row = self.conn.execute('''SELECT response, retrieved FROM cache
+                                   WHERE server=? AND endpoint=? AND
+                                   query=?''',
+                                (server, endpoint, query)).fetchone()
+        if row is None or (not ignore_ttl and self._is_stale(row[1])):
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, json.loads(row[0])
+
+    def set(self, server, endpoint, query, response):
+        '''
+            Store a JSON serializable response for the given server,
+            endpoint and query, replacing any existing entry.
+        '''
+        with self.conn:
+            self.conn.execute('''INSERT OR REPLACE INTO cache VALUES
+                                 (?, ?, ?, ?, ?)''',
+                              (server, endpoint, query, json.dumps(response),
+                               time.time()))
+
+    def close(self):
+        self.conn.close()
+
+    def _is_stale(self, retrieved):
+        if self.ttl is None:
+            return False
+        return time.time() - retrieved > self.ttl * 86400
@@ -1,4 +1,6 @@
+import numpy as np
 from .sv_gt_filter import SvGtFilter
+from .genotype_matrix import column, subset
 import warnings
 
 
@@ -14,7 +16,7 @@ class SampleFilter(object):
                  sv_max_control_dp=None, sv_control_het_ab=None,
                  sv_control_hom_ab=None, sv_con_ref_ab=None, del_dhffc=None,
                  dup_dhbfc=None, control_del_dhffc=None,
-                 control_dup_dhbfc=None):
+                 control_dup_dhbfc=None, controls_from_ac=False):
         '''
             Initialize filtering options.
 
@@ -173,10 +175,27 @@ class SampleFilter(object):
                         not no-calls and are above the GQ threshold set
                         by the 'gq' option. Default=False.
 
+                controls_from_ac:
+                        If True, determine the number of controls
+                        carrying an allele from the INFO 'AC' field
+                        minus the allele counts of all samples that are
+                        not controls rather than checking each control
+                        genotype. This requires that AC values are
+                        consistent with the genotypes in the VCF and
+                        can only be used if no genotype filters apply
+                        to controls and confirm_missing is False,
+                        otherwise a warning is issued and controls are
+                        checked individually. Default=False.
+
         '''
 
         self.vcf = vcf
         self.confirm_missing = confirm_missing
+        self.controls_from_ac = controls_from_ac
+        self._rows = None
+        self._ac_samples = None
+        self._control_gts = True
+        self._ac_types = set()
         self._parse_sample_args(cases=cases, controls=controls,
                                 n_cases=n_cases, n_controls=n_controls, gq=gq,
                                 het_ab=het_ab, hom_ab=hom_ab, dp=dp,
@@ -205,74 +224,138 @@ class SampleFilter(object):
             and controls.
         '''
         record = v_record.record
-        gts = record.samples
-        case_matches = 0
-        control_matches = 0
-        svtype = None
+        gm = v_record.genotypes
+        case_rows, control_rows, ac_rows = self._sample_rows(gm)
+        carriers = gm.has_allele(allele)
+        gt_filter_args = dict()
         if v_record.IS_SV:
             gt_filter = self.sv_gt_filter
             control_filter = self.sv_con_gt_filter
-            svtype = record.info['SVTYPE']
+            gt_filter_args['svtype'] = record.info['SVTYPE']
         else:
             gt_filter = self.gt_filter
             control_filter = self.con_gt_filter
         # check controls first
-        for s in self.controls:
-            gt_ok_args = [gts, s, allele]
-            if svtype:
-                gt_ok_args.append(svtype)
-            if not control_filter.gt_is_ok(*gt_ok_args):
-                if self.confirm_missing:
-                    if self.n_controls:
-                        control_matches += 1
-                    else:
-                        return True
-                continue
-            sgt = gts[s]['GT']
-            if self.confirm_missing and sgt == (None,) * len(sgt):
-                # no-call and we require confirmed gts for controls
-                if self.n_controls:
-                    control_matches += 1
-                    continue
-                else:
-                    return True
-            if allele in sgt:  # checks for presence, not whether het/hom
-                if self.n_controls:
-                    control_matches += 1
-                else:
-                    return True
-            elif control_filter.ad_over_threshold is not None:
-                # check hom ref for ALT allele counts
-                if control_filter.ad_over_threshold(record.samples, s, allele):
-                    if 'AD' not in record.format or gts[s]['AD'] != (None,):
-                        if self.n_controls:
-                            control_matches += 1
-                        else:
-                            return True
-        if self.n_controls and control_matches >= self.n_controls:
+        n_matches = None
+        if self.controls_from_ac and v_record.IS_SV in self._ac_types:
+            n_matches = self._control_carriers_from_ac(record, gm, allele,
+                                                       ac_rows)
+        if n_matches is None:
+            n_matches = self._control_matches(record, gm, allele,
+                                              control_rows, control_filter,
+                                              gt_filter_args)
+        if self._enough_control_matches(n_matches):
             return True
         # check for presence in cases
-        for s in self.cases:
-            gt_ok_args = [gts, s, allele]
-            if svtype:
-                gt_ok_args.append(svtype)
-            if not gt_filter.gt_is_ok(*gt_ok_args):
-                sgt = None
-            else:
-                sgt = gts[s]['GT']
-            if sgt is None:
-                if self.n_cases:
-                    continue
-                else:
-                    return True
-            if allele in sgt:
-                case_matches += 1
-            elif not self.n_cases:
-                return True
+        case_carrier = carriers[case_rows]
         if self.n_cases:
-            if case_matches < self.n_cases:
+            if np.count_nonzero(case_carrier) < self.n_cases:
                 return True
-        return False
+        elif not case_carrier.all():
+            return True
+        case_ok = gt_filter.gt_ok_mask(gm, allele, case_rows[case_carrier],
+                                       **gt_filter_args)
+        if self.n_cases:
+            return np.count_nonzero(case_ok) < self.n_cases
+        return not case_ok.all()
+
+    def _control_matches(self, record, gm, allele, control_rows,
+                         control_filter, gt_filter_args):
+        '''
+            Return the number of controls that count towards filtering
+            an allele. Genotype quality is only checked for samples
+            where the result depends on it.
+        '''
+        control_carrier = gm.has_allele(allele)[control_rows]
+        check_ref_ab = control_filter.ad_over_threshold_mask is not None
+        if self.confirm_missing:
+            # carriers and no-calls are matches regardless of quality
+            matched = control_carrier | gm.no_calls()[control_rows]
+            n_matches = np.count_nonzero(matched)
+            if self._enough_control_matches(n_matches):
+                return n_matches
+            # other genotypes are matches if they fail quality checks
+            unmatched = control_rows[~matched]
+            ok = control_filter.gt_ok_mask(gm, allele, unmatched,
+                                           **gt_filter_args)
+            n_matches += len(ok) - np.count_nonzero(ok)
+            if check_ref_ab:
+                n_matches += np.count_nonzero(self._ref_ab_matches(
+                    control_filter, gm, allele, unmatched[ok], record))
+        else:
+            # carriers are matches if they pass quality checks
+            n_matches = np.count_nonzero(control_filter.gt_ok_mask(
+                gm, allele, control_rows[control_carrier], **gt_filter_args))
+            if check_ref_ab and not self._enough_control_matches(n_matches):
+                # check hom ref for ALT allele counts
+                non_carriers = control_rows[~control_carrier]
+                over = non_carriers[self._ref_ab_matches(
+                    control_filter, gm, allele, non_carriers, record)]
+                n_matches += np.count_nonzero(control_filter.gt_ok_mask(
+                    gm, allele, over, **gt_filter_args))
+        return n_matches
+
+    def _control_carriers_from_ac(self, record, gm, allele, ac_rows):
+        '''
+            Derive the number of control alleles from the INFO AC field
+            minus the allele counts of all samples that are not
+            controls. As the number of control carriers is between 1
+            and the number of control alleles (if greater than 0), this
+            is returned where it gives the same result as counting
+            carriers, otherwise None is returned.
+        '''
+        ac = record.info.get('AC', (None,))
+        if allele > len(ac) or ac[allele - 1] is None:
+            raise RuntimeError("Missing AC value for {}:{}".format(
+                record.chrom, record.pos) + " - AC values are required " +
+                "when determining control allele counts from AC.")
+        con_ac = ac[allele - 1] - int(gm.allele_counts(allele)[ac_rows].sum())
+        if con_ac < 0:
+            raise RuntimeError("AC value for {}:{} ".format(record.chrom,
+                                                            record.pos) +
+                               "is lower than the allele count of samples " +
+                               "in the VCF. AC values must be consistent " +
+                               "with genotypes when determining control " +
+                               "allele counts from AC.")
+        if (con_ac == 0 or not self.n_controls or self.n_controls == 1 or
+                con_ac < self.n_controls):
+            return con_ac
+        return None
+
+    def _enough_control_matches(self, n_matches):
+        if self.n_controls:
+            return n_matches >= self.n_controls
+        return n_matches > 0
+
+    def _ref_ab_matches(self, control_filter, gm, allele, rows, record):
+        '''
+            Return boolean array indicating which of the given rows have
+            ALT allele reads over the control reference AB threshold.
+        '''
+        over = control_filter.ad_over_threshold_mask(gm, allele, rows)
+        if 'AD' in record.format:
+            over &= ~gm.missing['AD'][rows]
+        return over
+
+    def _sample_rows(self, gm):
+        '''
+            Return arrays of case, control and (if using AC to count
+            control alleles) non-control rows in a GenotypeMatrix.
+            Rows are cached for as long as the GenotypeMatrix layout is
+            unchanged.
+        '''
+        if self._rows is None or self._rows[0] is not gm.index:
+            if self._control_gts:
+                control_rows = gm.rows(self.controls)
+            else:
+                control_rows = None
+            if self._ac_samples is not None:
+                ac_rows = gm.rows(self._ac_samples)
+            else:
+                ac_rows = None
+            self._rows = (gm.index, gm.rows(self.cases), control_rows,
+                          ac_rows)
+        return self._rows[1:]
 
     def _parse_sample_args(self, cases, controls, n_cases=0, n_controls=0,
                            gq=0, dp=0, max_dp=0, het_ab=0., hom_ab=0.,
@@ -396,6 +479,57 @@ class SampleFilter(object):
             self.n_cases = n_cases
         if n_controls:
             self.n_controls = n_controls
+        gt_fields = self.gt_fields | self.sv_gt_fields
+        if con_ref_ab or sv_con_ref_ab:
+            if 'AD' in self.vcf.header.formats:
+                gt_fields.add('AD')
+        if self.controls_from_ac and self._can_use_ac():
+            # only samples that are not controls are needed to derive
+            # control allele counts, but controls are still required if
+            # AC alone can not tell us whether n_controls is reached
+            self._ac_samples = [x for x in self.vcf.header.samples if x not
+                                in control_set]
+            self._control_gts = bool(self.n_controls and self.n_controls > 1
+                                     or len(self._ac_types) < 2)
+            samples = self.cases + self._ac_samples
+            if self._control_gts:
+                samples += self.controls
+            self.vcf.require_genotypes(samples, gt_fields)
+        else:
+            self.controls_from_ac = False
+            self.vcf.require_genotypes(self.samples, gt_fields)
+
+    def _can_use_ac(self):
+        '''
+            Check whether control allele counts can be derived from AC
+            and set self._ac_types to indicate whether this can be done
+            for short variants (False) and/or structural variants (True).
+        '''
+        self._ac_types = set()
+        if self.con_gt_filter.fields == ['GT']:
+            self._ac_types.add(False)
+        if (self.sv_con_gt_filter.fields == ['GT'] or
+                'SVTYPE' not in self.vcf.header.info):
+            self._ac_types.add(True)
+        reason = None
+        if self.confirm_missing:
+            reason = "confirm_missing is set"
+        elif not self._ac_types:
+            reason = "genotype filters are set for controls"
+        elif 'AC' not in self.vcf.header.info:
+            reason = "no AC INFO field is defined in the VCF header"
+        elif self.vcf.header.info['AC'].number != 'A':
+            reason = "AC INFO field does not have 'Number=A'"
+        if reason is not None:
+            warnings.warn("Control genotypes will be checked individually " +
+                          "rather than using AC values because " + reason)
+            return False
+        if len(self._ac_types) < 2:
+            warnings.warn("Control genotypes will be checked individually " +
+                          "for {} because genotype filters are set for "
+                          .format("short variants" if True in self._ac_types
+                                  else "structural variants") + "controls")
+        return True
 
 
 class GtFilter(object):
@@ -407,7 +541,8 @@ class GtFilter(object):
     '''
 
     __slots__ = ['gq', 'dp', 'max_dp', 'het_ab', 'hom_ab', 'gt_is_ok',
-                 'ab_filter', 'ref_ab_filter', 'ad_over_threshold', 'fields']
+                 'ab_filter', 'ref_ab_filter', 'ad_over_threshold', 'fields',
+                 'ab_mask', 'ad_over_threshold_mask']
 
     def __init__(self, vcf, gq=0, dp=0, max_dp=0, het_ab=0., hom_ab=0.,
                  ref_ab_filter=None):
@@ -454,7 +589,9 @@ class GtFilter(object):
         self.ref_ab_filter = ref_ab_filter
         self.fields = ['GT']
         self.ab_filter = None
+        self.ab_mask = None
         self.ad_over_threshold = None
+        self.ad_over_threshold_mask = None
         ab_field = None
         if not gq and not dp and not max_dp and not het_ab and not hom_ab:
             # if no parameters are set then every genotype passes
@@ -464,16 +601,112 @@ class GtFilter(object):
             if het_ab or hom_ab:
                 if ab_field == 'AD':
                     self.ab_filter = self._ab_filter_ad
+                    self.ab_mask = self._ab_mask_ad
                 elif ab_field == 'RO':
                     self.ab_filter = self._ab_filter_ro
+                    self.ab_mask = self._ab_mask_ro
             self.gt_is_ok = self._gt_is_ok
         if ref_ab_filter:
             if ab_field is None:
                 ab_field = self._check_header_fields(vcf)
             if ab_field == 'AD':
                 self.ad_over_threshold = self._alt_ad_over_threshold
+                self.ad_over_threshold_mask = self._alt_ad_over_threshold_mask
             elif ab_field == 'RO':
                 self.ad_over_threshold = self._alt_ao_over_threshold
+                self.ad_over_threshold_mask = self._alt_ao_over_threshold_mask
+
+    def gt_ok_mask(self, gm, allele, rows=None):
+        '''
+            Array equivalent of gt_is_ok. Returns a boolean array
+            indicating whether each sample's genotype passes all
+            parameters set on initialisation.
+
+            Args:
+                gm:     GenotypeMatrix for a record.
+
+                allele: ALT allele index.
+
+                rows:   Optional array of rows in gm to check. By
+                        default all samples in gm are checked.
+        '''
+        n = len(gm) if rows is None else len(rows)
+        ok = np.ones(n, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self.dp or self.max_dp:
+                dp = gm.field('DP', rows)
+                if self.dp:
+                    ok &= ~(dp < self.dp)
+                if self.max_dp:
+                    ok &= ~(dp > self.max_dp)
+            if self.gq:  # if GQ is None do not filter(?)
+                ok &= ~(gm.field('GQ', rows) < self.gq)
+        if self.ab_mask is not None:
+            ok &= self.ab_mask(gm, allele, rows)
+        return ok
+
+    def _alt_ad_over_threshold_mask(self, gm, allele, rows=None):
+        ''' Array equivalent of _alt_ad_over_threshold. '''
+        ad = gm.field('AD', rows)
+        al_dp = column(ad, allele)
+        dp = np.nansum(ad, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            over = (dp > 0) & ~np.isnan(al_dp) & (al_dp / dp >
+                                                  self.ref_ab_filter)
+        # no AD values - assume OK?
+        return over | subset(gm.missing['AD'], rows)
+
+    def _alt_ao_over_threshold_mask(self, gm, allele, rows=None):
+        ''' Array equivalent of _alt_ao_over_threshold. '''
+        aos = gm.field('AO', rows)
+        ro = gm.field('RO', rows)
+        dp = np.nansum(aos, axis=1) + ro
+        ao = column(aos, allele - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (~subset(gm.missing['AO'], rows) & (dp > 0) &
+                    (ao / ro > self.ref_ab_filter))
+
+    def _hom_het_masks(self, gm, allele, rows):
+        has_allele = subset(gm.has_allele(allele), rows)
+        is_hom = subset(gm.n_distinct(), rows) == 1
+        return has_allele & is_hom, has_allele & ~is_hom
+
+    def _ab_mask_ad(self, gm, allele, rows=None):
+        ''' Array equivalent of _ab_filter_ad. '''
+        ad = gm.field('AD', rows)
+        al_dp = column(ad, allele)
+        dp = np.nansum(ad, axis=1)
+        is_hom_alt, is_het_alt = self._hom_het_masks(gm, allele, rows)
+        check = (~subset(gm.missing['AD'], rows) & ~np.isnan(al_dp) &
+                 (dp > 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ab = al_dp / dp
+        fail = np.zeros(len(ab), dtype=bool)
+        if self.het_ab:
+            fail |= check & is_het_alt & (ab < self.het_ab)
+        if self.hom_ab:
+            fail |= check & is_hom_alt & (ab < self.hom_ab)
+        return ~fail
+
+    def _ab_mask_ro(self, gm, allele, rows=None):
+        ''' Array equivalent of _ab_filter_ro. '''
+        aos = gm.field('AO', rows)
+        ro = gm.field('RO', rows)
+        dp = np.nansum(aos, axis=1) + ro
+        if allele > 0:
+            ao = column(aos, allele - 1)
+        else:
+            ao = ro
+        is_hom_alt, is_het_alt = self._hom_het_masks(gm, allele, rows)
+        check = ~subset(gm.missing['AO'], rows) & ~np.isnan(ro) & (dp > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ab = ao / dp
+        fail = np.zeros(len(ab), dtype=bool)
+        if self.het_ab is not None:
+            fail |= check & is_het_alt & (ab < self.het_ab)
+        if self.hom_ab is not None:
+            fail |= check & is_hom_alt & (ab < self.hom_ab)
+        return ~fail
 
     def _alt_ad_over_threshold(self, gts, sample, allele):
         ad = gts[sample].get('AD', (None,))
@@ -589,3 +822,4 @@ class GtFilter(object):
                               "FORMAT fields are defined in your VCF " +
                               "header.")
         return None
+
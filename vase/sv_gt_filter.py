@@ -1,3 +1,7 @@
+import numpy as np
+from .genotype_matrix import column, subset
+
+
 class SvGtFilter(object):
     '''
         Given sample calls from a VariantRecord, this class provides a
@@ -7,7 +11,8 @@ class SvGtFilter(object):
 
     __slots__ = ['gq', 'dp', 'max_dp', 'het_ab', 'hom_ab', 'gt_is_ok',
                  'ab_filter', 'ref_ab_filter', 'ad_over_threshold', 'fields',
-                 'enough_support', 'del_dhffc', 'dup_dhbfc', 'duphold_filter']
+                 'enough_support', 'del_dhffc', 'dup_dhbfc', 'duphold_filter',
+                 'ad_over_threshold_mask']
 
     def __init__(self, vcf, gq=0, dp=0, max_dp=0, het_ab=0., hom_ab=0.,
                  ref_ab_filter=None, del_dhffc=None, dup_dhbfc=None):
@@ -73,6 +78,7 @@ class SvGtFilter(object):
         self.fields = ['GT']
         self.ab_filter = None
         self.ad_over_threshold = None
+        self.ad_over_threshold_mask = None
         self.enough_support = None
         self.duphold_filter = None
         ab_fields = None
@@ -94,6 +100,103 @@ class SvGtFilter(object):
             if ab_fields == ('PR', 'SR'):
                 #only option now, but may support other annotations in future
                 self.ad_over_threshold = self._alt_prsr_over_threshold
+                self.ad_over_threshold_mask = \
+                    self._alt_prsr_over_threshold_mask
+
+    def gt_ok_mask(self, gm, allele, rows=None, svtype=None):
+        '''
+            Array equivalent of gt_is_ok. Returns a boolean array
+            indicating whether each sample's genotype passes all
+            parameters set on initialisation.
+
+            Args:
+                gm:     GenotypeMatrix for a record.
+
+                allele: ALT allele index.
+
+                rows:   Optional array of rows in gm to check. By
+                        default all samples in gm are checked.
+
+                svtype: SVTYPE of the record (used for duphold
+                        filters).
+        '''
+        n = len(gm) if rows is None else len(rows)
+        ok = np.ones(n, dtype=bool)
+        if not any([self.gq, self.dp, self.het_ab, self.hom_ab,
+                    self.del_dhffc, self.dup_dhbfc]):
+            return ok
+        support = None
+        if self.dp or self.max_dp:
+            support = self._pr_sr_matrix(gm, rows)
+            dp = np.nansum(support, axis=1)
+            if self.dp:
+                ok &= dp >= self.dp
+            if self.max_dp:
+                ok &= dp <= self.max_dp
+        if self.gq:
+            # if GQ is None presumably is a no call
+            ok &= gm.field('GQ', rows) >= self.gq
+        if self.ab_filter is not None or self.duphold_filter is not None:
+            has_allele = subset(gm.has_allele(allele), rows)
+            is_hom = subset(gm.n_distinct(), rows) == 1
+            is_hom_alt = has_allele & is_hom
+            is_het_alt = has_allele & ~is_hom
+        if self.ab_filter is not None:
+            if support is None:
+                support = self._pr_sr_matrix(gm, rows)
+            al_dp = column(support, allele)
+            dp = np.nansum(support, axis=1)
+            check = ~np.isnan(al_dp) & (dp > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ab = al_dp / dp
+            if self.het_ab is not None:
+                ok &= ~(check & is_het_alt & (ab < self.het_ab))
+            if self.hom_ab is not None:
+                ok &= ~(check & is_hom_alt & (ab < self.hom_ab))
+        if self.duphold_filter is not None:
+            if svtype == 'DUP' and self.dup_dhbfc:
+                fc = gm.field('DHBFC', rows)
+                ok &= ~has_allele | np.isnan(fc) | (fc > self.dup_dhbfc)
+            if svtype == 'DEL' and self.del_dhffc:
+                fc = gm.field('DHFFC', rows)
+                ok &= ~has_allele | np.isnan(fc) | (fc < self.del_dhffc)
+        return ok
+
+    def _alt_prsr_over_threshold_mask(self, gm, allele, rows=None):
+        ''' Array equivalent of _alt_prsr_over_threshold. '''
+        support = self._pr_sr_matrix(gm, rows)
+        al_dp = column(support, allele)
+        dp = np.nansum(support, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (dp > 0) & ~np.isnan(al_dp) & (al_dp / dp >
+                                                  self.ref_ab_filter)
+
+    def _pr_sr_matrix(self, gm, rows=None):
+        '''
+            Array equivalent of _get_pr_sr. Returns a 2D array of SR + PR
+            counts with NaN for values beyond the length of each
+            sample's SR + PR tuple.
+        '''
+        arrs = []
+        lengths = []
+        for f in ('SR', 'PR'):
+            arr = gm.field(f, rows)
+            if arr.shape[1] < 2:
+                arr = np.pad(arr, ((0, 0), (0, 2 - arr.shape[1])),
+                             constant_values=np.nan)
+            else:
+                arr = arr.copy()
+            lens = subset(gm.lengths[f], rows).copy()
+            missing = subset(gm.missing[f], rows)
+            arr[missing] = np.nan
+            arr[missing, :2] = 0
+            lens[missing] = 2
+            arrs.append(arr)
+            lengths.append(lens)
+        width = min(a.shape[1] for a in arrs)
+        support = arrs[0][:, :width] + arrs[1][:, :width]
+        support[np.arange(width) >= np.minimum(*lengths)[:, None]] = np.nan
+        return support
 
     def _duphold_filter(self, gts, sample, allele, svtype):
         is_hom_alt = False
@@ -70,3 +70,28 @@ def reg2bins(begin, end, min_shift=14, depth=5):
             n += 1
         t += 1 << ((l << 1) + l)
         s -= 3
+
+
+_csq_bits = dict()
+
+
+def csq_bit(term):
+    '''
+        Return the bit interned for a single VEP consequence term.
+        Bits are assigned on first sight so that sets of consequence
+        terms can be compared with a single bitwise AND.
+    '''
+    try:
+        return _csq_bits[term]
+    except KeyError:
+        bit = 1 << len(_csq_bits)
+        _csq_bits[term] = bit
+        return bit
+
+
+def csq_mask(terms):
+    '''Return the combined bitmask for an iterable of consequence terms.'''
+    mask = 0
+    for t in terms:
+        mask |= csq_bit(t)
+    return mask
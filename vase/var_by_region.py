@@ -1,5 +1,8 @@
 from .bed_parser import BedParser
-from collections import defaultdict
+from bisect import bisect_left
+from collections import defaultdict, deque
+from itertools import compress, islice
+import numpy as np
 import re
 
 ENSG = re.compile(r'''^ENS\w*G\d{11}(\.\d+)?''')
@@ -7,72 +10,80 @@ ENST = re.compile(r'''^ENS\w*T\d{11}(\.\d+)?''')
 ENSP = re.compile(r'''^ENS\w*P\d{11}(\.\d+)?''')
 ENSR = re.compile(r'''^ENS\w*R\d{11}(\.\d+)?''')
 
+# approximate cost, in compressed bytes, of seeking to a new region (i.e.
+# the maximum size of a BGZF block that must be read after each seek)
+SEEK_BYTES = 65536
+
 
 class RegionFinder(object):
     '''
-        From an IntervalIter object create an index of regions per window
+        From an IntervalIter object create a per-contig index of regions
         and provide methods to retrieve regions from contig, start and
         end coordinates.
-    '''
 
-    __slots__ = ['regions', 'window_size']
+        For each contig, interval starts and ends are held in numpy
+        arrays sorted by start, along with the running maximum of
+        interval ends. Overlapping intervals are found by binary search
+        of the start array for intervals starting before the query end
+        and of the max-end array for the first interval that could
+        reach the query start, so that each interval is only stored
+        once regardless of its length.
+    '''
 
-    def __init__(self, interval_iter, window_size=100000):
-        self.regions = defaultdict(dict)
-        self.window_size = window_size
-        for gi in interval_iter:#these should already be coordinate sorted
-            r_start = int(gi.start/window_size) * window_size
-            r_end = int(gi.end/window_size) * window_size
-            for i in range(r_start, r_end + window_size, window_size):
-                if i not in self.regions[gi.contig]:
-                    self.regions[gi.contig][i] = list()
-                self.regions[gi.contig][i].append(gi)
+    __slots__ = ['intervals', 'starts', 'ends', 'max_ends']
+
+    def __init__(self, interval_iter):
+        self.intervals = dict()
+        self.starts = dict()
+        self.ends = dict()
+        self.max_ends = dict()
+        per_contig = defaultdict(list)
+        for gi in interval_iter:
+            per_contig[gi.contig].append(gi)
+        for contig, intervals in per_contig.items():
+            intervals.sort(key=lambda x: (x.start, x.end))
+            self.intervals[contig] = intervals
+            self.starts[contig] = np.fromiter((x.start for x in intervals),
+                                              dtype=np.int64,
+                                              count=len(intervals))
+            self.ends[contig] = np.fromiter((x.end for x in intervals),
+                                            dtype=np.int64,
+                                            count=len(intervals))
+            self.max_ends[contig] = np.maximum.accumulate(self.ends[contig])
 
     def fetch(self, contig, start, end):
-        if contig not in self.regions:
+        '''
+            Return a list of intervals overlapping start and end in
+            order of start coordinate. Start should be 1-based and end
+            inclusive (e.g. the 'pos' and 'stop' properties of a
+            VaseRecord).
+        '''
+        if contig not in self.intervals:
+            return []
+        lo = np.searchsorted(self.max_ends[contig], start, side='left')
+        hi = np.searchsorted(self.starts[contig], end, side='left')
+        if lo >= hi:
             return []
-        idx_start = int(start/self.window_size) * self.window_size
-        idx_end = int(end/self.window_size) * self.window_size
-        candidates = []
-        for i in range(idx_start, idx_end + 1, self.window_size):
-            if i in self.regions[contig]:
-                candidates.extend(self.regions[contig][i])
-        return self._binsearch_regions(candidates, start, end)
-
-    def _binsearch_regions(self, regions, start, end):
+        hits = np.flatnonzero(self.ends[contig][lo:hi] >= start) + lo
+        intervals = self.intervals[contig]
+        return [intervals[i] for i in hits.tolist()]
+
+    def overlaps(self, contig, starts, ends):
         '''
-            Assumes all regions are on the same chromosome. Return all
-            overlapping regions.
+            Batched query for a block of records on the same contig.
+            Returns a boolean array indicating whether each pair of
+            coordinates in starts and ends (arrays of 1-based starts and
+            inclusive ends) overlaps any interval.
         '''
-        l = 0
-        u = len(regions) - 1
-        i = self._binsearch(regions, l, u, start, end)
-        hits = []
-        if i > -1:
-            for j in range(i-1, -1, -1):
-                if start <= regions[j].end and end > regions[j].start:
-                    hits.append(regions[j])
-                elif regions[j].end < start:
-                    break
-            hits.reverse()
-            for j in range(i, len(regions)):
-                if start <= regions[j].end and end > regions[j].start:
-                    hits.append(regions[j])
-                elif regions[j].start > end:
-                    break
-        return hits
-
-    def _binsearch(self, regions, l, u, start, end):
-        ''' Find any region overlapping start and end coordinates.'''
-        if u < l:
-            return -1
-        i = int(l + u)//2
-        if regions[i].end < start:
-            return self._binsearch(regions, i + 1, u, start, end)
-        elif regions[i].start > end:
-            return self._binsearch(regions, l, i - 1, start, end)
-        else:
-            return i
+        if contig not in self.intervals:
+            return np.zeros(len(starts), dtype=bool)
+        hi = np.searchsorted(self.starts[contig], ends, side='left')
+        # the furthest reaching interval starting before each query end
+        # must reach the query start for there to be any overlap
+        reach = np.full(len(starts), -1, dtype=np.int64)
+        has_prev = hi > 0
+        reach[has_prev] = self.max_ends[contig][hi[has_prev] - 1]
+        return reach >= starts
 
 
 class VarByRegion(object):
@@ -82,10 +93,12 @@ class VarByRegion(object):
 
     '''
     __slots__ = ['vcfreader', 'region_iter', 'current_region', 'exclude',
-                 'current_targets', 'gene_targets', 'region_finder']
+                 'current_targets', 'gene_targets', 'region_finder',
+                 'block_size', '_buffer', '_planned']
 
     def __init__(self, vcfreader, bed=None, region_iter=None,
-                 gene_targets=False, stream=False, exclude=False):
+                 gene_targets=False, stream=False, exclude=False,
+                 block_size=1000):
         '''
             Args:
                 vcfreader:
@@ -119,6 +132,11 @@ class VarByRegion(object):
                     will be returned instead. This forces streaming of
                     variants.
 
+                block_size:
+                    When streaming, read this many variants at a time
+                    and check them for overlap with regions in a single
+                    batched query. Default=1000.
+
         '''
         self.gene_targets = gene_targets
         if region_iter:
@@ -134,9 +152,15 @@ class VarByRegion(object):
         self.vcfreader = vcfreader
         self.exclude = exclude
         self.current_region = None
-        self.current_targets = defaultdict(list)  # keys are VEP columns,
-                                                  # values are lists of IDs
+        self.current_targets = dict()  # keys are VEP columns,
+                                       # values are frozensets of IDs
         self.region_finder = None
+        self.block_size = block_size
+        self._buffer = deque()
+        self._planned = None
+        if self.gene_targets:
+            for interval in self.region_iter.intervals:
+                self._classify_targets(interval)
         if self.exclude:
             stream = True
         if stream:
@@ -163,85 +187,162 @@ class VarByRegion(object):
         self.vcfreader.variant_file.close()
 
     def _next_from_region_iterator(self):
-        if self.current_region is None:
-            self._next_interval()
-            self.vcfreader.set_region(self.current_region.contig,
-                                      self.current_region.start,
-                                      self.current_region.end)
-        record = self._get_record_if_no_overlap()
-        while record is None:
-            self._next_interval()
-            self.vcfreader.set_region(self.current_region.contig,
-                                      self.current_region.start,
-                                      self.current_region.end)
-            record = self._get_record_if_no_overlap()
-        return record
+        if self._planned is None:
+            self._planned = self._records_from_plan()
+        return next(self._planned)
+
+    def _records_from_plan(self):
+        '''
+            Yield records overlapping intervals in region_iter, setting
+            current_region (and current_targets) as each new interval is
+            reached. Records are retrieved using the fetches planned by
+            _plan_fetches for each contig.
+        '''
+        intervals = self.region_iter.intervals
+        ends = [x.end for x in intervals]
+        i = 0
+        while i < len(intervals):
+            contig = intervals[i].contig
+            j = i + 1
+            while j < len(intervals) and intervals[j].contig == contig:
+                j += 1
+            prev_end = -1
+            for start, end, first, last in self._plan_fetches(i, j):
+                self.vcfreader.set_region(contig, start, end)
+                for record in self.vcfreader:
+                    if record.pos <= prev_end:
+                        # already returned by previous fetch
+                        continue
+                    k = bisect_left(ends, record.pos, first, last)
+                    if k == last or record.stop <= intervals[k].start:
+                        continue  # in gap between coalesced intervals
+                    if self.current_region is not intervals[k]:
+                        self.region_iter.current_index = k
+                        self.current_region = intervals[k]
+                        if self.gene_targets:
+                            self._targets_from_region()
+                    yield record
+                prev_end = intervals[last - 1].end
+            i = j
+
+    def _plan_fetches(self, i, j):
+        '''
+            Plan the retrieval of records overlapping region_iter
+            intervals i to j (exclusive), which must all be on the same
+            contig.
+
+            Intervals for which the input's index contains no records are
+            skipped. The index's linear offsets are used to estimate the
+            compressed bytes to be read for each remaining interval and
+            neighbouring intervals are coalesced into a single fetch if
+            their byte ranges overlap or if the bytes between them are
+            cheaper to read than performing another seek (SEEK_BYTES).
+            Sparse intervals are therefore retrieved by index-jumping
+            while dense intervals are streamed.
+
+            If the index can not be read, each interval is fetched
+            separately.
+
+            Returns a list of (start, end, first, last) tuples giving the
+            coordinates to fetch and the range of intervals covered.
+        '''
+        intervals = self.region_iter.intervals
+        try:
+            summary = self.vcfreader.index_summary(intervals[i].contig)
+        except (OSError, ValueError):
+            return [(intervals[k].start, intervals[k].end, k, k + 1) for k
+                    in range(i, j)]
+        if summary is None:
+            return []
+        starts = np.fromiter((x.start for x in intervals[i:j]),
+                             dtype=np.int64, count=j - i)
+        ends = np.fromiter((x.end for x in intervals[i:j]), dtype=np.int64,
+                           count=j - i)
+        keep = np.flatnonzero(summary.has_records(starts, ends))
+        if not len(keep):
+            return []
+        begins, stops = summary.byte_ranges(starts[keep], ends[keep])
+        gaps = begins[1:] - np.maximum.accumulate(stops)[:-1]
+        firsts = np.append(0, np.flatnonzero(gaps > SEEK_BYTES) + 1)
+        lasts = np.append(firsts[1:], len(keep)) - 1
+        fetches = []
+        for f, l in zip(keep[firsts] + i, keep[lasts] + i):
+            fetches.append((intervals[f].start, intervals[l].end, f, l + 1))
+        return fetches
 
     def _next_from_region_finder(self):
-        for record in self.vcfreader:
+        while not self._buffer:
+            if not self._read_block():
+                raise StopIteration
+        record = self._buffer.popleft()
+        if not self.exclude:
             regions = self.region_finder.fetch(record.chrom, record.pos,
                                                record.stop)
-            if not regions and not self.exclude:
-                continue
-            elif regions and self.exclude:
-                continue
-            if regions:  # i.e. not using exclude option
-                self.current_region = regions[0]
-                if self.gene_targets:
-                    self.current_targets.clear()
-                    for reg in [x for r in regions for x in r.regions]:
-                        self._append_targets_from_region(reg)
-            return record
-        raise StopIteration
-
-    def _get_record_if_no_overlap(self):
-        '''
-            Ensure we don't return the same record twice by getting the
-            next record if the current record overlaps the previous
-            interval.
-        '''
-        record = next(self.vcfreader, None)
-        if record is None:
-            return None
-        if self.region_iter.previous_interval is not None:
-            while (self._record_overlaps(record,
-                                         self.region_iter.previous_interval)):
-                record = next(self.vcfreader, None)
-                if record is None:
-                    break
+            self.current_region = regions[0]
+            if self.gene_targets:
+                if len(regions) == 1:
+                    self.current_targets = regions[0].targets
+                else:
+                    self.current_targets = defaultdict(frozenset)
+                    for r in regions:
+                        for k, v in r.targets.items():
+                            self.current_targets[k] |= v
         return record
 
-    def _record_overlaps(self, record, interval):
-        ''' Return True if record overlaps interval.'''
-        return (record.chrom == interval.contig and record.pos <= interval.end
-                and record.stop > interval.start)
-
-    def _next_interval(self):
+    def _read_block(self):
         '''
-            Retrieve next GenomicInterval and if using gene_targets set
-            current_targets.
+            Read the next block of records from vcfreader and add those
+            to be returned (i.e. those overlapping regions or, if using
+            the exclude option, those not overlapping regions) to the
+            buffer. Returns False if there are no more records.
         '''
-        self.current_region = next(self.region_iter)
-        if self.gene_targets:
-            self._targets_from_region()
+        records = list(islice(self.vcfreader, self.block_size))
+        if not records:
+            return False
+        starts = np.fromiter((r.pos for r in records), dtype=np.int64,
+                             count=len(records))
+        ends = np.fromiter((r.stop for r in records), dtype=np.int64,
+                           count=len(records))
+        contig_idx = defaultdict(list)
+        for i, r in enumerate(records):
+            contig_idx[r.chrom].append(i)
+        hits = np.zeros(len(records), dtype=bool)
+        for contig, idx in contig_idx.items():
+            hits[idx] = self.region_finder.overlaps(contig, starts[idx],
+                                                    ends[idx])
+        if self.exclude:
+            hits = ~hits
+        self._buffer.extend(compress(records, hits.tolist()))
+        return True
 
     def _targets_from_region(self):
         ''' Retrieve feature names from GenomicInterval.'''
-        self.current_targets.clear()
-        for reg in self.current_region.regions:
-            self._append_targets_from_region(reg)
+        self.current_targets = self.current_region.targets
 
-    def _append_targets_from_region(self, region):
+    def _classify_targets(self, interval):
+        '''
+            Sort the feature names in the fourth column of each region of
+            a GenomicInterval by the VEP column they should be matched
+            against and cache the result as a dict of column names to
+            frozensets of IDs in the interval's 'targets' property.
+        '''
+        if interval.targets is not None:
+            return interval.targets
+        targets = defaultdict(set)
+        for region in interval.regions:
             for x in region[3].split('/'):
                 if ENST.match(x) or ENSR.match(x):
-                    i,c = x,'Feature'
+                    c = 'Feature'
                 elif ENSG.match(x):
-                    i,c= x,'Gene'
+                    c = 'Gene'
                 elif ENSP.match(x):
-                    i,c = x,'ENSP'
+                    c = 'ENSP'
                 else:
-                    i,c = x,'SYMBOL'
-                self.current_targets[c].append(i)
+                    c = 'SYMBOL'
+                targets[c].add(x)
+        interval.targets = dict((k, frozenset(v)) for k, v in
+                                targets.items())
+        return interval.targets
 
     def target_in_csq(self, csq):
         '''
@@ -253,7 +354,7 @@ class VarByRegion(object):
                         single item from VcfRecord.CSQ attribute)
 
         '''
-        for k,v in self.current_targets.items():
+        for k, v in self.current_targets.items():
             if csq[k] in v:
                 return True
         return False
@@ -9,9 +9,10 @@ import json
 from collections import OrderedDict, defaultdict
 from .ped_file import PedFile, Individual, PedError
 from .vcf_reader import VcfReader
-from .ensembl_rest_queries import EnsemblRestQueries
+from .ensembl_rest_queries import EnsemblRestQueries, OfflineLookupError
+from .rest_cache import RestCache
 from .utils import csv_to_dict
-from .g2p import G2P, allelic_req_to_label
+from .g2p import G2P
 
 ENST = re.compile(r'''^ENS\w*T\d{11}(\.\d+)?''')
 ENTREZ_RE = re.compile(r'''(\d+)(\|(\d+))*''')
@@ -44,7 +45,8 @@ class VaseReporter(object):
                  info_fields=[], gnomad_constraint=None,
                  choose_transcript=False, prog_interval=None, timeout=2.0,
                  max_retries=2, quiet=False, debug=False, force=False,
-                 hide_empty=False, custom_feat_annots=None):
+                 hide_empty=False, custom_feat_annots=None, cache=None,
+                 cache_ttl=None, offline=False):
         self._set_logger(quiet, debug)
         self.output_type = output_type.lower()
         if self.output_type not in SUPPORTED_OUTPUT:
@@ -110,11 +112,20 @@ class VaseReporter(object):
             else:
                 self._fam_order.append(f)
         self.families = set(self._fam_order)
+        self.lookup_cache = None
+        self.offline = offline
+        if cache:
+            self.lookup_cache = RestCache(cache, ttl=cache_ttl)
+        elif offline:
+            raise RuntimeError("--offline option requires a cache file to " +
+                               "be supplied with the --cache argument")
         if self.rest_lookups:
             self.ensembl_rest = EnsemblRestQueries(use_grch37_server=grch37,
                                                    timeout=timeout,
                                                    max_retries=max_retries,
-                                                   log_level=self.logger.level)
+                                                   log_level=self.logger.level,
+                                                   cache=self.lookup_cache,
+                                                   offline=offline)
         self.rest_cache = dict()
         self.mygene_cache = dict()
         self.mygene_lookups = False
@@ -156,6 +167,12 @@ class VaseReporter(object):
         elif self.output_type == 'json':
             json.dump(self.json_dict, self.out_fh, indent=2,)
         self.out_fh.close()
+        if self.lookup_cache is not None:
+            self.logger.info("{:,} lookups retrieved from cache, {:,} not "
+                             .format(self.lookup_cache.hits,
+                                     self.lookup_cache.misses) +
+                             "found in cache.")
+            self.lookup_cache.close()
 
     def _intialize_workbook(self):
         self.bold = self.out_fh.add_format({'bold': True})
@@ -434,6 +451,8 @@ class VaseReporter(object):
             if go_data:
                 go = str.join("|", (x['description'] for x in go_data if
                                     x['description'] is not None))
+        except OfflineLookupError as err:
+            self.logger.debug(err)
         except Exception as err:
             self.logger.warn(err)
             self.logger.warn("GO lookup for {} failed".format(csq['Feature']))
@@ -449,6 +468,8 @@ class VaseReporter(object):
                                           if x['dbname'] == 'Reactome_gene'))
                 mim = str.join("|", (x['description'] for x in xref_data
                                      if x['dbname'] == 'MIM_MORBID'))
+            except OfflineLookupError as err:
+                self.logger.debug(err)
             except Exception as err:
                 self.logger.warn(err)
                 self.logger.warn("XREF lookups for {} failed".format(
@@ -461,6 +482,8 @@ class VaseReporter(object):
                 orth = self.ensembl_rest.lookup_ortholog(csq['Gene'])
                 if orth is not None:
                     traits = str.join("|", self.ensembl_rest.get_traits(orth))
+            except OfflineLookupError as err:
+                self.logger.debug(err)
             except Exception as err:
                 self.logger.warn(err)
                 self.logger.warn("Orthology lookup for {} failed".format(
@@ -472,14 +495,21 @@ class VaseReporter(object):
         if csq['Gene']:
             if csq['Gene'] in self.mygene_cache:
                 return self.mygene_cache[csq['Gene']]
-            results = self.mg.query(csq['Gene'],
-                                    scopes='ensemblgene,entrezgene',
-                                    species=9606, fields=",".join(MG_FIELDS))
-            if len(results['hits']) == 0:
-                results = self.mg.query(csq['SYMBOL'],
-                                        scopes='symbol',
-                                        species=9606,
-                                        fields=",".join(MG_FIELDS))
+            results = self._mygene_query(csq['Gene'],
+                                         scopes='ensemblgene,entrezgene',
+                                         species=9606,
+                                         fields=",".join(MG_FIELDS))
+            if results is not None and len(results['hits']) == 0:
+                results = self._mygene_query(csq['SYMBOL'],
+                                             scopes='symbol',
+                                             species=9606,
+                                             fields=",".join(MG_FIELDS))
+            if results is None:
+                self.logger.debug("No cached MyGene data for gene " +
+                                 "{}/{} (offline mode)".format(
+                                     csq['Gene'], csq['SYMBOL']))
+                self.mygene_cache[csq['Gene']] = [''] * 8
+                return [''] * 8
             if len(results['hits']) == 0:
                 self.logger.warn("No MyGene hits for gene {}/{}".format(
                     csq['Gene'], csq['SYMBOL']))
@@ -519,6 +549,25 @@ class VaseReporter(object):
             return data
         return [''] * 8
 
+    def _mygene_query(self, query, **kwargs):
+        '''
+            Perform a MyGene.info query, using self.lookup_cache if
+            available. Returns None if in offline mode and the query is
+            not in the cache.
+        '''
+        if self.lookup_cache is None:
+            return self.mg.query(query, **kwargs)
+        params = json.dumps(dict(q=query, **kwargs), sort_keys=True)
+        found, results = self.lookup_cache.get('mygene.info', 'query', params,
+                                               ignore_ttl=self.offline)
+        if found:
+            return results
+        if self.offline:
+            return None
+        results = self.mg.query(query, **kwargs)
+        self.lookup_cache.set('mygene.info', 'query', params, results)
+        return results
+
     def write_row(self, worksheet, row, values, family):
         ''' Write a list of values to given worksheet and row '''
         entrez_cols = []
@@ -576,14 +625,8 @@ class VaseReporter(object):
                 if csq['SYMBOL'] not in self.g2p.g2p:
                     continue
                 if self.allelic_requirement:
-                    inh_ok = False
-                    for req in (x['allelic requirement'] for x in
-                                self.g2p.g2p[csq['SYMBOL']]):
-                        for r in req.split(","):
-                            if inheritance in allelic_req_to_label[r]:
-                                inh_ok = True
-                                break
-                    if not inh_ok:
+                    if not self.g2p.inheritance_matches(csq['SYMBOL'],
+                                                        inheritance):
                         continue
                 if self.mutation_requirement:
                     if not self.g2p.csq_matches_requirement(
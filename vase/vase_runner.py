@@ -6,6 +6,7 @@ import pysam
 from .vcf_reader import VcfReader
 from .dbsnp_filter import dbSnpFilter, clinvar_path_annot
 from .gnomad_filter import GnomadFilter
+from .cohort_db_filter import CohortDbFilter
 from .vcf_filter import VcfFilter
 from .vep_filter import VepFilter
 from .cadd_filter import CaddFilter
@@ -16,10 +17,14 @@ from .family_filter import RecessiveFilter, DominantFilter, DeNovoFilter
 from .burden_counter import BurdenCounter
 from .var_by_region import VarByRegion
 from .region_iter import RegionIter
+from .bed_parser import BedParser
 from .gt_annotator import GtAnnotator
 from .spliceai_filter import SpliceAiFilter, filter_on_splice_ai
 from .info_filter import InfoFilter
 from .g2p import G2P
+from .gtf_parser import GtfParser
+from .feature_index import FeatureIndex
+from .cache_spill import SpillFile, SpilledRecord
 
 
 class VaseRunner(object):
@@ -45,6 +50,7 @@ class VaseRunner(object):
         self.prev_splice_ai = False
         self._get_prev_annotations()
         self.vcf_filters = self.get_vcf_filter_classes()
+        self.cohort_filter = self.get_cohort_filter()
         self.cadd_filter = self.get_cadd_filter()
         self.splice_ai_filter = self.get_splice_ai_filter()
         self.gt_annotators = self.get_gt_annotators()
@@ -52,6 +58,7 @@ class VaseRunner(object):
         if args.ped:
             self.ped = PedFile(args.ped)
         self.csq_filter = None
+        self.post_spliceai_csq_filter = None
         self.g2p = None
         self.gene_filter = None
         self.retrieving_by_region = False
@@ -102,8 +109,10 @@ class VaseRunner(object):
         if args.gene_bed is not None:
             self.logger.info("Reading, sorting and merging intervals in " +
                              "{}".format(args.gene_bed))
+            gene_regions = BedParser(args.gene_bed, min_col=4,
+                                     padding=args.gene_padding)
             self.gene_filter = VarByRegion(self.input,
-                                           bed=args.gene_bed,
+                                           region_iter=gene_regions,
                                            gene_targets=True,
                                            stream=args.stream,
                                            exclude=args.exclude_regions)
@@ -116,6 +125,8 @@ class VaseRunner(object):
             self.logger.info("Finished processing intervals.")
         if args.g2p is not None:
             self.g2p = G2P(args.g2p)
+            if args.gene_annotation is not None:
+                self._set_g2p_regions()
         if (args.csq is not None or args.impact is not None
                 or self.args.g2p is not None):
             if args.no_vep_freq:
@@ -202,8 +213,21 @@ class VaseRunner(object):
                     check_g2p_consequence=self.args.check_g2p_consequence,
                     logging_level=self.logger.level)
                 self.post_spliceai_csq_filter = None
+        self.feature_index = None
+        if args.feature_coordinates:
+            self.logger.info("Reading feature coordinates from " +
+                             "{}".format(args.feature_coordinates))
+            self.feature_index = FeatureIndex(
+                args.feature_coordinates,
+                padding=args.gene_padding,
+                contigs=self.input.variant_file.header.contigs.keys())
+            self.logger.info("Read coordinates for {:,} features".format(
+                len(self.feature_index)))
         self.sample_filter = None
         self.burden_counter = None
+        if args.burden_matrix and not args.burden_counts:
+            raise ValueError("--burden_matrix argument requires the " +
+                             "--burden_counts argument.")
         if args.burden_counts:
             if args.n_cases or args.n_controls:
                 self.logger.warn("--n_cases and --n_controls arguments are " +
@@ -219,6 +243,8 @@ class VaseRunner(object):
                 max_dp=args.max_dp,
                 het_ab=args.het_ab,
                 hom_ab=args.hom_ab,
+                feature_index=self.feature_index,
+                matrix_output=args.burden_matrix,
             )
         elif args.cases or args.controls:
             self.sample_filter = SampleFilter(
@@ -228,13 +254,24 @@ class VaseRunner(object):
                 n_cases=args.n_cases,
                 n_controls=args.n_controls,
                 confirm_missing=args.confirm_control_gts,
+                controls_from_ac=args.controls_from_ac,
                 **self.gt_args)
         self.de_novo_filter = None
         self.dominant_filter = None
         self.recessive_filter = None
         self.family_filter = None
         self.control_filter = None
-        self.variant_cache = VariantCache()
+        max_cache_bytes = None
+        if args.max_cache_mb is not None:
+            if args.burden_counts:
+                self.logger.warn("Ignoring --max_cache_mb argument because " +
+                                 "--burden_counts argument is in use.")
+            else:
+                max_cache_bytes = int(args.max_cache_mb * 1024 * 1024)
+        self.variant_cache = VariantCache(self.feature_index,
+                                          max_bytes=max_cache_bytes,
+                                          header=self.input.header)
+        self.cache_keep_ids = set()
         self.use_cache = False
         self.prog_interval = args.prog_interval
         self.log_progress = args.log_progress
@@ -258,6 +295,8 @@ class VaseRunner(object):
         self._set_seg_annot_cleanup(seg_info)
         if self.args.output is None:
             self.args.output = '-'
+        if self.args.subset_samples:
+            self._subset_samples()
         self.add_vase_header()
         self.out = pysam.VariantFile(self.args.output,
                                      mode='w',
@@ -332,6 +371,12 @@ class VaseRunner(object):
             # all alleles should be filtered
             self.var_filtered += 1
             return
+        if self.cohort_filter:
+            r = self.cohort_filter.annotate_and_filter_record(record)[0]
+            self._set_to_true_if_true(filter_alleles, r)
+            if all(filter_alleles):
+                self.var_filtered += 1
+                return
         if self.sample_filter:
             for i in range(1, len(record.alleles)):
                 r = self.sample_filter.filter(record, i)
@@ -368,6 +413,8 @@ class VaseRunner(object):
                 if self.args.min_families < 2:
                     keep_record_anyway = denovo_hit or dom_hit
                 self.variant_cache.add_record(record, keep_record_anyway)
+                if self.variant_cache.over_limit():
+                    self._spill_cache()
             else:
                 self.variant_cache.check_record(record)
                 self.var_filtered += 1
@@ -414,11 +461,16 @@ class VaseRunner(object):
     def output_record(self, vase_record):
         for gt_anno in self.gt_annotators:
             gt_anno.annotate(vase_record)
+        if self.gt_annotators:
+            vase_record.reset_genotypes()
         self.out.write(vase_record.record)
         self.var_written += 1
 
     def output_cache(self, final=False):
-        keep_ids = set()
+        # segregating variants may be processed before they are released
+        # from the cache when using a FeatureIndex so keep their IDs until
+        # output
+        keep_ids = self.cache_keep_ids
         burden_vars = dict()  # dict of inheritance model to segregants
         if self.recessive_filter:
             vid_to_seg = self.recessive_filter.process_potential_recessives(
@@ -439,14 +491,33 @@ class VaseRunner(object):
         if final:
             self.variant_cache.add_cache_to_output_ready()
         for var in self.variant_cache.output_ready:
+            record = var.record
+            if isinstance(record, SpilledRecord):
+                # must be restored in order even if not output
+                record = record.restore()
             if var.can_output or var.var_id in keep_ids:
-                self.output_record(var.record)
+                self.output_record(record)
             else:
                 self.var_filtered += 1
+            keep_ids.discard(var.var_id)
         if self.burden_counter:
             self._burden_from_cache(burden_vars)
         self.variant_cache.output_ready = []
 
+    def _spill_cache(self):
+        '''
+            Write records in the variant cache to a temporary file and
+            replace references held by inheritance filters.
+        '''
+        n = len(self.variant_cache.cache)
+        replaced = self.variant_cache.spill()
+        for f in (self.recessive_filter, self.dominant_filter,
+                  self.de_novo_filter):
+            if f is not None:
+                f.replace_records(replaced)
+        self.logger.debug("Spilled {:,} of {:,} cached records ".format(
+            len(replaced), n) + "to disk")
+
     def _burden_from_cache(self, model_to_vars):
         for model in ('dominant', 'de_novo'):
             if model in model_to_vars:
@@ -462,6 +533,42 @@ class VaseRunner(object):
                     self.burden_counter.count_samples(seg.record, seg.features,
                                                       seg.allele - 1, 2)
 
+    def _set_g2p_regions(self):
+        '''
+            Retrieve variants by region using padded coordinates of G2P
+            genes from the GTF/GFF given by --gene_annotation (or
+            variants outside these regions if --exclude_regions is
+            used).
+        '''
+        if self.retrieving_by_region:
+            self.logger.warn("Ignoring --gene_annotation argument because " +
+                             "--region, --bed or --gene_bed arguments are " +
+                             "in use.")
+            return
+        self.logger.info("Reading coordinates for {:,} G2P ".format(
+            len(self.g2p.g2p)) + "gene symbols from {}".format(
+                self.args.gene_annotation))
+        gene_regions = GtfParser(
+            self.args.gene_annotation,
+            genes=self.g2p.g2p.keys(),
+            padding=self.args.gene_padding,
+            contigs=self.input.variant_file.header.contigs.keys())
+        if not gene_regions.found:
+            raise RuntimeError("No G2P genes found in " +
+                               self.args.gene_annotation)
+        self.logger.info("Found coordinates for {:,} G2P gene ".format(
+            len(gene_regions.found)) + "symbols ({:,} not found)".format(
+                len(gene_regions.missing)) + " - {:,} merged ".format(
+                    len(gene_regions.intervals)) + "intervals")
+        # index-jumping is not possible for uncompressed VCFs or STDIN
+        stream = (self.args.stream or self.input.index is None or
+                  not self.input._is_reg_file)
+        self.var_stream = VarByRegion(self.input,
+                                      region_iter=gene_regions,
+                                      stream=stream,
+                                      exclude=self.args.exclude_regions)
+        self.retrieving_by_region = True
+
     def finish_up(self):
         if self.use_cache:
             self.output_cache(final=True)
@@ -471,6 +578,9 @@ class VaseRunner(object):
         for fh in self.report_fhs.values():
             if fh is not None:
                 fh.close()
+        for vep_filter in (self.csq_filter, self.post_spliceai_csq_filter):
+            if vep_filter:
+                vep_filter.log_memo_info()
 
     def filter_alleles_external(self, record, remove_alleles=None):
         '''
@@ -944,6 +1054,22 @@ class VaseRunner(object):
                                                    field_type='INFO')
         return filters
 
+    def get_cohort_filter(self):
+        if not self.args.cohort_db:
+            return None
+        cohort_filter = CohortDbFilter(
+            vcf=self.args.cohort_db,
+            prefix=self.check_info_prefix('VASE_cohort'),
+            logger=self.logger,
+            max_carriers=self.args.cohort_max_carriers,
+            max_homozygotes=self.args.cohort_max_homozygotes)
+        for f, d in cohort_filter.added_info.items():
+            self.logger.debug("Adding cohort database annotation {}".format(f))
+            self.input.header.add_header_field(name=f,
+                                               dictionary=d,
+                                               field_type='INFO')
+        return cohort_filter
+
     def get_gt_annotators(self):
         gt_annos = []
         if self.args.dng_vcf:
@@ -1146,6 +1272,25 @@ class VaseRunner(object):
             if values[i]:
                 alist[i] = False
 
+    def _subset_samples(self):
+        '''
+            Restrict the input to samples required by sample-based
+            filters, the PED file and sample arguments so that genotypes
+            for other samples are neither parsed nor written.
+        '''
+        samples = set(self.input.genotype_samples)
+        if self.ped is not None:
+            samples.update(self.ped.individuals)
+        for arg in (self.args.cases, self.args.controls,
+                    self.args.seg_controls, self.args.singleton_recessive,
+                    self.args.singleton_dominant):
+            if arg:
+                samples.update(arg)
+        n_samples = len(self.input.header.samples)
+        self.input.subset_samples(samples)
+        self.logger.info("Retaining {:,} of {:,} samples in input".format(
+            len(self.input.header.samples), n_samples))
+
     def _get_family_filter(self):
         if self.family_filter is not None:
             return self.family_filter
@@ -1289,7 +1434,8 @@ class VaseRunner(object):
             self.family_filter,
             self.gt_args,
             min_families=self.args.min_families,
-            report_file=self.report_fhs['dominant'])
+            report_file=self.report_fhs['dominant'],
+            feature_index=self.feature_index)
         added_info = list(self.dominant_filter.get_header_fields().keys())
         if not self.dominant_filter.affected:
             msg = ("No samples fit a dominant model - can not use dominant " +
@@ -1317,7 +1463,8 @@ class VaseRunner(object):
             self.family_filter,
             self.gt_args,
             min_families=self.args.min_families,
-            report_file=self.report_fhs['de_novo'])
+            report_file=self.report_fhs['de_novo'],
+            feature_index=self.feature_index)
         added_info = list(self.de_novo_filter.get_header_fields().keys())
         if not self.de_novo_filter.affected:
             msg = ("No samples fit a de novo model - can not use de novo " +
@@ -1345,7 +1492,8 @@ class VaseRunner(object):
             self.gt_args,
             min_families=self.args.min_families,
             strict=self.strict_recessive_inheritance,
-            report_file=self.report_fhs['recessive'])
+            report_file=self.report_fhs['recessive'],
+            feature_index=self.feature_index)
         added_info = list(self.recessive_filter.get_header_fields().keys())
         if not self.recessive_filter.affected:
             msg = ("No samples fit a recessive model - can not use biallelic" +
@@ -1387,14 +1535,31 @@ class VariantCache(object):
         gene). Keeps track of VEP Features encountered while adding to
         the cache so that the cache can be released for output once the
         current record is outside of the relevant features.
+
+        If a FeatureIndex is provided, cached variants are released in
+        order as soon as the current record has passed the end of all
+        of their indexed features (and is not annotated with any of
+        them), so that the cache only holds variants from features that
+        overlap the current position.
+
+        If max_bytes and a VcfHeader are provided, cached records can be
+        written to a temporary file using the spill method once the
+        approximate size of records held in memory exceeds this value
+        (see the over_limit method). Spilled records are replaced by
+        SpilledRecord objects which must be restored in order.
     '''
 
-    __slots__ = ['cache', 'features', 'output_ready']
+    __slots__ = ['cache', 'features', 'output_ready', 'feature_index',
+                 'max_bytes', 'cache_bytes', 'header']
 
-    def __init__(self):
+    def __init__(self, feature_index=None, max_bytes=None, header=None):
         self.cache = []
         self.features = set()
         self.output_ready = []
+        self.feature_index = feature_index
+        self.max_bytes = max_bytes
+        self.cache_bytes = 0
+        self.header = header
 
     def check_record(self, record):
         '''
@@ -1403,23 +1568,82 @@ class VariantCache(object):
             output_ready. The given record is NOT added to the cache.
         '''
         these_feats = set([x['Feature'] for x in record.CSQ])
-        if self.features and these_feats.isdisjoint(self.features):
+        if self.feature_index is not None:
+            self._release_finished(record, these_feats)
+        elif self.features and these_feats.isdisjoint(self.features):
             self.add_cache_to_output_ready()
             self.features.clear()
 
     def add_record(self, record, can_output=False):
         these_feats = set([x['Feature'] for x in record.CSQ])
-        if self.features and these_feats.isdisjoint(self.features):
+        if self.feature_index is not None:
+            self._release_finished(record, these_feats)
+            self.features.update(these_feats)
+        elif self.features and these_feats.isdisjoint(self.features):
             self.add_cache_to_output_ready()
             self.features = these_feats
         else:
             self.features.update(these_feats)
-        self.cache.append(CachedVariant(record, can_output))
+        var = CachedVariant(record, can_output, these_feats)
+        if self.max_bytes is not None:
+            var.size = len(str(record))
+            self.cache_bytes += var.size
+        self.cache.append(var)
+
+    def _release_finished(self, record, these_feats):
+        '''
+            Move variants from the start of the cache to output_ready
+            until a variant with a feature that is still open at the
+            given record is encountered.
+        '''
+        n = 0
+        for var in self.cache:
+            if any(f in these_feats or self.feature_index.is_open(
+                    f, record.chrom, record.pos) for f in var.features):
+                break
+            n += 1
+        if n:
+            self.cache_bytes -= sum(var.size for var in self.cache[:n])
+            self.output_ready.extend(self.cache[:n])
+            self.cache = self.cache[n:]
+            self.features = set(f for var in self.cache for f in
+                                var.features)
 
     def add_cache_to_output_ready(self):
         ''' Adds items in cache to output_ready and clears cache.'''
         self.output_ready.extend(self.cache)
         self.cache = []
+        self.cache_bytes = 0
+
+    def over_limit(self):
+        '''
+            Returns True if the approximate size of records held in
+            memory is greater than max_bytes.
+        '''
+        return self.max_bytes is not None and self.cache_bytes > self.max_bytes
+
+    def spill(self):
+        '''
+            Write all records held in memory to a temporary file and
+            replace them in the cache with SpilledRecord objects.
+            Returns a dict of the IDs (as given by id()) of the
+            replaced VaseRecord objects to their SpilledRecord
+            replacements so that other references can be updated.
+        '''
+        to_spill = [var for var in self.cache if not
+                    isinstance(var.record, SpilledRecord)]
+        replaced = dict()
+        if not to_spill:
+            return replaced
+        spill_file = SpillFile(self.header.header,
+                               [var.record.record for var in to_spill])
+        for var in to_spill:
+            stub = SpilledRecord(var.record, spill_file)
+            replaced[id(var.record)] = stub
+            var.record = stub
+            var.size = 0
+        self.cache_bytes = 0
+        return replaced
 
 
 class CachedVariant(object):
@@ -1429,10 +1653,12 @@ class CachedVariant(object):
         recessive inheritance pattern.
     '''
 
-    __slots__ = ['record', 'can_output', 'var_id']
+    __slots__ = ['record', 'can_output', 'var_id', 'features', 'size']
 
-    def __init__(self, record, can_output=False):
+    def __init__(self, record, can_output=False, features=None):
         self.record = record
         self.can_output = can_output
+        self.features = features
+        self.size = 0
         self.var_id = "{}:{}-{}/{}".format(record.chrom, record.pos,
                                            record.ref, record.alt)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import pysam
+
+
+def get_chunks(filename, n_chunks):
+    '''
+        Split the contigs of an indexed VCF/BCF into roughly
+        equal-sized genomic regions for processing in parallel.
+
+        Returns a list of (contig, start, end) tuples in the order
+        that contigs appear in the index. Start and end are 0-based,
+        half-open coordinates. End is None for the last chunk of each
+        contig so that records beyond the contig length given in the
+        VCF header are not lost. Contigs without a length in the VCF
+        header are a single chunk.
+
+        Args:
+            filename:
+                    bgzip compressed VCF or BCF with a tabix/CSI index.
+
+            n_chunks:
+                    Approximate number of chunks to create.
+    '''
+    if not os.path.isfile(filename):
+        raise ValueError("An indexed file is required to process {} in "
+                         .format(filename) + "chunks.")
+    with pysam.VariantFile(filename) as vcf:
+        if vcf.index is None:
+            raise ValueError("An index is required to process {} in "
+                             .format(filename) + "chunks.")
+        contigs = list(vcf.index.keys())
+        lengths = dict((c, vcf.header.contigs[c].length) for c in contigs
+                       if c in vcf.header.contigs)
+    total = sum(x for x in lengths.values() if x)
+    chunk_size = max(1, -(-total // max(1, n_chunks)))
+    chunks = []
+    for contig in contigs:
+        length = lengths.get(contig)
+        if not length:
+            chunks.append((contig, 0, None))
+            continue
+        for start in range(0, length, chunk_size):
+            end = start + chunk_size
+            chunks.append((contig, start, end if end < length else None))
+    return chunks
+
+
+def chunk_records(vcf, chunk):
+    '''
+        Yield records from a VcfReader starting within a chunk as
+        returned by get_chunks. Records overlapping the start of the
+        chunk but starting in a previous chunk are skipped so that each
+        record is only output once.
+    '''
+    contig, start, end = chunk
+    vcf.set_region(contig, start, end)
+    for record in vcf:
+        if record.start < start:
+            continue
+        yield record
+
+
+def temp_chunk_file(tmpdir=None):
+    ''' Return the name of a new temporary file for chunk output. '''
+    fd, fn = tempfile.mkstemp(suffix='.bcf', dir=tmpdir)
+    os.close(fd)
+    return fn
+
+
+def write_chunk_file(chunk_file, vcf_out):
+    '''
+        Write all records from a temporary chunk output file to an
+        open pysam.VariantFile and delete the chunk file.
+    '''
+    # use filehandle so that htslib does not look for an index
+    with open(chunk_file, 'rb') as fh:
+        with pysam.VariantFile(fh) as chunk_vcf:
+            for record in chunk_vcf:
+                vcf_out.write(record)
+    os.remove(chunk_file)
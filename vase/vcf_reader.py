@@ -5,7 +5,9 @@ import numpy as np
 import struct
 from stat import S_ISREG
 from .vcf_record import VaseRecord
+from .genotype_matrix import GenotypeMatrix
 from .vcf_header import VcfHeader
+from .index_summary import ContigIndexSummary
 from .utils import reg2bins
 
 MAX_INT32 = int(2**31 - 1)
@@ -25,13 +27,8 @@ class VcfReader(object):
             self._is_reg_file = False
         else:
             self._is_reg_file = S_ISREG(os.stat(self.filename).st_mode)
-        if self.filename.endswith(".bcf"):
-            self.index = self.filename + '.csi'
-        elif self.filename.endswith((".gz", ".bgz")):
-            self.index = self.filename + '.tbi'
-        else:
-            self.index = None
-        self.record_iter = (VaseRecord(r, self) for r in self.variant_file)
+        self.index = self._find_index()
+        self.record_iter = self._read_records()
         self.header = VcfHeader(self)
         self.set_region = self._index_and_set_region
         self.indices = None
@@ -42,10 +39,20 @@ class VcfReader(object):
         self.depth = 5
         self.min_shift = 14
         self.tbi = False
+        self.genotype_samples = set()
+        self.genotype_fields = set(['GT'])
+        self._genotype_layout = None
+        self.sample_subset = None
 
     def __iter__(self):
         return self
 
+    def _read_records(self):
+        # generator so that reading does not start until the first record
+        # is requested (allowing samples to be subset before reading)
+        for r in self.variant_file:
+            yield VaseRecord(r, self)
+
     def __next__(self):
         return next(self.record_iter)
 
@@ -55,6 +62,62 @@ class VcfReader(object):
     def __exit__(self, exc_type, exc_value, tb):
         self.variant_file.close()
 
+    def require_genotypes(self, samples, fields=('GT',)):
+        '''
+            Register samples and FORMAT fields that should be included
+            in the GenotypeMatrix created for each record (accessible
+            via the 'genotypes' property of VaseRecord objects).
+            Filters should call this method on initialisation for the
+            samples and fields they use.
+
+            Args:
+                samples:
+                        Iterable of sample IDs.
+
+                fields: Iterable of FORMAT fields. GT is always
+                        included.
+        '''
+        self.genotype_samples.update(samples)
+        self.genotype_fields.update(fields)
+        self._genotype_layout = None
+
+    def subset_samples(self, samples):
+        '''
+            Only parse genotypes for the given samples. Must be called
+            before retrieving any records. Samples not present in the
+            VCF are ignored and the order of samples in the VCF is
+            retained. Because the header is also modified, any output
+            written using this object's header will only contain the
+            retained samples.
+
+            Args:
+                samples:
+                        Iterable of sample IDs to retain.
+        '''
+        samples = set(samples)
+        self.sample_subset = [x for x in self.variant_file.header.samples
+                              if x in samples]
+        self.variant_file.subset_samples(self.sample_subset)
+        self._genotype_layout = None
+
+    def genotype_matrix(self, record):
+        '''
+            Return a GenotypeMatrix for a pysam.VariantRecord containing
+            the samples and fields registered via require_genotypes.
+        '''
+        if self._genotype_layout is None:
+            samples = [x for x in self.variant_file.header.samples if x in
+                       self.genotype_samples]
+            index = dict((s, i) for i, s in enumerate(samples))
+            formats = self.variant_file.header.formats
+            scalars = tuple(f for f in self.genotype_fields if f not in
+                            formats or formats[f].number == 1)
+            self._genotype_layout = (samples, index,
+                                     tuple(self.genotype_fields), scalars)
+        samples, index, fields, scalars = self._genotype_layout
+        return GenotypeMatrix(record, samples, fields, index=index,
+                              scalar_fields=scalars)
+
     def _index_and_set_region(self, chrom, start=None, end=None, walk=False,
                               walk_region_limit=1000):
         """
@@ -106,6 +169,25 @@ class VcfReader(object):
         self.set_region(chrom, start, end, walk=walk,
                         walk_region_limit=walk_region_limit)
 
+    def _find_index(self):
+        '''
+            Return the filename of the index for self.filename, looking
+            for the same extensions (in the same order) as htslib. If no
+            index exists, returns the filename of the index that will be
+            created by _create_index or None if the input can not be
+            indexed.
+        '''
+        if self.filename.endswith(".bcf"):
+            exts = ['.csi']
+        elif self.filename.endswith((".gz", ".bgz")):
+            exts = ['.tbi', '.csi']
+        else:
+            return None
+        for ext in exts:
+            if os.path.exists(self.filename + ext):
+                return self.filename + ext
+        return self.filename + exts[0]
+
     def _create_index(self):
         if not self._is_reg_file:
             raise TypeError("Cannot run set_region() on a non-regular file")
@@ -117,7 +199,10 @@ class VcfReader(object):
                                  + " - creating index")
             preset = 'bcf' if self.variant_file.is_bcf else 'vcf'
             pysam.tabix_index(self.filename, preset=preset)
+            self.index = self._find_index()
             self.variant_file = pysam.VariantFile(self.filename)
+            if self.sample_subset is not None:
+                self.variant_file.subset_samples(self.sample_subset)
 
     def _set_region(self, chrom, start=None, end=None, walk=False,
                     walk_region_limit=1000):
@@ -217,26 +302,53 @@ class VcfReader(object):
         csindex = dict()
         self.min_shift, self.depth, l_aux  = np.frombuffer(f.read(4 * 3),
                                                            dtype=np.int32)
-        aux = np.frombuffer(f.read(4 * l_aux), dtype=np.uint8)
+        aux = f.read(l_aux)
+        names = None
+        if l_aux >= 28:
+            # tabix-style meta (e.g. CSI for VCF) - contigs are numbered
+            # in order of the names at the end of the aux data
+            l_nm = struct.unpack('<i', aux[24:28])[0]
+            names = [x.decode() for x in aux[28:28 + l_nm].split(b'\x00')
+                     if x != b'']
         n_ref = np.frombuffer(f.read(4), dtype=np.int32)[0]
         for i in range(n_ref):
-            chrom = self.variant_file.get_reference_name(i)
+            if names is not None:
+                chrom = names[i]
+            else:
+                chrom = self.variant_file.get_reference_name(i)
             bindx = dict()
-            offsets = list()
+            loff = dict()
             n_bins = struct.unpack('<i', f.read(4))[0]
             for j in range(n_bins):  # n_bins
                 bin_key = struct.unpack('<i', f.read(4))[0]
-                offs = np.frombuffer(f.read(8), dtype=np.int64)
+                loff[bin_key] = struct.unpack('<Q', f.read(8))[0]
                 n_chunk = struct.unpack('<i', f.read(4))[0]  # n_chunk
                 bindx[bin_key] = np.frombuffer(f.read(8 * 2 * n_chunk),
                                                dtype=np.uint64).reshape(
                                                   n_chunk, -1)  # chunk_beg/end
-            #offsets = np.ravel([x for y in bindx.values() for x in y])
-            #d = {'bindx': bindx, 'ioff': offsets}
-            d = {'bindx': bindx}
+            d = {'bindx': bindx, 'loff': loff}
             csindex[chrom] = d
         return csindex
 
+    def index_summary(self, chrom):
+        '''
+            Return a ContigIndexSummary for the given chromosome, reading
+            (and if necessary creating) the index on first use. Returns
+            None if chrom is not present in the index.
+        '''
+        if self.indices is None:
+            self.indices = self._read_index()
+        d = self.indices.get(chrom)
+        if d is None:
+            return None
+        if 'summary' not in d:
+            d['summary'] = ContigIndexSummary(d['bindx'],
+                                              min_shift=int(self.min_shift),
+                                              depth=int(self.depth),
+                                              ioff=d.get('ioff'),
+                                              loff=d.get('loff'))
+        return d['summary']
+
     def walk(self, chrom, start=None, end=None, region_limit=1000):
         '''
             Retrieve records given by chromosome, start and end
@@ -15,7 +15,7 @@ class VaseRecord(object):
     """
 
     __slots__ = ['record', 'caller', 'header', '__CSQ', '__ANN', '__is_sv',
-                 '__DECOMPOSED_ALLELES', '_vep_allele']
+                 '__DECOMPOSED_ALLELES', '_vep_allele', '_genotypes']
 
     def __init__(self, record, vcfreader):
         """
@@ -35,6 +35,7 @@ class VaseRecord(object):
         self.__is_sv = None
         self.__DECOMPOSED_ALLELES = None
         self._vep_allele = {}
+        self._genotypes = None
 
     def __str__(self):
         return str(self.record)
@@ -135,6 +136,20 @@ class VaseRecord(object):
     def stop(self):
         return self.record.stop
 
+    @property
+    def genotypes(self):
+        '''
+            GenotypeMatrix for the samples and FORMAT fields registered
+            with the parent VcfReader. Created on first access.
+        '''
+        if self._genotypes is None:
+            self._genotypes = self.caller.genotype_matrix(self.record)
+        return self._genotypes
+
+    def reset_genotypes(self):
+        ''' Discard GenotypeMatrix after altering sample calls. '''
+        self._genotypes = None
+
     @property
     def IS_SV(self):
         '''True if record represents a structural variant'''
@@ -371,35 +386,44 @@ class VaseRecord(object):
                         Allele number for other record.
 
         '''
-        # If GT field is phased in both records check this and only this
-        if (self.record.samples[sample].phased and
-                other.record.samples[sample.phased]):
-            i = self.record.samples[sample].allele_indices.index(allele)
-            j = other.record.samples[sample].allele_indices.index(other_allele)
-            return i == j
-        # Otherwise check phase group annotations
-        if 'PID' not in self.record.format or 'PID' not in other.record.format:
-            return False
-        if 'PGT' not in self.record.format or 'PGT' not in other.record.format:
-            return False
-        try:
-            pid1 = self.record.samples[sample]['PID']
-            pid2 = other.record.samples[sample]['PID']
-            pgt1 = self.record.samples[sample]['PGT']
-            pgt2 = other.record.samples[sample]['PGT']
-        except KeyError:
-            # when joining VCFs together only some samples may have PID/PGT
-            return False
-        if pid1 != pid2:
-            return False
-        if pgt1 == '.' or pgt2 == '.':
-            return False
-        try:
-            phase1 = pgt1.split('|').index(str(allele))
-            phase2 = pgt2.split('|').index(str(other_allele))
-            return phase1 == phase2
-        except ValueError:  # allele might not be in phase group
-            return False
+        return phases_in_cis(self.phase_info(sample, allele),
+                             other.phase_info(sample, other_allele))
+
+    def phase_info(self, sample, allele):
+        '''
+            Returns a tuple of phasing data for an allele in a sample
+            for comparison with other alleles using phases_in_cis. The
+            tuple consists of the index of the allele in a phased GT
+            (or None if GT is unphased), the phase group ID (PID) and
+            the index of the allele in the phased genotype (PGT) of the
+            phase group (or None if not available).
+
+            Args:
+                sample: Sample ID to retrieve phasing data for.
+
+                allele: Allele number of this record.
+
+        '''
+        call = self.record.samples[sample]
+        gt_phase = None
+        if call.phased and allele in call.allele_indices:
+            gt_phase = call.allele_indices.index(allele)
+        pid = None
+        pgt_phase = None
+        if 'PID' in self.record.format and 'PGT' in self.record.format:
+            try:
+                pid = call['PID']
+                pgt = call['PGT']
+            except KeyError:
+                # when joining VCFs together only some samples may have
+                # PID/PGT
+                pgt = None
+            if pgt is not None and pgt != '.':
+                try:
+                    pgt_phase = pgt.split('|').index(str(allele))
+                except ValueError:  # allele might not be in phase group
+                    pass
+        return (gt_phase, pid, pgt_phase)
 
     def add_info_fields(self, info, append_existing=False):
         '''
@@ -687,3 +711,17 @@ class AltAllele(object):
         return (self.sv_info['LEFT_SVINSSEQ'] == other.sv_info['LEFT_SVINSSEQ']
                 and self.sv_info['RIGHT_SVINSSEQ'] ==
                 other.sv_info['RIGHT_SVINSSEQ'])
+
+
+def phases_in_cis(phase, other_phase):
+    '''
+        Returns True if two tuples of phasing data as returned by
+        VaseRecord.phase_info indicate that the alleles are in cis. If
+        GT is phased in both records only GT phasing is checked,
+        otherwise phase groups (PID and PGT) are compared.
+    '''
+    if phase[0] is not None and other_phase[0] is not None:
+        return phase[0] == other_phase[0]
+    if phase[2] is None or other_phase[2] is None:
+        return False
+    return phase[1] == other_phase[1] and phase[2] == other_phase[2]
@@ -1,7 +1,9 @@
 import os
 import logging
 from collections import defaultdict
+from functools import lru_cache
 from .insilico_filter import InSilicoFilter
+from .utils import csq_bit, csq_mask
 
 lof_csq = {'frameshift_variant', 'stop_gained', 'splice_acceptor_variant',
            'splice_donor_variant'}
@@ -18,7 +20,7 @@ class VepFilter(object):
                  filter_flagged_features=False, freq=None, min_freq=None,
                  afs=[], gene_filter=None, blacklist=None,filter_known=False,
                  filter_novel=False, pathogenic=False, no_conflicted=False,
-                 g2p=None, check_g2p_consequence=False,
+                 g2p=None, check_g2p_consequence=False, memo_size=65536,
                  logging_level=logging.WARNING):
         '''
             Args:
@@ -152,6 +154,11 @@ class VepFilter(object):
                         that the observed consequence matches the
                         'mutation consequence' in the G2P file.
 
+                memo_size:
+                        Maximum number of distinct annotation value
+                        combinations for which filtering decisions are
+                        memoized. Default=65536.
+
                 logging_level:
                         Logging level to use. Default=logging.WARNING.
 
@@ -260,6 +267,163 @@ class VepFilter(object):
         self.check_g2p_consequence = check_g2p_consequence
         if pathogenic:
             self.path_fields = self._get_path_fields(vcf)
+        self._compile_decisions(memo_size)
+
+    def _compile_decisions(self, memo_size):
+        '''
+            Set up memoized decision functions. Feature level checks
+            (canonical, flags and biotype) are keyed on the values of
+            those annotations only and consequence checks are keyed on
+            Consequence, IMPACT, LoF and (if checking G2P consequences)
+            SYMBOL values. Annotations not relevant to the options in
+            use are left out of the keys.
+        '''
+        self._check_freq = (self.freq or self.min_freq or self.filter_known
+                            or self.filter_novel)
+        self._keep_all_csq = (self.csq is None and self.impact is None and
+                              not self.check_g2p_consequence)
+        self._csq_mask = None
+        if self.csq is not None:
+            self._csq_mask = csq_mask(self.csq)
+        self._feature_fields = []
+        if self.canonical:
+            self._feature_fields.append('CANONICAL')
+        if self.filter_flagged:
+            self._feature_fields.append('FLAGS')
+        if self.biotypes is not None:
+            self._feature_fields.append('BIOTYPE')
+        self._csq_fields = ['Consequence']
+        if self.impact is not None:
+            self._csq_fields.append('IMPACT')
+        if self.loftee:
+            self._csq_fields.append('LoF')
+        if self.check_g2p_consequence and self.g2p:
+            self._csq_fields.append('SYMBOL')
+        self._feature_decision = lru_cache(maxsize=memo_size)(
+            self._feature_passes)
+        self._csq_decision = lru_cache(maxsize=memo_size)(
+            self._consequence_checks)
+
+    def memo_info(self):
+        '''
+            Return a tuple of hits, misses and current number of
+            entries summed for the feature and consequence memos.
+        '''
+        infos = (self._feature_decision.cache_info(),
+                 self._csq_decision.cache_info())
+        return (sum(x.hits for x in infos), sum(x.misses for x in infos),
+                sum(x.currsize for x in infos))
+
+    def log_memo_info(self):
+        ''' Log the hit rate for memoized filtering decisions. '''
+        self._log_memo("VEP filter", *self.memo_info())
+        if self.in_silico:
+            info = self.in_silico.memo_info()
+            self._log_memo("Missense in silico filter", info.hits,
+                           info.misses, info.currsize)
+        if self.splice_in_silico:
+            info = self.splice_in_silico.memo_info()
+            self._log_memo("Splice in silico filter", info.hits,
+                           info.misses, info.currsize)
+
+    def _log_memo(self, name, hits, misses, size):
+        if hits + misses:
+            self.logger.info("{} memo: {:,} hits, ".format(name, hits) +
+                             "{:,} misses ({:.1%} hit rate), ".format(
+                                 misses, hits / (hits + misses)) +
+                             "{:,} entries".format(size))
+
+    def _feature_passes(self, key):
+        '''
+            Return True if a consequence with the given values for the
+            fields in self._feature_fields passes canonical, flag and
+            biotype filters.
+        '''
+        vals = dict(zip(self._feature_fields, key))
+        if self.canonical:
+            if (vals['CANONICAL'] is not None and
+                    vals['CANONICAL'] != 'YES'):
+                return False
+        if self.filter_flagged and vals['FLAGS']:
+            return False
+        if self.biotypes is not None:
+            if (vals['BIOTYPE'] or '').lower() not in self.biotypes:
+                return False
+        return True
+
+    def _consequence_checks(self, key):
+        '''
+            For the given values of the fields in self._csq_fields
+            return a tuple of the checks required to retain a
+            consequence, in the order they would be applied. Each item
+            is either an InSilicoFilter (the consequence is retained if
+            its filter method returns False) or None (the consequence is
+            retained unconditionally). An empty tuple means the
+            consequence should be filtered.
+        '''
+        vals = dict(zip(self._csq_fields, key))
+        if self.check_g2p_consequence and self.g2p:
+            filt_mask = self.g2p.consequence_mask_from_gene(vals['SYMBOL'])
+        else:
+            filt_mask = self._csq_mask
+        matches_impact = (self.impact is not None and
+                          vals['IMPACT'] in self.impact)
+        terms = [x.lower() for x in vals['Consequence'].split('&')]
+        if not matches_impact and (filt_mask is None or
+                                   not csq_mask(terms) & filt_mask):
+            return ()
+        if not (self.in_silico or self.splice_in_silico or self.loftee):
+            return (None,)
+        checks = []
+        for s_csq in terms:
+            if not matches_impact and not csq_bit(s_csq) & filt_mask:
+                continue
+            if self.in_silico and s_csq == 'missense_variant':
+                check = self.in_silico
+            elif self.splice_in_silico and s_csq.startswith("splice"):
+                check = self.splice_in_silico
+            elif self.loftee and (s_csq in lof_csq or matches_impact
+                                  and vals['IMPACT'] == 'HIGH'):
+                if vals['LoF'] != 'HC':
+                    continue
+                check = None
+            else:
+                check = None
+            if check not in checks:
+                checks.append(check)
+            if check is None:
+                break
+        return tuple(checks)
+
+    def _freq_filtered(self, c):
+        '''
+            Return True if consequence should be filtered on the basis
+            of VEP allele frequency annotations.
+        '''
+        known = False
+        for af in self.freq_fields:
+            if c[af] == '' or c[af] == '.':
+                continue
+            try:
+                c_af = float(c[af])
+            except ValueError:
+                try:
+                    c_af = max(float(x) for x in c[af].split('&') if x
+                               != '.')
+                except ValueError:
+                    continue
+            known = True
+            if self.filter_known:
+                return True
+            if self.freq:
+                if c_af >= self.freq:
+                    return True
+            if self.min_freq:
+                if c_af < self.min_freq:
+                    return True
+        if self.filter_novel and not known:
+            return True
+        return False
 
     def filter(self, record):
         filter_alleles = [True] * len(record.alts)
@@ -278,20 +442,8 @@ class VepFilter(object):
             alt_i = c['alt_index'] -1
             if filter_af[alt_i]: #already filtered on freq for this allele
                 continue
-            if self.canonical:
-                try:
-                    if c['CANONICAL'] != 'YES':
-                        continue
-                except KeyError:
-                    pass
-            if self.filter_flagged:
-                try:
-                    if c['FLAGS']:
-                        continue
-                except KeyError:
-                    pass
-            if (self.biotypes is not None and
-                c['BIOTYPE'].lower() not in self.biotypes):
+            if not self._feature_decision(
+                    tuple(map(c.get, self._feature_fields))):
                 continue
             if self.gene_filter:
                 if not self.gene_filter.target_in_csq(c):
@@ -301,89 +453,27 @@ class VepFilter(object):
                     continue
             if self.blacklist and c['Feature'] in self.blacklist:
                 continue
-            if (self.freq or self.min_freq or self.filter_known or
-                    self.filter_novel):
-                known = False
-                for af in self.freq_fields:
-                    if c[af] == '' or c[af] == '.':
-                        continue
-                    try:
-                        c_af = float(c[af])
-                    except ValueError:
-                        try:
-                            c_af = max(float(x) for x in c[af].split('&') if x
-                                       != '.')
-                        except ValueError:
-                            continue
-                    known = True
-                    if self.filter_known:
-                        filter_af[alt_i] = True
-                        break
-                    if self.freq:
-                        if c_af >= self.freq:
-                            filter_af[alt_i] = True
-                            break
-                    if self.min_freq:
-                        if c_af < self.min_freq:
-                            filter_af[alt_i] = True
-                            break
-                if self.filter_novel and not known:
-                    filter_af[alt_i] = True
-                if filter_af[alt_i]:
-                    continue
-            if (self.csq is None and self.impact is None and
-                    not self.check_g2p_consequence):
-                #if only using biotypes/MAF for filtering
-                filter_alleles[alt_i] = False
-                filter_csq[i] = False
-                continue
-            if self.pathogenic and self._has_pathogenic_annotation(
-                    c, record):
-                filter_alleles[alt_i] = False
-                filter_csq[i] = False
+            if self._check_freq and self._freq_filtered(c):
+                filter_af[alt_i] = True
                 continue
-            if self._retain_label_matched(c):
+            if (self._keep_all_csq or
+                    self.pathogenic and self._has_pathogenic_annotation(
+                        c, record) or
+                    self._retain_label_matched(c) or
+                    self._passes_checks(
+                        self._csq_decision(tuple(map(c.get,
+                                                     self._csq_fields))),
+                        c)):
                 filter_alleles[alt_i] = False
                 filter_csq[i] = False
-                continue
-            if self.check_g2p_consequence and self.g2p:
-                filt_csq = self.g2p.consequences_from_gene(c['SYMBOL'])
-            else:
-                filt_csq = self.csq
-            for s_csq in [x.lower() for x in c['Consequence'].split('&')]:
-                matches_csq = False
-                matches_impact = False
-                if filt_csq is not None and s_csq in filt_csq:
-                    matches_csq = True
-                if self.impact is not None and c['IMPACT'] in self.impact:
-                    matches_impact = True
-                if matches_csq or matches_impact:
-                    if self.in_silico and s_csq == 'missense_variant':
-                        do_filter = self.in_silico.filter(c)
-                        if not do_filter:
-                            filter_alleles[alt_i] = False
-                            filter_csq[i] = False
-                            break
-                        filter_csq[i] = do_filter
-                    elif self.splice_in_silico and s_csq.startswith("splice"):
-                        do_filter = self.splice_in_silico.filter(c)
-                        if not do_filter:
-                            filter_alleles[alt_i] = False
-                            filter_csq[i] = False
-                            break
-                        filter_csq[i] = do_filter
-                    elif self.loftee and (s_csq in lof_csq or matches_impact
-                                          and c['IMPACT'] == 'HIGH'):
-                        if c['LoF'] == 'HC':
-                            filter_alleles[alt_i] = False
-                            filter_csq[i] = False
-                            break
-                    else:
-                        filter_alleles[alt_i] = False
-                        filter_csq[i] = False
-                        break
         return filter_alleles, filter_csq
 
+    def _passes_checks(self, checks, csq):
+        for check in checks:
+            if check is None or not check.filter(csq):
+                return True
+        return False
+
     def _retain_label_matched(self, csq):
         for k,v in self.retain_labels.items():
             for lbl in csq[k].split('&'):